@@ -0,0 +1,816 @@
+"""
+Asyncio version of the review analysis pipeline.
+
+Fans out with the client's `generate_content_async`, so the FastAPI endpoints
+can await it without blocking the event loop. Every model call takes a slot
+from the shared adaptive limiter in concurrency.py. Prompt building, response
+parsing and result organization live in pipeline.py, whose synchronous step
+functions run the coroutines below.
+"""
+import asyncio
+import contextlib
+import json
+import os
+import time
+import metrics
+import pipeline
+from attribute_index import AttributeIndex
+from category_memory import category_memory
+from key_pool import call_with_key, key_fingerprint, key_pool
+from concurrency import (
+    SingleFlight,
+    call_with_limiter,
+    hedging_enabled,
+    model_call_flights,
+    model_call_limiter,
+    request_hedger
+)
+from pipeline import (
+    _is_json,
+    _has_answer_tags,
+    cascade_stats,
+    extraction_problem,
+    matching_problem,
+    batch_matching_problem,
+    cache_lookup,
+    cache_store,
+    extraction_prompt,
+    matching_prompt,
+    batch_matching_prompt,
+    grouping_request,
+    parse_grouping_response,
+    plan_grouping_shards,
+    GROUPING_SHARD_SIZE,
+    match_requested_attributes,
+    reconcile_category_labels,
+    plan_match_batches,
+    parse_batch_matching_response,
+    merge_batch_matchings,
+    collect_unique_attributes,
+    organize_results
+)
+from records import matchings_to_records, records_from_rows
+from review_dedup import find_duplicates
+from review_filter import review_filter
+
+# Per-step cap on calls in flight; None leaves it to the adaptive limiter
+DEFAULT_CONCURRENCY = None
+# A successful probe of an API key answers heartbeats for this long...
+HEARTBEAT_TTL_SECONDS = float(os.environ.get("PRAISE_HEARTBEAT_TTL_SECONDS", 30))
+# ...and lets /configure accept the key again without a probe for this long
+KEY_VALIDATION_TTL_SECONDS = float(os.environ.get("PRAISE_KEY_VALIDATION_TTL_SECONDS", 3600))
+
+# Key fingerprint -> time.monotonic() of its last successful probe
+_probed_keys = {}
+probe_flights = SingleFlight()
+
+async def generate_text(model, prompt, use_cache=True, validate=None, stage="other"):
+    """
+    Call the model, serving repeated (model, config, prompt) triples from the response cache.
+
+    Fresh calls wait for a slot in the shared adaptive limiter and are retried with
+    backoff on rate-limit errors. A call identical to one already in flight (from any
+    session) waits for that one's response instead of being made again. With an API
+    key pool configured, each request goes to the least-loaded key with quota left
+    (key_pool.call_with_key). With hedging
+    enabled (concurrency.set_hedging), a slow request is sent a second time and the
+    first valid response wins.
+
+    Args:
+        model: The GenerativeModel to call
+        prompt (str): Full prompt text
+        use_cache (bool): When False, skip the cache lookup (the fresh response is still stored)
+        validate (callable): Only responses for which validate(text) is true get cached
+        stage (str): Pipeline stage the call is recorded under in metrics
+
+    Returns:
+        str: The response text
+    """
+    name = metrics.model_name(model)
+    key, cached = cache_lookup(model, prompt, use_cache)
+    if cached is not None:
+        metrics.record_call(stage, name, 0.0, cached=True)
+        return cached
+    attempts = 0
+    hedge = hedging_enabled()
+
+    async def send():
+        started = time.perf_counter()
+        try:
+            response = await call_with_key(key_pool, model, lambda bound: bound.generate_content_async(prompt))
+        except Exception as e:
+            metrics.record_attempt(stage, name, time.perf_counter() - started, error=e)
+            raise
+        metrics.record_attempt(stage, name, time.perf_counter() - started, response)
+        return response
+
+    async def attempt():
+        nonlocal attempts
+        attempts += 1
+        if not hedge:
+            return await send()
+        response, outcome = await request_hedger.run(stage, send, lambda response: _valid_response(response, validate))
+        if outcome is not None:
+            metrics.record_hedge(stage, name, outcome)
+        return response
+
+    async def fresh_call():
+        try:
+            response = await call_with_limiter(model_call_limiter, attempt)
+            text = response.text
+        except Exception as e:
+            metrics.record_call(stage, name, time.perf_counter() - started, retries=max(0, attempts - 1), error=e)
+            raise
+        metrics.record_call(stage, name, time.perf_counter() - started, retries=attempts - 1)
+        cache_store(key, text, validate)
+        return text
+
+    started = time.perf_counter()
+    try:
+        text = await model_call_flights.run(key, fresh_call)
+    except Exception as e:
+        if not attempts: # joined a call that failed
+            metrics.record_call(stage, name, time.perf_counter() - started, error=e, coalesced=True)
+        raise
+    if not attempts:
+        metrics.record_call(stage, name, time.perf_counter() - started, coalesced=True)
+    return text
+
+def _valid_response(response, validate):
+    try:
+        return validate is None or validate(response.text)
+    except ValueError: # no text, e.g. a blocked response
+        return False
+
+async def probe_api(api_key=None, max_age=HEARTBEAT_TTL_SECONDS):
+    """
+    Check that the configured API key is accepted, at most once per `max_age` seconds per key.
+
+    The probe counts the tokens of a one-word prompt, which authenticates the key
+    without generating anything. Concurrent probes of one key share a request; failed
+    probes are not remembered.
+
+    Args:
+        api_key (str): The key to check; None checks the key passed to genai.configure
+        max_age (float): Seconds a successful probe stays valid
+
+    Raises:
+        Exception: The API error if the probe fails
+    """
+    fingerprint = key_fingerprint(api_key)
+    probed = _probed_keys.get(fingerprint)
+    if probed is not None and time.monotonic() - probed < max_age:
+        return
+    model = key_pool.bind(pipeline.test_model, api_key) if api_key else pipeline.test_model
+    await probe_flights.run(fingerprint, lambda: model.count_tokens_async("test"))
+    _probed_keys[fingerprint] = time.monotonic()
+
+async def check_heartbeat_status(api_key=None):
+    """Check if API is responsive, reusing a probe made within HEARTBEAT_TTL_SECONDS."""
+    try:
+        await probe_api(api_key)
+    except Exception:
+        return "heartbeat failed"
+    return "heartbeat success"
+
+async def cascade_text(stage, model, fast_model, prompt, use_cache=True, validate=None, problem=None):
+    """
+    Call `fast_model` first and escalate to `model` if its answer fails.
+
+    The fast answer is kept only if problem(text) finds nothing; only kept answers are
+    cached. Without a fast model (cascade off) this is generate_text(model, ...).
+
+    Args:
+        stage (str): Pipeline stage, for metrics and cascade_stats
+        problem (callable): Returns the problem with an answer, or None if it is acceptable
+    """
+    if fast_model is None:
+        return await generate_text(model, prompt, use_cache=use_cache, validate=validate, stage=stage)
+    try:
+        response_text = await generate_text(
+            fast_model, prompt, use_cache=use_cache, validate=lambda text: problem(text) is None, stage=stage
+        )
+        found = problem(response_text)
+    except Exception:
+        found = "error"
+    cascade_stats.record(stage, found)
+    if found is None:
+        return response_text
+    return await generate_text(model, prompt, use_cache=use_cache, validate=validate, stage=stage)
+
+async def extract_factual_product_details(review, use_cache=True, lean=False):
+    """Extract factual details from a product review, without chain_of_thought and discarded_opinions if `lean`."""
+    model = pipeline.lean_extraction_model if lean else pipeline.extraction_model
+    fast_model = pipeline.fast_lean_extraction_model if lean else pipeline.fast_extraction_model
+    try:
+        response_text = await cascade_text(
+            "extract", model, fast_model, extraction_prompt(review), use_cache, validate=_is_json, problem=extraction_problem
+        )
+        return json.loads(response_text)
+    except Exception as e:
+        return {"error": str(e), "extracted_attributes": []}
+
+async def get_table_match(product_description, extracted_attributes, use_cache=True, lean=False):
+    """Match extracted attributes against the seller description, without reasoning if `lean`."""
+    if not extracted_attributes:
+        return {"result": []} # Nothing to match, skip the call
+    prompt = matching_prompt(product_description, extracted_attributes)
+    model = pipeline.lean_matching_model if lean else pipeline.matching_model
+    fast_model = pipeline.fast_lean_matching_model if lean else pipeline.fast_matching_model
+    try:
+        response_text = await cascade_text(
+            "match", model, fast_model, prompt, use_cache, validate=_is_json,
+            problem=lambda text: matching_problem(text, product_description)
+        )
+        return json.loads(response_text)
+    except Exception as e:
+        return {"error": str(e), "result": []}
+
+async def get_batch_table_match(product_description, batch, use_cache=True, lean=False):
+    """
+    Match the attributes of several reviews in one call, falling back to one call
+    per review for any review the batched response dropped.
+
+    Returns:
+        dict: review_index -> matching response
+    """
+    model = pipeline.lean_batch_matching_model if lean else pipeline.batch_matching_model
+    fast_model = pipeline.fast_lean_batch_matching_model if lean else pipeline.fast_batch_matching_model
+    try:
+        response_text = await cascade_text(
+            "batch_match", model, fast_model, batch_matching_prompt(product_description, batch), use_cache, validate=_is_json,
+            problem=lambda text: batch_matching_problem(text, product_description, batch)
+        )
+        matchings = parse_batch_matching_response(response_text, batch)
+    except Exception as e:
+        print(f"Warning: Batched matching failed, matching reviews individually: {str(e)}")
+        matchings = {}
+    missing = [(index, attributes) for index, attributes in batch if index not in matchings]
+    if missing:
+        responses = await asyncio.gather(*(get_table_match(product_description, attributes, use_cache, lean) for _, attributes in missing))
+        for (index, _), resp in zip(missing, responses):
+            matchings[index] = resp
+    return matchings
+
+async def group_attributes(attributes, use_cache=True, existing_categories=None):
+    """Group attributes into logical categories, preferring `existing_categories` when given."""
+    try:
+        response_text = await generate_text(
+            pipeline.grouping_model, grouping_request(attributes, existing_categories), use_cache=use_cache, validate=_has_answer_tags,
+            stage="group"
+        )
+        return parse_grouping_response(response_text)
+    except Exception as e:
+        print(f"Error during attribute grouping: {str(e)}")
+        return {"error": f"Failed during grouping: {str(e)}"}
+
+async def _group_shard(attributes, use_cache, existing_categories, max_attempts=5, failed=None):
+    """
+    Group one chunk of attributes.
+
+    Parsed answer lines are kept after every attempt; a retry only re-sends the
+    attributes that are still missing, with the categories found so far as hints.
+    Attributes left after `max_attempts` become "uncategorized" and are added to
+    `failed` (a set) if given.
+    """
+    categories = {}
+    remaining = attributes
+    for attempt in range(max_attempts):
+        answer = await group_attributes(
+            ", ".join(remaining), use_cache, existing_categories | set(categories.values())
+        )
+        if isinstance(answer, dict) and not answer.get('error'):
+            categories.update(match_requested_attributes(answer, remaining))
+            remaining = [attr for attr in remaining if attr not in categories]
+            if not remaining:
+                return categories
+        print(f"Retry {attempt+1}/{max_attempts} for grouping ({len(remaining)} of {len(attributes)} attributes left)")
+
+    print(f"Failed to group {len(remaining)} attributes after multiple attempts")
+    categories.update({attr: "uncategorized" for attr in remaining})
+    if failed is not None:
+        failed.update(remaining)
+    return categories
+
+def _count(stats, name, value):
+    if stats is not None:
+        stats[name] = stats.get(name, 0) + value
+
+def _extraction_plan(reviews, prefilter, dedup, stats):
+    """
+    Decide which reviews need an extraction call.
+
+    Returns:
+        dict: representative review index -> indices of the reviews that share its
+        result (itself and its near-duplicates); reviews skipped by the pre-filter are left out
+    """
+    factual = [index for index, review in enumerate(reviews) if not prefilter or review_filter.is_factual(review)]
+    _count(stats, "skipped_reviews", len(reviews) - len(factual))
+    if not dedup:
+        return {index: [index] for index in factual}
+    plan = {}
+    for index, representative in zip(factual, find_duplicates([reviews[index] for index in factual])):
+        plan.setdefault(factual[representative], []).append(index)
+    _count(stats, "duplicate_reviews", len(factual) - len(plan))
+    return plan
+
+def _matching_plan(extracted_attributes_list, stats):
+    """
+    Decide which reviews need a matching call.
+
+    Reviews without attributes need none, and reviews with identical attribute lists
+    (e.g. collapsed duplicates) share one.
+
+    Returns:
+        dict: representative review index -> indices of the reviews that share its result
+    """
+    plan = {}
+    representative_by_key = {}
+    for index, attributes in enumerate(extracted_attributes_list):
+        if not attributes:
+            continue
+        key = json.dumps(attributes, sort_keys=True)
+        representative = representative_by_key.setdefault(key, index)
+        plan.setdefault(representative, []).append(index)
+    planned = sum(len(members) for members in plan.values())
+    _count(stats, "skipped_matches", len(extracted_attributes_list) - planned)
+    _count(stats, "duplicate_matches", planned - len(plan))
+    return plan
+
+def _unplanned(count, plan):
+    planned = {index for members in plan.values() for index in members}
+    return [index for index in range(count) if index not in planned]
+
+def _semaphore(max_concurrency):
+    if max_concurrency is None:
+        return contextlib.nullcontext()
+    return asyncio.Semaphore(max(1, max_concurrency))
+
+async def _bounded_gather(func, items, max_concurrency):
+    """Run func(item) for every item with at most `max_concurrency` calls in flight, keeping order."""
+    semaphore = _semaphore(max_concurrency)
+
+    async def run(item):
+        async with semaphore:
+            return await func(item)
+
+    return await asyncio.gather(*(run(item) for item in items))
+
+async def _bounded_as_completed(func, items, max_concurrency):
+    """Like _bounded_gather, but yield (index, result) pairs as soon as each call finishes."""
+    semaphore = _semaphore(max_concurrency)
+
+    async def run(index, item):
+        async with semaphore:
+            return index, await func(item)
+
+    tasks = [asyncio.ensure_future(run(index, item)) for index, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Stop outstanding calls if the consumer goes away (e.g. a closed stream)
+        for task in tasks:
+            task.cancel()
+
+async def iter_review_attributes(reviews, max_concurrency=DEFAULT_CONCURRENCY, use_cache=True, prefilter=False, dedup=False, stats=None,
+                                 lean=False, failed=None):
+    """
+    Streaming variant of step 1. If `failed` (a set) is given, the indices of the reviews
+    whose extraction call failed are added to it before they are yielded.
+
+    Yields:
+        tuple: (review index, extracted attributes) in completion order, reviews
+        skipped by the pre-filter first; near-duplicates are yielded with their representative
+    """
+    plan = _extraction_plan(reviews, prefilter, dedup, stats)
+    for index in _unplanned(len(reviews), plan):
+        yield index, []
+    representatives = list(plan)
+    async for position, resp in _bounded_as_completed(
+        lambda review: extract_factual_product_details(review, use_cache, lean), [reviews[index] for index in representatives],
+        max_concurrency
+    ):
+        members = plan[representatives[position]]
+        if failed is not None and resp.get('error'):
+            failed.update(members)
+        for index in members:
+            yield index, resp.get('extracted_attributes', [])
+
+async def iter_review_matchings(seller_desc, extracted_attributes_list, max_concurrency=DEFAULT_CONCURRENCY, use_cache=True, batched=False,
+                                stats=None, lean=False, failed=None):
+    """
+    Streaming variant of step 2. If `failed` (a set) is given, the indices of the reviews
+    whose matching call failed are added to it before they are yielded.
+
+    Yields:
+        tuple: (review index, matched rows) in completion order; in batched mode a
+        whole batch of reviews is yielded at once, and reviews without attributes first
+    """
+    plan = _matching_plan(extracted_attributes_list, stats)
+    for index in _unplanned(len(extracted_attributes_list), plan):
+        yield index, []
+    representatives = list(plan)
+    attributes_to_match = [extracted_attributes_list[index] for index in representatives]
+    if batched:
+        batches = plan_match_batches(attributes_to_match)
+        async for _, matchings in _bounded_as_completed(
+            lambda batch: get_batch_table_match(seller_desc, batch, use_cache, lean), batches, max_concurrency
+        ):
+            for position, resp in sorted(matchings.items()):
+                members = plan[representatives[position]]
+                if failed is not None and resp.get('error'):
+                    failed.update(members)
+                for index in members:
+                    yield index, resp.get('result', [])
+    else:
+        async for position, resp in _bounded_as_completed(
+            lambda extracted_attribute: get_table_match(seller_desc, extracted_attribute, use_cache, lean),
+            attributes_to_match,
+            max_concurrency
+        ):
+            members = plan[representatives[position]]
+            if failed is not None and resp.get('error'):
+                failed.update(members)
+            for index in members:
+                yield index, resp.get('result', [])
+
+async def extract_review_attributes(reviews, max_concurrency=DEFAULT_CONCURRENCY, use_cache=True, prefilter=False, dedup=False, stats=None,
+                                    lean=False, failed=None) -> list:
+    """
+    Step 1: Extract factual details from multiple product reviews.
+
+    Args:
+        reviews (list[str]): List of product reviews
+        max_concurrency (int): Maximum number of model calls in flight for this step, None for no cap
+        use_cache (bool): Whether to serve repeated calls from the response cache
+        prefilter (bool): Skip reviews without factual content ("Great!", "5 stars") without a model call
+        dedup (bool): Extract near-duplicate reviews once and copy the result to every copy
+        stats (dict): If given, "skipped_reviews" and "duplicate_reviews" are incremented
+        lean (bool): Use the lean schema, which answers without chain_of_thought and discarded_opinions
+        failed (set): If given, the indices of the reviews whose extraction call failed are added
+
+    Returns:
+        list: List of extracted attributes from each review
+    """
+    print("Starting attribute extraction...")
+    plan = _extraction_plan(reviews, prefilter, dedup, stats)
+    responses = await _bounded_gather(
+        lambda review: extract_factual_product_details(review, use_cache, lean), [reviews[index] for index in plan], max_concurrency
+    )
+    extracted_attributes = [[] for _ in reviews]
+    for members, resp in zip(plan.values(), responses):
+        for index in members:
+            extracted_attributes[index] = resp.get('extracted_attributes', [])
+        if failed is not None and resp.get('error'):
+            failed.update(members)
+    print(f"Extracted attributes from {len(reviews)} reviews with {len(plan)} calls")
+    return extracted_attributes
+
+async def match_with_description(seller_desc, extracted_attributes_list, max_concurrency=DEFAULT_CONCURRENCY, use_cache=True, batched=False,
+                                 stats=None, lean=False, failed=None):
+    """
+    Step 2: Match extracted attributes against seller description.
+
+    Args:
+        seller_desc (str): The seller's product description
+        extracted_attributes_list (list): List of extracted attributes from reviews
+        max_concurrency (int): Maximum number of model calls in flight for this step, None for no cap
+        use_cache (bool): Whether to serve repeated calls from the response cache
+        batched (bool): Match several reviews per call, sending the seller description once per batch
+        stats (dict): If given, "skipped_matches" (reviews without attributes) and
+            "duplicate_matches" (reviews sharing another review's attribute list) are incremented
+        lean (bool): Use the lean schema, which answers without reasoning
+        failed (set): If given, the indices of the reviews whose matching call failed are added
+
+    Returns:
+        list: Per-review lists of MatchRecord
+    """
+    print("Starting attribute matching...")
+    plan = _matching_plan(extracted_attributes_list, stats)
+    attributes_to_match = [extracted_attributes_list[index] for index in plan]
+    if batched:
+        batches = plan_match_batches(attributes_to_match)
+        print(f"Matching {len(extracted_attributes_list)} reviews in {len(batches)} batched calls")
+        batch_matchings = await _bounded_gather(
+            lambda batch: get_batch_table_match(seller_desc, batch, use_cache, lean), batches, max_concurrency
+        )
+        matchings = merge_batch_matchings(batch_matchings, len(attributes_to_match))
+    else:
+        matchings = await _bounded_gather(
+            lambda extracted_attribute: get_table_match(seller_desc, extracted_attribute, use_cache, lean),
+            attributes_to_match,
+            max_concurrency
+        )
+    review_matchings = [{"result": []} for _ in extracted_attributes_list]
+    for members, resp in zip(plan.values(), matchings):
+        for index in members:
+            review_matchings[index] = resp
+        if failed is not None and resp.get('error'):
+            failed.update(members)
+    print("Attribute matching completed")
+    return matchings_to_records(review_matchings)
+
+class _SpeculativeGrouping:
+    """
+    Sharded grouping that starts while matching is still running.
+
+    Attributes are taken from matched records as they come in; every GROUPING_SHARD_SIZE
+    new ones (not in the category memory) are grouped right away. finish() groups the
+    rest and reconciles the shards' labels, as categorize_attributes(sharded=True) does.
+    """
+
+    def __init__(self, use_cache):
+        self.use_cache = use_cache
+        self.seen = set()
+        self.pending = []
+        self.remembered = {}
+        self.tasks = []
+
+    def add(self, records):
+        new_attributes = [attr for attr in collect_unique_attributes([records]) if attr not in self.seen]
+        if not new_attributes:
+            return
+        self.seen.update(new_attributes)
+        remembered = category_memory.lookup(new_attributes) if self.use_cache else {}
+        self.remembered.update(remembered)
+        self.pending += [attr for attr in new_attributes if attr not in remembered]
+        while len(self.pending) >= GROUPING_SHARD_SIZE:
+            self._start(self.pending[:GROUPING_SHARD_SIZE])
+            self.pending = self.pending[GROUPING_SHARD_SIZE:]
+
+    def _start(self, shard):
+        # Sorted so the grouping prompt is stable for the cache
+        self.tasks.append(asyncio.ensure_future(
+            _group_shard(sorted(shard), self.use_cache, set(self.remembered.values()))
+        ))
+
+    def cancel(self):
+        for task in self.tasks:
+            task.cancel()
+
+    async def finish(self):
+        """
+        Returns:
+            tuple: (categories dict, list of all unique attributes), like categorize_attributes
+        """
+        if self.pending:
+            self._start(self.pending)
+            self.pending = []
+        print(f"Grouping {len(self.seen)} attributes: {len(self.tasks)} speculative calls, {len(self.remembered)} from category memory")
+        shard_categories = await asyncio.gather(*self.tasks)
+        existing_categories = set(self.remembered.values())
+        categories = reconcile_category_labels(
+            {attr: category for shard in shard_categories for attr, category in shard.items()}, existing_categories
+        )
+        category_memory.remember({attr: category for attr, category in categories.items() if category != "uncategorized"})
+        return {**categories, **self.remembered}, sorted(self.seen)
+
+async def extract_and_match(seller_desc, reviews, max_concurrency=DEFAULT_CONCURRENCY, use_cache=True, batched=False,
+                            canonical_attributes=False, prefilter=False, dedup=False, stats=None, on_records=None, lean=False):
+    """
+    Steps 1 and 2 without a barrier between them: each review is matched as soon as
+    its own extraction is in, instead of after the slowest extraction.
+
+    Reviews with identical (canonicalized) attribute lists share one matching call, as
+    in match_with_description. In batched mode reviews are packed into batches as they
+    arrive and a batch is sent once the next review would not fit. With
+    canonical_attributes, names are canonicalized in extraction completion order.
+
+    Args:
+        seller_desc (str): The seller's product description
+        reviews (list[str]): List of product reviews
+        max_concurrency (int): Maximum number of model calls in flight per step, None for no cap
+        use_cache (bool): Whether to serve repeated calls from the response cache
+        batched (bool): Match several reviews per call
+        canonical_attributes (bool): Merge near-duplicate attribute names before matching
+        prefilter (bool): Skip reviews without factual content without a model call
+        dedup (bool): Extract near-duplicate reviews once
+        stats (dict): If given, the skipped and duplicate review and match counts are incremented
+        on_records (callable): Called with the records of each distinct matching as soon as it is in
+        lean (bool): Use the lean schemas, which answer without the reasoning fields
+
+    Returns:
+        list: Per-review lists of MatchRecord, like match_with_description
+    """
+    semaphore = _semaphore(max_concurrency)
+    attribute_index = AttributeIndex() if canonical_attributes else None
+    members = {} # attribute list key -> review indices sharing its matching
+    tasks = [] # matching calls, each resolving to {attribute list key: records}
+    pending_batch = [] # (key, attributes) not yet sent in batched mode
+
+    def finished(records):
+        if on_records is not None:
+            on_records(records)
+        return records
+
+    async def match_one(key, attributes):
+        async with semaphore:
+            resp = await get_table_match(seller_desc, attributes, use_cache, lean)
+        return {key: finished(records_from_rows(resp.get('result') or []))}
+
+    async def match_batch(batch):
+        async with semaphore:
+            matchings = await get_batch_table_match(
+                seller_desc, [(position, attributes) for position, (_, attributes) in enumerate(batch)], use_cache, lean
+            )
+        return {
+            key: finished(records_from_rows(matchings.get(position, {}).get('result') or []))
+            for position, (key, _) in enumerate(batch)
+        }
+
+    def send_batches(flush):
+        # Every batch but the last is full; the last one waits for more reviews unless flushing
+        batches = plan_match_batches([attributes for _, attributes in pending_batch])
+        sent = 0
+        for batch in (batches if flush else batches[:-1]):
+            tasks.append(asyncio.ensure_future(match_batch([pending_batch[position] for position, _ in batch])))
+            sent += len(batch)
+        del pending_batch[:sent]
+
+    try:
+        async for index, attributes in iter_review_attributes(reviews, max_concurrency, use_cache, prefilter, dedup, stats, lean):
+            if attribute_index is not None:
+                attributes = attribute_index.canonicalize([attributes])[0]
+            if not attributes:
+                _count(stats, "skipped_matches", 1)
+                continue
+            key = json.dumps(attributes, sort_keys=True)
+            if key in members:
+                members[key].append(index)
+                _count(stats, "duplicate_matches", 1)
+                continue
+            members[key] = [index]
+            if batched:
+                pending_batch.append((key, attributes))
+                send_batches(flush=False)
+            else:
+                tasks.append(asyncio.ensure_future(match_one(key, attributes)))
+        if batched:
+            send_batches(flush=True)
+        all_records = [[] for _ in reviews]
+        for matchings in await asyncio.gather(*tasks):
+            for key, records in matchings.items():
+                for index in members[key]:
+                    all_records[index] = records
+    finally:
+        # Stop outstanding calls if extraction failed or the caller went away
+        for task in tasks:
+            task.cancel()
+    if attribute_index is not None:
+        print(f"Canonicalized attributes into {len(attribute_index)} distinct names")
+    print(f"Extracted and matched {len(reviews)} reviews with {len(tasks)} matching calls")
+    return all_records
+
+async def categorize_attributes(all_records, use_cache=True, known_categories=None, sharded=False, failed=None):
+    """
+    Step 3: Group attributes into logical categories.
+
+    Args:
+        all_records (list): Per-review lists of matched attribute records
+        use_cache (bool): Whether to serve repeated calls from the response cache and
+            attributes from the category memory
+        known_categories (dict): Attribute -> category map from an earlier run; only
+            attributes not in it are sent to the model, together with its category names
+        sharded (bool): Group chunks of GROUPING_SHARD_SIZE attributes concurrently and
+            reconcile their category labels, instead of one call for all attributes
+        failed (set): If given, the attributes that fell back to "uncategorized" because
+            their grouping calls failed are added
+
+    Returns:
+        tuple: (categories dict including the known ones, list of all unique attributes)
+    """
+    known_categories = known_categories or {}
+    all_attributes = collect_unique_attributes(all_records)
+
+    if not all_attributes:
+        print("No attributes found in reviews")
+        return dict(known_categories), []
+
+    new_attributes = [attr for attr in all_attributes if attr not in known_categories]
+    if not new_attributes:
+        print("All attributes already categorized")
+        return dict(known_categories), all_attributes
+
+    # Attributes seen in earlier runs (any product) come from the category memory
+    remembered = category_memory.lookup(new_attributes) if use_cache else {}
+    novel_attributes = [attr for attr in new_attributes if attr not in remembered]
+    if not novel_attributes:
+        print(f"All {len(new_attributes)} attributes found in category memory")
+        return {**remembered, **known_categories}, all_attributes
+
+    existing_categories = set(known_categories.values()) | set(remembered.values())
+    shards = plan_grouping_shards(novel_attributes, GROUPING_SHARD_SIZE if sharded else len(novel_attributes))
+    print(
+        f"Starting attribute grouping for {len(novel_attributes)} attributes in {len(shards)} calls "
+        f"({len(remembered)} from category memory)..."
+    )
+    shard_categories = await asyncio.gather(
+        *(_group_shard(shard, use_cache, existing_categories, failed=failed) for shard in shards)
+    )
+    # Shards are grouped independently, so the same category can come back spelled differently
+    categories = reconcile_category_labels(
+        {attr: category for shard in shard_categories for attr, category in shard.items()}, existing_categories
+    )
+    category_memory.remember({attr: category for attr, category in categories.items() if category != "uncategorized"})
+
+    return {**categories, **remembered, **known_categories}, all_attributes
+
+async def complete_pipeline(seller_desc, reviews, max_concurrency=DEFAULT_CONCURRENCY, use_cache=True, batched_matching=False,
+                            sharded_grouping=False, canonical_attributes=False, prefilter_reviews=False, dedup_reviews=False, stats=None,
+                            pipelined=False, lean_schema=False):
+    """
+    Complete product review analysis pipeline.
+
+    Pipelined, each review goes from extraction straight into matching (see
+    extract_and_match), and with sharded grouping, attributes are grouped while
+    matching is still running. Otherwise each step is awaited in sequence.
+
+    Args:
+        seller_desc (str): The seller's product description
+        reviews (list[str]): List of product reviews
+        max_concurrency (int): Maximum number of model calls in flight for this step, None for no cap per step
+        use_cache (bool): Whether to serve repeated calls from the response cache
+        batched_matching (bool): Match several reviews per call in step 2
+        sharded_grouping (bool): Group attributes in concurrent chunks in step 3
+        canonical_attributes (bool): Merge near-duplicate attribute names after step 1
+        prefilter_reviews (bool): Skip reviews without factual content before step 1
+        dedup_reviews (bool): Run steps 1 and 2 once per cluster of near-duplicate reviews
+        stats (dict): If given, filled with skipped and duplicate review counts
+        pipelined (bool): Overlap the steps instead of waiting for each to finish. Off by default:
+            with canonical_attributes, canonical names then follow the order reviews finish in,
+            so two runs on the same input can name and categorize attributes differently
+        lean_schema (bool): Extract and match without the reasoning fields in the responses
+
+    Returns:
+        dict: Categorized product attributes with matching status
+    """
+    if pipelined:
+        return await _pipelined_pipeline(
+            seller_desc, reviews, max_concurrency, use_cache, batched_matching, sharded_grouping, canonical_attributes,
+            prefilter_reviews, dedup_reviews, stats, lean_schema
+        )
+
+    with metrics.stage_timer("extract"):
+        extracted_attributes = await extract_review_attributes(
+            reviews, max_concurrency, use_cache, prefilter_reviews, dedup_reviews, stats, lean=lean_schema
+        )
+
+    if canonical_attributes:
+        with metrics.stage_timer("canonicalize"):
+            attribute_index = AttributeIndex()
+            extracted_attributes = attribute_index.canonicalize(extracted_attributes)
+        print(f"Canonicalized attributes into {len(attribute_index)} distinct names")
+
+    with metrics.stage_timer("match"):
+        all_records = await match_with_description(
+            seller_desc, extracted_attributes, max_concurrency, use_cache, batched_matching, stats, lean=lean_schema
+        )
+
+    if not all_records:
+        print("No valid matching results found")
+        return {}
+
+    with metrics.stage_timer("categorize"):
+        categories, all_attributes = await categorize_attributes(all_records, use_cache, sharded=sharded_grouping)
+
+    if not all_attributes:
+        return {}
+
+    with metrics.stage_timer("organize"):
+        result = organize_results(all_records, categories)
+
+    print("Pipeline completed successfully")
+    return result
+
+async def _pipelined_pipeline(seller_desc, reviews, max_concurrency, use_cache, batched_matching, sharded_grouping,
+                              canonical_attributes, prefilter_reviews, dedup_reviews, stats, lean_schema):
+    grouping = _SpeculativeGrouping(use_cache) if sharded_grouping else None
+    try:
+        with metrics.stage_timer("extract_match"):
+            all_records = await extract_and_match(
+                seller_desc, reviews, max_concurrency, use_cache, batched_matching, canonical_attributes,
+                prefilter_reviews, dedup_reviews, stats, on_records=grouping.add if grouping else None, lean=lean_schema
+            )
+
+        if not all_records:
+            print("No valid matching results found")
+            return {}
+
+        with metrics.stage_timer("categorize"):
+            if grouping is not None:
+                categories, all_attributes = await grouping.finish()
+            else:
+                categories, all_attributes = await categorize_attributes(all_records, use_cache)
+    finally:
+        if grouping is not None:
+            grouping.cancel()
+
+    if not all_attributes:
+        return {}
+
+    with metrics.stage_timer("organize"):
+        result = organize_results(all_records, categories)
+
+    print("Pipeline completed successfully")
+    return result
@@ -0,0 +1,148 @@
+import os
+import re
+from category_memory import normalize_attribute
+
+# Minimum character-trigram similarity (Dice coefficient) for two attribute names
+# to be treated as the same attribute, overridable through the environment
+ATTRIBUTE_SIMILARITY = float(os.environ.get("PRAISE_ATTRIBUTE_SIMILARITY", 0.8))
+
+_WHITESPACE = re.compile(r"\s+")
+_NUMBER = re.compile(r"\d+")
+
+
+def _singular(word):
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("sses", "shes", "ches", "xes", "zes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def canonical_key(name):
+    """Comparison key of an attribute name: normalized case, spacing and punctuation, singular words."""
+    return " ".join(_singular(word) for word in normalize_attribute(name).split())
+
+
+def _trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _similarity(grams, other_grams):
+    return 2 * len(grams & other_grams) / (len(grams) + len(other_grams))
+
+
+class AttributeIndex:
+    """
+    Maps the attribute names produced by extraction to canonical names.
+
+    Names with the same canonical_key ("Weight", "weight ", "weights") always share
+    a canonical name; other names join the most similar existing attribute if their
+    character-trigram similarity reaches `threshold` ("noise cancelation" / "noise cancellation")
+    and they contain the same numbers ("wifi 5 support" and "wifi 6 support" stay apart). The
+    canonical name is the first surface form seen, so adding reviews later never
+    renames existing attributes. Synonyms without shared spelling ("heaviness")
+    stay separate.
+    """
+
+    def __init__(self, threshold=ATTRIBUTE_SIMILARITY):
+        self.threshold = threshold
+        self._canonical_by_key = {}  # canonical_key -> canonical name
+        self._surface_forms = {}  # canonical name -> surface forms in order seen
+        self._grams = {}  # canonical name -> trigrams of its key
+        self._numbers = {}  # canonical name -> numbers in its key, in order
+        self._names_by_gram = {}  # trigram -> canonical names containing it
+
+    def _closest(self, grams, numbers):
+        candidates = {name for gram in grams for name in self._names_by_gram.get(gram, ())}
+        best, best_score = None, self.threshold
+        for name in sorted(candidates):
+            # Names differing only in a number are different specs, however similar they look
+            if self._numbers[name] != numbers:
+                continue
+            score = _similarity(grams, self._grams[name])
+            if score >= best_score:
+                best, best_score = name, score
+        return best
+
+    def add(self, surface):
+        """
+        Register one attribute name and return its canonical name.
+
+        Args:
+            surface (str): The attribute name as extracted
+
+        Returns:
+            str: Canonical name; the trimmed surface form itself if it starts a new attribute
+        """
+        surface = _WHITESPACE.sub(" ", str(surface)).strip()
+        key = canonical_key(surface)
+        canonical = self._canonical_by_key.get(key)
+        if canonical is None and key:
+            canonical = self._closest(_trigrams(key), _NUMBER.findall(key))
+        self._register(canonical or surface, surface, key)
+        return canonical or surface
+
+    def _register(self, canonical, surface, key):
+        if canonical not in self._surface_forms:
+            self._surface_forms[canonical] = []
+            canonical_name_key = canonical_key(canonical)
+            self._grams[canonical] = grams = _trigrams(canonical_name_key)
+            self._numbers[canonical] = _NUMBER.findall(canonical_name_key)
+            for gram in grams:
+                self._names_by_gram.setdefault(gram, []).append(canonical)
+        self._canonical_by_key.setdefault(key, canonical)
+        forms = self._surface_forms[canonical]
+        if surface not in forms:
+            forms.append(surface)
+
+    def canonicalize(self, extracted_attributes_list):
+        """
+        Rename the attributes of extracted rows to their canonical names.
+
+        Rows of one review that collapse to the same canonical attribute are merged,
+        keeping the first row.
+
+        Args:
+            extracted_attributes_list (list): Per-review lists of {"attribute", "value"} rows
+
+        Returns:
+            list: Per-review lists of rows with canonical attribute names
+        """
+        canonical_list = []
+        for rows in extracted_attributes_list:
+            seen = set()
+            canonical_rows = []
+            for row in rows:
+                if not isinstance(row, dict) or row.get("attribute") is None:
+                    canonical_rows.append(row)
+                    continue
+                canonical = self.add(row["attribute"])
+                if canonical in seen:
+                    continue
+                seen.add(canonical)
+                canonical_rows.append({**row, "attribute": canonical})
+            canonical_list.append(canonical_rows)
+        return canonical_list
+
+    def surface_forms(self, canonical):
+        """Original names that were mapped to `canonical`."""
+        return list(self._surface_forms.get(canonical, ()))
+
+    def to_dict(self):
+        """Serializable form: canonical name -> surface forms."""
+        return {canonical: list(forms) for canonical, forms in self._surface_forms.items()}
+
+    @classmethod
+    def from_dict(cls, data, threshold=ATTRIBUTE_SIMILARITY):
+        """Rebuild an index saved with to_dict."""
+        index = cls(threshold)
+        for canonical, forms in (data or {}).items():
+            for surface in forms or [canonical]:
+                index._register(canonical, surface, canonical_key(surface))
+        return index
+
+    def __len__(self):
+        return len(self._surface_forms)
@@ -0,0 +1,607 @@
+import argparse
+import asyncio
+import csv
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Batch job settings, overridable through the environment
+BATCH_DIR = os.environ.get(
+    "PRAISE_BATCH_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "batch_jobs")
+)
+BATCH_PROCESSES = int(os.environ.get("PRAISE_BATCH_PROCESSES", min(4, os.cpu_count() or 1)))
+# Model calls in flight across all worker processes of a job
+BATCH_MAX_CONCURRENCY = int(os.environ.get("PRAISE_BATCH_MAX_CONCURRENCY", 32))
+# Products handed to a worker at a time; they run concurrently within the worker
+BATCH_CHUNK_SIZE = int(os.environ.get("PRAISE_BATCH_CHUNK_SIZE", 8))
+# Directory /batch_job_start may read input files from; empty accepts uploaded content only
+BATCH_INPUT_DIR = os.environ.get("PRAISE_BATCH_INPUT_DIR", "")
+
+# Per-product options, with the same defaults as a session
+JOB_OPTIONS = {
+    "use_cache": True,
+    "batched_matching": False,
+    "sharded_grouping": False,
+    "canonical_attributes": False,
+    "prefilter_reviews": False,
+    "dedup_reviews": False,
+    "lean_schema": False,
+    "hedge_requests": None, # None follows PRAISE_HEDGE_REQUESTS
+}
+# Checkpointed steps in pipeline order; "organize" holds the product's final result
+STEPS = ("extract", "match", "categorize", "organize")
+
+
+def _partial_step(step):
+    """Checkpoint name of a step's per-review results while some of its reviews' calls have failed."""
+    return f"{step}_partial"
+
+
+def _parse_reviews(value):
+    if isinstance(value, list):
+        return [str(review) for review in value]
+    text = str(value or "").strip()
+    if text.startswith("["):
+        try:
+            reviews = json.loads(text)
+            if isinstance(reviews, list):
+                return [str(review) for review in reviews]
+        except ValueError:
+            pass
+    return [text] if text else []
+
+
+def read_products(source, input_format=None):
+    """
+    Read the products of a batch input file.
+
+    JSONL has one {"product_id", "seller_description", "reviews": [...]} object per line.
+    CSV has product_id, seller_description and reviews (or review) columns; the review
+    cell is either a JSON list or a single review, and rows sharing a product_id are
+    combined, so one row per review works too.
+
+    Args:
+        source (str | file): Path or open text file
+        input_format (str): "jsonl" or "csv"; taken from the file extension if omitted
+
+    Returns:
+        list[dict]: Products in input order
+    """
+    if isinstance(source, str):
+        if input_format is None:
+            input_format = "csv" if source.lower().endswith(".csv") else "jsonl"
+        with open(source, newline="", encoding="utf-8") as f:
+            return read_products(f, input_format)
+
+    products = {}
+    if input_format == "csv":
+        csv.field_size_limit(sys.maxsize)
+        for line, row in enumerate(csv.DictReader(source), start=2):
+            product_id = (row.get("product_id") or "").strip()
+            if not product_id:
+                raise ValueError(f"Line {line}: missing product_id")
+            product = products.setdefault(product_id, {
+                "product_id": product_id,
+                "seller_description": row.get("seller_description") or "",
+                "reviews": [],
+            })
+            product["reviews"].extend(_parse_reviews(row.get("reviews", row.get("review"))))
+    elif input_format == "jsonl":
+        for line, text in enumerate(source, start=1):
+            if not text.strip():
+                continue
+            try:
+                item = json.loads(text)
+            except ValueError as e:
+                raise ValueError(f"Line {line}: invalid JSON ({str(e)})")
+            if not isinstance(item, dict) or item.get("product_id") in (None, ""):
+                raise ValueError(f"Line {line}: missing product_id")
+            product_id = str(item["product_id"])
+            if product_id in products:
+                raise ValueError(f"Line {line}: duplicate product_id {product_id}")
+            products[product_id] = {
+                "product_id": product_id,
+                "seller_description": str(item.get("seller_description") or ""),
+                "reviews": _parse_reviews(item.get("reviews")),
+            }
+    else:
+        raise ValueError(f"Unsupported input format: {input_format}")
+    return list(products.values())
+
+
+def resolve_input_path(input_path, input_dir=BATCH_INPUT_DIR):
+    """
+    The real path of an input file requested over the API, which must lie inside `input_dir`.
+
+    Raises:
+        PermissionError: No input directory is configured, or the path leads out of it
+    """
+    if not input_dir:
+        raise PermissionError("Reading input files on the server is disabled; send the file as content")
+    root = os.path.realpath(input_dir)
+    path = os.path.realpath(os.path.join(root, input_path))
+    if os.path.commonpath([root, path]) != root:
+        raise PermissionError(f"Input path is outside the batch input directory: {input_path}")
+    return path
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+
+
+class BatchJob:
+    """
+    A batch of products analysed offline, checkpointed in one SQLite file per job.
+
+    Every finished step of every product is written to the `checkpoints` table as
+    soon as it completes, so a job can be resumed after a crash or restart and only
+    runs the steps that have no checkpoint yet. Calls made within an interrupted
+    step are usually served from the response cache on the next run.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.job_id = os.path.basename(os.path.normpath(path))
+        self._conn = sqlite3.connect(os.path.join(path, "job.sqlite3"), check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, products, options=None, input_path=None, base_dir=BATCH_DIR, job_id=None):
+        """
+        Create a job directory holding the products and options.
+
+        Args:
+            products (list[dict]): Products as returned by read_products
+            options (dict): Overrides of JOB_OPTIONS
+            input_path (str): Where the products came from, for reference
+
+        Returns:
+            BatchJob
+        """
+        unknown = set(options or {}) - set(JOB_OPTIONS)
+        if unknown:
+            raise ValueError(f"Unknown job options: {', '.join(sorted(unknown))}")
+        job_id = job_id or time.strftime("%Y%m%d-%H%M%S-") + uuid.uuid4().hex[:8]
+        path = os.path.join(base_dir, job_id)
+        os.makedirs(path)
+        job = cls(path)
+        with job._lock, job._conn:
+            job._conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            job._conn.execute(
+                "CREATE TABLE products (position INTEGER PRIMARY KEY, product_id TEXT NOT NULL UNIQUE, "
+                "seller_description TEXT NOT NULL, reviews TEXT NOT NULL, num_reviews INTEGER NOT NULL, "
+                "status TEXT NOT NULL DEFAULT 'pending', error TEXT, updated_at REAL)"
+            )
+            job._conn.execute(
+                "CREATE TABLE checkpoints (product_id TEXT NOT NULL, step TEXT NOT NULL, result TEXT NOT NULL, "
+                "updated_at REAL NOT NULL, PRIMARY KEY (product_id, step))"
+            )
+            job._conn.executemany(
+                "INSERT INTO products (position, product_id, seller_description, reviews, num_reviews) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (position, product["product_id"], product["seller_description"], json.dumps(product["reviews"]), len(product["reviews"]))
+                    for position, product in enumerate(products)
+                ]
+            )
+        job._set_meta(
+            options={**JOB_OPTIONS, **(options or {})}, input_path=input_path, created_at=time.time(), status="created"
+        )
+        return job
+
+    def _set_meta(self, **values):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [(key, json.dumps(value)) for key, value in values.items()]
+            )
+
+    def meta(self):
+        with self._lock:
+            return {key: json.loads(value) for key, value in self._conn.execute("SELECT key, value FROM meta")}
+
+    @property
+    def options(self):
+        return self.meta()["options"]
+
+    def product(self, product_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT seller_description, reviews FROM products WHERE product_id = ?", (product_id,)
+            ).fetchone()
+        return {"product_id": product_id, "seller_description": row[0], "reviews": json.loads(row[1])}
+
+    def pending_products(self):
+        """Ids of the products without a final result, in input order."""
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT product_id FROM products WHERE status != 'done' ORDER BY position")]
+
+    def checkpoints(self, product_id):
+        """step -> saved result for one product."""
+        with self._lock:
+            rows = self._conn.execute("SELECT step, result FROM checkpoints WHERE product_id = ?", (product_id,)).fetchall()
+        return {step: json.loads(result) for step, result in rows}
+
+    def save_checkpoint(self, product_id, step, result):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints (product_id, step, result, updated_at) VALUES (?, ?, ?, ?)",
+                (product_id, step, json.dumps(result), now)
+            )
+            # A finished step replaces the partial results of an earlier run
+            self._conn.execute("DELETE FROM checkpoints WHERE product_id = ? AND step = ?", (product_id, _partial_step(step)))
+            if step == STEPS[-1]:
+                self._conn.execute(
+                    "UPDATE products SET status = 'done', error = NULL, updated_at = ? WHERE product_id = ?", (now, product_id)
+                )
+
+    def mark_failed(self, product_id, error):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE products SET status = 'failed', error = ?, updated_at = ? WHERE product_id = ?",
+                (error, time.time(), product_id)
+            )
+
+    def result(self, product_id):
+        """Final organized result of a product, None until it is done."""
+        return self.checkpoints(product_id).get(STEPS[-1])
+
+    def iter_results(self):
+        """(product_id, result) for every finished product, in input order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT p.product_id, c.result FROM products p JOIN checkpoints c ON c.product_id = p.product_id "
+                "WHERE c.step = ? ORDER BY p.position", (STEPS[-1],)
+            ).fetchall()
+        for product_id, result in rows:
+            yield product_id, json.loads(result)
+
+    def progress(self):
+        """Product and review counts, per-step checkpoints and the throughput of the current or last run."""
+        meta = self.meta()
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM products GROUP BY status").fetchall())
+            reviews_total, = self._conn.execute("SELECT COALESCE(SUM(num_reviews), 0) FROM products").fetchone()
+            steps = dict(self._conn.execute("SELECT step, COUNT(*) FROM checkpoints GROUP BY step").fetchall())
+            errors = self._conn.execute(
+                "SELECT product_id, error FROM products WHERE status = 'failed' ORDER BY position LIMIT 10"
+            ).fetchall()
+            run_started_at = meta.get("run_started_at")
+            run_done, run_reviews = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(num_reviews), 0) FROM products WHERE status = 'done' AND updated_at >= ?",
+                (run_started_at or 0,)
+            ).fetchone()
+        status = meta["status"]
+        if status == "running" and not _pid_alive(meta.get("pid", 0)):
+            status = "interrupted"
+        elapsed = None
+        if run_started_at:
+            elapsed = (meta.get("run_finished_at") if status != "running" else None) or time.time()
+            elapsed -= run_started_at
+        products_total = sum(counts.values())
+        remaining = products_total - counts.get("done", 0)
+        products_per_second = run_done / elapsed if elapsed else 0.0
+        return {
+            "job_id": self.job_id,
+            "status": status,
+            "options": meta["options"],
+            "input_path": meta.get("input_path"),
+            "products": products_total,
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "pending": counts.get("pending", 0),
+            "reviews": reviews_total,
+            "checkpoints": {step: steps.get(step, 0) for step in STEPS},
+            "errors": [{"product_id": product_id, "error": error} for product_id, error in errors],
+            "processes": meta.get("processes"),
+            "max_concurrency": meta.get("max_concurrency"),
+            "elapsed_seconds": elapsed,
+            "products_per_minute": products_per_second * 60,
+            "reviews_per_second": run_reviews / elapsed if elapsed else 0.0,
+            "eta_seconds": remaining / products_per_second if products_per_second and status == "running" else None,
+        }
+
+
+def open_job(job_id, base_dir=BATCH_DIR):
+    """Open an existing job; raises KeyError if there is none with this id."""
+    path = os.path.join(base_dir, os.path.basename(job_id or ""))
+    if not job_id or not os.path.isfile(os.path.join(path, "job.sqlite3")):
+        raise KeyError(job_id)
+    return BatchJob(path)
+
+
+def list_jobs(base_dir=BATCH_DIR):
+    """Ids of the jobs in `base_dir`, oldest first."""
+    if not os.path.isdir(base_dir):
+        return []
+    return sorted(name for name in os.listdir(base_dir) if os.path.isfile(os.path.join(base_dir, name, "job.sqlite3")))
+
+
+# --- Worker processes ---
+_worker_job = None
+_worker_loop = None
+
+
+def _init_worker(job_path, api_key, max_concurrency, api_keys=()):
+    """Configure a worker process: API key(s), its share of the job's model-call budget and one event loop."""
+    global _worker_job, _worker_loop
+    import google.generativeai as genai
+    from concurrency import model_call_limiter
+    from key_pool import key_pool
+    if api_key:
+        genai.configure(api_key=api_key)
+    # Every worker spreads its calls over the whole pool and learns the keys' quotas on its own
+    key_pool.configure(api_keys)
+    model_call_limiter.set_max_limit(max_concurrency)
+    _worker_job = BatchJob(job_path)
+    # One loop for the life of the process, so the model clients are not rebuilt per chunk
+    _worker_loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_worker_loop)
+
+
+async def _run_reviews(job, product_id, done, step, count, run, stats):
+    """
+    Per-review results of `step`, retrying only the reviews whose calls failed in an earlier run.
+
+    `run(indices, stats, failed)` returns the results of the reviews at `indices` and
+    adds the positions (within `indices`) of the reviews whose calls failed to `failed`.
+    While any review has failed, the results are saved as a partial checkpoint listing
+    the failed reviews and an error is raised, so the product is marked failed and a
+    resumed job retries just those reviews.
+
+    Returns:
+        tuple: (per-review results, stats)
+    """
+    partial = done.get(_partial_step(step))
+    if partial is None:
+        indices, results = list(range(count)), [[] for _ in range(count)]
+    else:
+        indices, results, stats = partial["failed_reviews"], partial["results"], partial["stats"]
+    failed = set()
+    # A retry's skip and duplicate counts are already in the partial stats
+    retried = await run(indices, stats if partial is None else None, failed)
+    for index, result in zip(indices, retried):
+        results[index] = result
+    failed_reviews = sorted(indices[position] for position in failed)
+    if failed_reviews:
+        job.save_checkpoint(product_id, _partial_step(step), {"results": results, "stats": stats, "failed_reviews": failed_reviews})
+        raise RuntimeError(f"{step} failed for {len(failed_reviews)} of {count} reviews; resume the job to retry them")
+    return results, stats
+
+
+async def process_product(job, product_id, options):
+    """
+    Run the steps of one product that have no checkpoint yet, checkpointing each.
+
+    A step is only checkpointed once all its model calls have succeeded; see
+    _run_reviews for reviews whose calls failed. Categorization is checkpointed only
+    if no attribute fell back to "uncategorized" after failed grouping calls.
+
+    Returns:
+        dict: The product's organized results
+    """
+    from async_pipeline import categorize_attributes, extract_review_attributes, match_with_description
+    from concurrency import set_hedging
+    from attribute_index import AttributeIndex
+    from pipeline import organize_results
+    from records import records_to_rows
+
+    product = job.product(product_id)
+    done = job.checkpoints(product_id)
+    set_hedging(options.get("hedge_requests"))
+    lean = options.get("lean_schema", False)
+    if "extract" not in done:
+        reviews = product["reviews"]
+
+        async def extract(indices, stats, failed):
+            return await extract_review_attributes(
+                [reviews[index] for index in indices], None, options["use_cache"], options["prefilter_reviews"],
+                options["dedup_reviews"], stats, lean=lean, failed=failed
+            )
+
+        extracted_attributes, stats = await _run_reviews(
+            job, product_id, done, "extract", len(reviews), extract, {"skipped_reviews": 0, "duplicate_reviews": 0}
+        )
+        if options["canonical_attributes"]:
+            extracted_attributes = AttributeIndex().canonicalize(extracted_attributes)
+        done["extract"] = {"extracted_attributes": extracted_attributes, **stats}
+        job.save_checkpoint(product_id, "extract", done["extract"])
+    if "match" not in done:
+        extracted_attributes = done["extract"]["extracted_attributes"]
+
+        async def match(indices, stats, failed):
+            return records_to_rows(await match_with_description(
+                product["seller_description"], [extracted_attributes[index] for index in indices], None,
+                options["use_cache"], options["batched_matching"], stats, lean=lean, failed=failed
+            ))
+
+        all_dataframes, stats = await _run_reviews(
+            job, product_id, done, "match", len(extracted_attributes), match, {"skipped_matches": 0, "duplicate_matches": 0}
+        )
+        done["match"] = {"all_dataframes": all_dataframes, **stats}
+        job.save_checkpoint(product_id, "match", done["match"])
+    if "categorize" not in done:
+        failed = set()
+        categories, _ = await categorize_attributes(
+            done["match"]["all_dataframes"], options["use_cache"], sharded=options["sharded_grouping"], failed=failed
+        )
+        if failed:
+            # Not checkpointed: a resumed job groups again (successful calls come from the cache)
+            raise RuntimeError(f"categorize failed for {len(failed)} attributes; resume the job to retry them")
+        done["categorize"] = {"category_map": categories}
+        job.save_checkpoint(product_id, "categorize", done["categorize"])
+    result = organize_results(done["match"]["all_dataframes"], done["categorize"]["category_map"])
+    job.save_checkpoint(product_id, "organize", result)
+    return result
+
+
+async def _process_chunk(job, product_ids):
+    options = job.options
+    outcomes = await asyncio.gather(
+        *(process_product(job, product_id, options) for product_id in product_ids), return_exceptions=True
+    )
+    failed = {}
+    for product_id, outcome in zip(product_ids, outcomes):
+        if isinstance(outcome, Exception):
+            job.mark_failed(product_id, f"{type(outcome).__name__}: {str(outcome)}")
+            failed[product_id] = str(outcome)
+    return failed
+
+
+def _run_chunk(product_ids):
+    return _worker_loop.run_until_complete(_process_chunk(_worker_job, product_ids))
+
+
+def run_job(job, processes=BATCH_PROCESSES, max_concurrency=BATCH_MAX_CONCURRENCY, api_key=None, chunk_size=BATCH_CHUNK_SIZE,
+            api_keys=()):
+    """
+    Run (or resume) a job until every product has a result or has failed in this run.
+
+    Products are split into chunks and scheduled on a pool of worker processes. The
+    model-call budget `max_concurrency` is divided between the processes, each of
+    which caps its adaptive limiter at its share.
+
+    Args:
+        job (BatchJob): The job to run
+        processes (int): Worker processes
+        max_concurrency (int): Model calls in flight across all processes
+        api_key (str): Gemini API key for the workers; None to use GOOGLE_API_KEY from the environment
+        api_keys (list[str]): Pool of keys to spread model calls over (see key_pool.py)
+
+    Returns:
+        dict: The job's progress after the run
+    """
+    pending = job.pending_products()
+    chunks = [pending[start:start + chunk_size] for start in range(0, len(pending), chunk_size)]
+    processes = max(1, min(processes, max_concurrency, len(chunks) or 1))
+    job._set_meta(
+        status="running", pid=os.getpid(), run_started_at=time.time(), run_finished_at=None,
+        processes=processes, max_concurrency=max_concurrency
+    )
+    print(f"Running batch job {job.job_id}: {len(pending)} products in {len(chunks)} chunks on {processes} processes")
+    failed = 0
+    try:
+        # spawn rather than fork: the server process runs threads and gRPC channels
+        with ProcessPoolExecutor(
+            processes, mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker, initargs=(job.path, api_key, max(1, max_concurrency // processes), tuple(api_keys))
+        ) as pool:
+            futures = [pool.submit(_run_chunk, chunk) for chunk in chunks]
+            for future in as_completed(futures):
+                failed += len(future.result())
+    except BaseException:
+        job._set_meta(status="interrupted", run_finished_at=time.time())
+        raise
+    job._set_meta(status="completed_with_errors" if failed else "completed", run_finished_at=time.time())
+    progress = job.progress()
+    print(f"Batch job {job.job_id} finished: {progress['done']} done, {progress['failed']} failed")
+    return progress
+
+
+_job_threads = {}
+_job_threads_lock = threading.Lock()
+
+
+def start_job_thread(job, **run_options):
+    """Run a job in a background thread of this process; returns False if it is already running here."""
+    with _job_threads_lock:
+        thread = _job_threads.get(job.job_id)
+        if thread is not None and thread.is_alive():
+            return False
+        thread = threading.Thread(target=_run_job_logged, args=(job,), kwargs=run_options, daemon=True)
+        _job_threads[job.job_id] = thread
+        thread.start()
+        return True
+
+
+def _run_job_logged(job, **run_options):
+    try:
+        run_job(job, **run_options)
+    except Exception as e:
+        print(f"Batch job {job.job_id} failed: {str(e)}")
+
+
+# --- CLI ---
+def _print_progress(progress):
+    print(json.dumps(progress, indent=2))
+
+
+def _key_list(text):
+    return [key.strip() for key in text.split(",") if key.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run catalog-scale batch analysis jobs.")
+    parser.add_argument("--dir", default=BATCH_DIR, help="Directory holding the jobs")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="Create a job from a JSONL or CSV file and run it")
+    run.add_argument("input_path")
+    run.add_argument("--format", choices=("jsonl", "csv"))
+    run.add_argument("--job-id")
+    for name, default in JOB_OPTIONS.items():
+        run.add_argument(f"--{name.replace('_', '-')}", dest=name, action=argparse.BooleanOptionalAction, default=default)
+    resume = commands.add_parser("resume", help="Continue an interrupted job")
+    resume.add_argument("job_id")
+    for command in (run, resume):
+        command.add_argument("--processes", type=int, default=BATCH_PROCESSES)
+        command.add_argument("--max-concurrency", type=int, default=BATCH_MAX_CONCURRENCY)
+        command.add_argument("--api-key", default=None, help="Defaults to GOOGLE_API_KEY")
+        command.add_argument("--api-keys", type=_key_list, default=[], help="Comma-separated pool of keys to spread calls over")
+    status = commands.add_parser("status", help="Show a job's progress and throughput")
+    status.add_argument("job_id")
+    commands.add_parser("list", help="List jobs")
+    export = commands.add_parser("export", help="Write the finished products' results as JSONL")
+    export.add_argument("job_id")
+    export.add_argument("output_path", nargs="?", help="Defaults to stdout")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "list":
+            for job_id in list_jobs(args.dir):
+                progress = open_job(job_id, args.dir).progress()
+                print(f"{job_id}  {progress['status']:<22} {progress['done']}/{progress['products']} done, {progress['failed']} failed")
+            return 0
+        if args.command == "run":
+            products = read_products(args.input_path, args.format)
+            options = {name: getattr(args, name) for name in JOB_OPTIONS}
+            job = BatchJob.create(products, options, os.path.abspath(args.input_path), args.dir, args.job_id)
+            print(f"Created batch job {job.job_id} with {len(products)} products")
+        else:
+            job = open_job(args.job_id, args.dir)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+    except KeyError:
+        parser.error(f"No batch job {args.job_id}")
+
+    if args.command == "status":
+        _print_progress(job.progress())
+    elif args.command == "export":
+        output = open(args.output_path, "w", encoding="utf-8") if args.output_path else sys.stdout
+        try:
+            for product_id, result in job.iter_results():
+                output.write(json.dumps({"product_id": product_id, "results": result}) + "\n")
+        finally:
+            if output is not sys.stdout:
+                output.close()
+    else:
+        _print_progress(run_job(job, args.processes, args.max_concurrency, args.api_key, api_keys=args.api_keys))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,440 @@
+"""
+Benchmark the pipeline's orchestration against the local Gemini stand-in.
+
+Drives complete_pipeline, pipelined ("pipeline" mode) or step by step
+("barrier" mode), and the session endpoints /start_session, /extract, /match
+and /categorize ("session" mode) over
+synthetic reviews, for every combination of review count and concurrency
+limit. Model latency, 429s and errors come from mock_gemini, so the numbers
+measure the code around the model calls and cost no quota.
+
+    python benchmark.py --reviews 50,200 --concurrency 8,32 --latency lognormal:0.5,0.4 --rate-limit-rate 0.02
+
+Reports p50/p95/p99 latency of whole runs, of each stage and of model calls
+(including limiter queueing and retries), model calls and reviews per second,
+and CPU seconds (plus traced peak memory with --trace-memory) per stage.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+
+# Benchmarks start from empty caches and keep nothing on disk
+for _name in ("PRAISE_CACHE_PATH", "PRAISE_CATEGORY_MEMORY_PATH"):
+    os.environ.setdefault(_name, "")
+os.environ.setdefault("PRAISE_SESSION_STORE", "memory")
+
+# "pipeline" overlaps extraction and matching, "barrier" runs complete_pipeline step by step
+MODES = ("pipeline", "barrier", "session")
+# Timed stage functions of async_pipeline, as called by complete_pipeline
+PIPELINE_STAGES = {
+    "extract": "extract_review_attributes",
+    "match": "match_with_description",
+    "extract_match": "extract_and_match",
+    "categorize": "categorize_attributes",
+}
+SESSION_STEPS = ("extract", "match", "categorize")
+# "lean" extracts and matches without the reasoning fields
+SCHEMAS = ("full", "lean")
+
+_SUBJECTS = ("battery", "screen", "handle", "lid", "strap", "cable", "motor", "fabric", "zipper", "charger",
+             "speaker", "button", "hinge", "base", "filter", "blade", "sole", "frame", "wheel", "case")
+_QUALITIES = ("heavy", "light", "loud", "quiet", "soft", "stiff", "bright", "dim", "sturdy", "flimsy",
+              "waterproof", "slippery", "warm", "cold", "compact", "bulky", "glossy", "matte", "thin", "thick")
+_COLORS = ("black", "white", "red", "blue", "green", "silver", "grey", "beige")
+
+
+def synthetic_reviews(count, seed=0, duplicate_rate=0.0):
+    """
+    Deterministic factual reviews with 2-4 attribute statements each.
+
+    Args:
+        duplicate_rate (float): Share of reviews that copy an earlier review
+    """
+    rng = random.Random(seed)
+    reviews = []
+    for index in range(count):
+        if reviews and rng.random() < duplicate_rate:
+            reviews.append(rng.choice(reviews))
+            continue
+        clauses = [
+            f"the {rng.choice(_SUBJECTS)} is {rng.choice(_QUALITIES)}",
+            f"it came in {rng.choice(_COLORS)} and weighs {rng.randint(1, 40) / 10} kg",
+            f"the {rng.choice(_SUBJECTS)} lasted {rng.randint(2, 90)} days",
+            f"the {rng.choice(_SUBJECTS)} feels {rng.choice(_QUALITIES)} and {rng.choice(_QUALITIES)}",
+        ]
+        rng.shuffle(clauses)
+        reviews.append(f"Review {index}: " + ", ".join(clauses[:rng.randint(2, 4)]) + ".")
+    return reviews
+
+
+SELLER_DESCRIPTION = (
+    "Compact travel kit in black or silver. The battery lasts 30 days, the screen is bright, "
+    "the case is waterproof and the whole kit weighs 1.2 kg."
+)
+
+
+def percentile(values, q):
+    """Linear-interpolated percentile `q` (0-100) of `values`, None if empty."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(values):
+    return {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+class Recorder:
+    """Per-stage wall time, CPU time and traced peak memory, plus model call latencies."""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.calls = []
+
+    def stage(self, name, wall, cpu, peak_bytes=None):
+        stage = self.stages.setdefault(name, {"wall": [], "cpu": [], "peak_mb": []})
+        stage["wall"].append(wall)
+        stage["cpu"].append(cpu)
+        if peak_bytes is not None:
+            stage["peak_mb"].append(peak_bytes / 2 ** 20)
+
+    def begin(self):
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        return time.perf_counter(), time.process_time()
+
+    def end(self, name, started):
+        wall, cpu = started
+        peak = tracemalloc.get_traced_memory()[1] if self.trace_memory else None
+        self.stage(name, time.perf_counter() - wall, time.process_time() - cpu, peak)
+
+
+def _instrument(async_pipeline, recorder):
+    """Wrap the stage functions and call_with_limiter of async_pipeline; returns the originals."""
+    originals = {name: getattr(async_pipeline, name) for name in (*PIPELINE_STAGES.values(), "call_with_limiter")}
+
+    def timed_stage(stage, function):
+        async def wrapper(*args, **kwargs):
+            started = recorder.begin()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                recorder.end(stage, started)
+        return wrapper
+
+    for stage, name in PIPELINE_STAGES.items():
+        setattr(async_pipeline, name, timed_stage(stage, originals[name]))
+
+    call_with_limiter = originals["call_with_limiter"]
+
+    async def timed_call(limiter, call, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await call_with_limiter(limiter, call, *args, **kwargs)
+        finally:
+            recorder.calls.append(time.perf_counter() - started)
+
+    async_pipeline.call_with_limiter = timed_call
+    return originals
+
+
+def result_agreement(results, reference):
+    """Jaccard similarity of the (status, attribute, value) rows of two organized results."""
+    def rows(organized):
+        return {
+            (status, item.get("attribute"), item.get("value"))
+            for status, categories in (organized or {}).items()
+            for items in categories.values()
+            for item in items
+        }
+    a, b = rows(results), rows(reference)
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+async def _run_pipeline(reviews, repeat, recorder, pipelined=True, lean=False, hedge=False):
+    """Returns (run latencies, organized results of the last run)."""
+    import async_pipeline
+    from concurrency import set_hedging
+    set_hedging(hedge)
+    run_latencies = []
+    results = None
+    for _ in range(repeat):
+        started = recorder.begin()
+        results = await async_pipeline.complete_pipeline(
+            SELLER_DESCRIPTION, reviews, use_cache=False, pipelined=pipelined, lean_schema=lean
+        )
+        run_latencies.append(time.perf_counter() - started[0])
+        recorder.end("total", started)
+    return run_latencies, results
+
+
+async def _run_sessions(reviews, repeat, sessions, recorder, lean=False, hedge=False):
+    """Returns (run latencies, request latencies, organized results of the last session)."""
+    import httpx
+    import main
+    main.use_api_keys(["benchmark"])
+    request_latencies = []
+    run_latencies = []
+    results = {}
+
+    async def post(client, path, body):
+        started = time.perf_counter()
+        response = await client.post(path, json=body)
+        request_latencies.append(time.perf_counter() - started)
+        response.raise_for_status()
+        return response.json()
+
+    async def one_session(client):
+        started = time.perf_counter()
+        session_id = (await post(client, "/start_session", {
+            "seller_description": SELLER_DESCRIPTION, "reviews": reviews, "use_cache": False, "lean_schema": lean,
+            "hedge_requests": hedge
+        }))["session_id"]
+        for step in SESSION_STEPS:
+            step_started = recorder.begin()
+            result = await post(client, f"/{step}", {"session_id": session_id, "markdown": False})
+            recorder.end(f"/{step}", step_started)
+        results["last"] = result.get("results")
+        run_latencies.append(time.perf_counter() - started)
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        for _ in range(repeat):
+            started = recorder.begin()
+            await asyncio.gather(*(one_session(client) for _ in range(sessions)))
+            recorder.end("total", started)
+    return run_latencies, request_latencies, results.get("last")
+
+
+def run_case(mode, num_reviews, concurrency, args, schema="full"):
+    """
+    Run one (mode, schema, review count, concurrency) combination and return its report.
+
+    The organized results of the last run are kept under "_results" for result_agreement.
+    """
+    import async_pipeline
+    import concurrency as concurrency_module
+    import key_pool as key_pool_module
+    import pipeline
+    from category_memory import category_memory
+    from mock_gemini import install_mock_models, restore_models
+
+    if mode == "session":
+        import main # before instrumenting, main keeps its own references to the stage functions
+    reviews = synthetic_reviews(num_reviews, args.seed, args.duplicate_rate)
+    mock_stats, replaced = install_mock_models(
+        pipeline, latency=args.latency, rate_limit_rate=args.rate_limit_rate, error_rate=args.error_rate,
+        malformed_rate=args.malformed_rate, seconds_per_output_token=args.seconds_per_output_token,
+        key_rpm=args.key_rpm, seed=args.seed
+    )
+    # A fresh limiter per case, so the window learned in one case does not carry over
+    limiter = concurrency_module.AdaptiveLimiter(initial=min(concurrency_module.INITIAL_CONCURRENCY, concurrency), max_limit=concurrency)
+    previous_limiter = async_pipeline.model_call_limiter
+    async_pipeline.model_call_limiter = limiter
+    hedger = concurrency_module.RequestHedger()
+    previous_hedger = async_pipeline.request_hedger
+    async_pipeline.request_hedger = hedger
+    key_pool = key_pool_module.KeyPool()
+    key_pool.configure([f"benchmark-key-{position}" for position in range(args.keys)])
+    previous_key_pool = async_pipeline.key_pool
+    async_pipeline.key_pool = key_pool
+    cascade = pipeline.CascadeStats()
+    previous_cascade = async_pipeline.cascade_stats
+    async_pipeline.cascade_stats = cascade
+    category_memory.clear()
+    recorder = Recorder(args.trace_memory)
+    originals = _instrument(async_pipeline, recorder)
+    if args.trace_memory:
+        tracemalloc.start()
+    cpu_started = time.process_time()
+    wall_started = time.perf_counter()
+    try:
+        lean = schema == "lean"
+        if mode in ("pipeline", "barrier"):
+            run_latencies, results = asyncio.run(
+                _run_pipeline(reviews, args.repeat, recorder, mode == "pipeline", lean, args.hedge)
+            )
+            request_latencies = []
+        else:
+            run_latencies, request_latencies, results = asyncio.run(
+                _run_sessions(reviews, args.repeat, args.sessions, recorder, lean, args.hedge)
+            )
+    finally:
+        wall = time.perf_counter() - wall_started
+        cpu = time.process_time() - cpu_started
+        if args.trace_memory:
+            tracemalloc.stop()
+        for name, function in originals.items():
+            setattr(async_pipeline, name, function)
+        async_pipeline.model_call_limiter = previous_limiter
+        async_pipeline.request_hedger = previous_hedger
+        async_pipeline.cascade_stats = previous_cascade
+        async_pipeline.key_pool = previous_key_pool
+        restore_models(pipeline, replaced)
+
+    model = mock_stats.snapshot()
+    reviews_processed = num_reviews * args.repeat * (args.sessions if mode == "session" else 1)
+    return {
+        "mode": mode,
+        "schema": schema,
+        "reviews": num_reviews,
+        "concurrency": concurrency,
+        "runs": len(run_latencies),
+        "run_latency": summarize(run_latencies),
+        "request_latency": summarize(request_latencies),
+        "call_latency": summarize(recorder.calls),
+        "stages": {
+            name: {
+                "wall": summarize(stage["wall"]),
+                "cpu_seconds": sum(stage["cpu"]),
+                "peak_traced_mb": max(stage["peak_mb"]) if stage["peak_mb"] else None,
+            }
+            for name, stage in recorder.stages.items()
+        },
+        "wall_seconds": wall,
+        "cpu_seconds": cpu,
+        "cpu_utilization": cpu / wall if wall else 0.0,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "model_calls_per_second": model["total_calls"] / wall if wall else 0.0,
+        "reviews_per_second": reviews_processed / wall if wall else 0.0,
+        "output_tokens_per_review": model["output_tokens"] / reviews_processed if reviews_processed else 0.0,
+        "http_requests_per_second": len(request_latencies) / wall if wall else 0.0,
+        "model": model,
+        "limiter": limiter.stats(),
+        "hedging": hedger.stats(),
+        "cascade": cascade.stats(),
+        "key_pool": key_pool.stats(),
+        "_results": results,
+    }
+
+
+def _ms(seconds):
+    return None if seconds is None else round(seconds * 1000, 1)
+
+
+def report_tables(results):
+    """Markdown summary table (one row per case) and stage table (one row per case and stage)."""
+    from formatting_utils import markdown_table
+    summary_headers = ["mode", "schema", "reviews", "conc", "run p50 ms", "run p95 ms", "run p99 ms", "call p50 ms", "call p95 ms",
+                       "call p99 ms", "calls/s", "reviews/s", "out tok/review", "plumbing check", "cpu s", "max rss MB",
+                       "429s", "retries", "hedges", "hedge wins", "saved s",
+                       "fast answers", "escalated", "keys", "key waits"]
+    summary_rows = []
+    stage_headers = ["mode", "schema", "reviews", "conc", "stage", "p50 ms", "p95 ms", "p99 ms", "cpu s", "peak traced MB"]
+    stage_rows = []
+    for result in results:
+        case = [result["mode"], result["schema"], result["reviews"], result["concurrency"]]
+        agreement = result.get("plumbing_agreement")
+        run, call = result["run_latency"], result["call_latency"]
+        summary_rows.append(case + [
+            _ms(run["p50"]), _ms(run["p95"]), _ms(run["p99"]), _ms(call["p50"]), _ms(call["p95"]), _ms(call["p99"]),
+            round(result["model_calls_per_second"], 1), round(result["reviews_per_second"], 1),
+            round(result["output_tokens_per_review"], 1), None if agreement is None else round(agreement, 3),
+            round(result["cpu_seconds"], 2), round(result["max_rss_mb"], 1), result["model"]["rate_limited"],
+            result["limiter"]["retries"], result["hedging"]["hedged"], result["hedging"]["hedge_wins"],
+            round(result["hedging"]["latency_saved_seconds"], 2), result["cascade"]["fast"], result["cascade"]["escalated"],
+            result["key_pool"]["keys"], result["key_pool"]["waits"],
+        ])
+        for name, stage in result["stages"].items():
+            wall = stage["wall"]
+            peak = stage["peak_traced_mb"]
+            stage_rows.append(case + [
+                name, _ms(wall["p50"]), _ms(wall["p95"]), _ms(wall["p99"]), round(stage["cpu_seconds"], 3),
+                None if peak is None else round(peak, 2),
+            ])
+    return markdown_table(summary_headers, summary_rows) + "\n\n" + markdown_table(stage_headers, stage_rows)
+
+
+def _int_list(text):
+    return [int(value) for value in text.split(",") if value.strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline against the local Gemini stand-in.")
+    parser.add_argument("--mode", default="pipeline,barrier,session", help="Comma-separated: pipeline, barrier, session")
+    parser.add_argument("--reviews", type=_int_list, default=[20, 100], help="Comma-separated review counts")
+    parser.add_argument("--concurrency", type=_int_list, default=[8, 32], help="Comma-separated limiter caps")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case")
+    parser.add_argument("--schema", default="full", help="Comma-separated: full, lean")
+    parser.add_argument("--sessions", type=int, default=1, help="Concurrent sessions per run in session mode")
+    parser.add_argument("--latency", default="lognormal:0.5,0.4", help="Model latency spec, see mock_gemini.parse_latency")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.0)
+    parser.add_argument("--seconds-per-output-token", type=float, default=0.0)
+    parser.add_argument("--duplicate-rate", type=float, default=0.0, help="Share of copied reviews")
+    parser.add_argument("--hedge", action="store_true", help="Hedge slow model requests (see concurrency.RequestHedger)")
+    parser.add_argument("--cascade", help="Fast model to try first, e.g. gemini-1.5-flash-8b (see PRAISE_CASCADE_MODEL)")
+    parser.add_argument("--keys", type=int, default=1, help="API keys in the pool (see key_pool.KeyPool)")
+    parser.add_argument("--key-rpm", type=float, default=0.0, help="Stand-in quota per key and model, requests per minute")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--trace-memory", action="store_true", help="Trace peak memory per stage (slows the run)")
+    parser.add_argument("--output", help="Write the full results as JSON")
+    parser.add_argument("--quiet", action="store_true", help="Silence the pipeline's progress output")
+    args = parser.parse_args(argv)
+
+    modes = [mode.strip() for mode in args.mode.split(",") if mode.strip()]
+    unknown = set(modes) - set(MODES)
+    if unknown:
+        parser.error(f"Unknown mode: {', '.join(sorted(unknown))}")
+    schemas = [schema.strip() for schema in args.schema.split(",") if schema.strip()]
+    unknown = set(schemas) - set(SCHEMAS)
+    if unknown:
+        parser.error(f"Unknown schema: {', '.join(sorted(unknown))}")
+
+    if args.cascade:
+        # Read when pipeline.py is first imported, which run_case does
+        os.environ["PRAISE_CASCADE_MODEL"] = args.cascade
+
+    results = []
+    for mode in modes:
+        for schema in schemas:
+            for num_reviews in args.reviews:
+                for concurrency in args.concurrency:
+                    print(f"Benchmarking {mode} ({schema} schema) with {num_reviews} reviews at concurrency {concurrency}...",
+                          file=sys.stderr)
+                    stdout = sys.stdout
+                    if args.quiet:
+                        sys.stdout = open(os.devnull, "w")
+                    try:
+                        results.append(run_case(mode, num_reviews, concurrency, args, schema))
+                    finally:
+                        if args.quiet:
+                            sys.stdout.close()
+                            sys.stdout = stdout
+
+    # Plumbing check, not a quality measure: the stand-in answers the same whatever the schema,
+    # so this only shows that a lean run yields the rows of the full run of the same case
+    full_results = {(r["mode"], r["reviews"], r["concurrency"]): r["_results"] for r in results if r["schema"] == "full"}
+    for result in results:
+        reference = (result["mode"], result["reviews"], result["concurrency"])
+        if result["schema"] != "full" and reference in full_results:
+            result["plumbing_agreement"] = result_agreement(result["_results"], full_results[reference])
+        del result["_results"]
+
+    print(report_tables(results))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,197 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Cache settings, overridable through the environment
+CACHE_PATH = os.environ.get(
+    "PRAISE_CACHE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "llm_cache.sqlite3")
+)
+CACHE_MEMORY_ENTRIES = int(os.environ.get("PRAISE_CACHE_MEMORY_ENTRIES", 2048))
+CACHE_DISK_ENTRIES = int(os.environ.get("PRAISE_CACHE_DISK_ENTRIES", 200000))
+CACHE_TTL_SECONDS = int(os.environ.get("PRAISE_CACHE_TTL_SECONDS", 30 * 24 * 3600))
+
+# Run disk eviction once every N writes instead of on each one
+_DISK_EVICTION_INTERVAL = 256
+
+
+def model_fingerprint(model):
+    """Hash the parts of a model that change its output: generation config and system prompt."""
+    generation_config = getattr(model, "_generation_config", None) or {}
+    system_instruction = getattr(model, "_system_instruction", None)
+    payload = json.dumps(
+        {"generation_config": generation_config, "system_instruction": system_instruction},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def cache_key(model, prompt):
+    """
+    Build the content address for a model call.
+
+    Args:
+        model: A GenerativeModel (or anything exposing model_name)
+        prompt (str): The full prompt sent to the model
+
+    Returns:
+        str: Hex digest identifying (model name, config + system prompt, prompt)
+    """
+    model_name = getattr(model, "model_name", str(model))
+    digest = hashlib.sha256()
+    for part in (model_name, model_fingerprint(model), prompt):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier cache for raw model response text.
+
+    The first tier is an in-process LRU, the second a SQLite file that survives
+    restarts and is shared by every worker pointing at the same path. Entries
+    expire after `ttl_seconds`; both tiers are trimmed to their size limits.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_memory_entries=CACHE_MEMORY_ENTRIES,
+                 max_disk_entries=CACHE_DISK_ENTRIES, ttl_seconds=CACHE_TTL_SECONDS):
+        self.path = path
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl_seconds = ttl_seconds
+        self._memory = OrderedDict()  # key -> (created_at, value)
+        self._lock = threading.Lock()
+        self._conn = None
+        self._writes_since_eviction = 0
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+
+    def _connection(self):
+        if self._conn is None and self.path:
+            try:
+                self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+                )
+                self._conn.execute("CREATE INDEX IF NOT EXISTS responses_created_at ON responses(created_at)")
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: Disk cache unavailable at {self.path}: {str(e)}")
+                self._conn = None
+                self.path = None
+        return self._conn
+
+    def _expired(self, created_at):
+        return self.ttl_seconds > 0 and time.time() - created_at > self.ttl_seconds
+
+    def _remember(self, key, created_at, value):
+        self._memory[key] = (created_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """Return the cached value for `key`, or None on a miss."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return entry[1]
+                del self._memory[key]
+
+            conn = self._connection()
+            if conn is not None:
+                try:
+                    row = conn.execute(
+                        "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    print(f"Warning: Disk cache read failed: {str(e)}")
+                    row = None
+                if row is not None and not self._expired(row[1]):
+                    self._remember(key, row[1], row[0])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        """Store `value` under `key` in both tiers."""
+        created_at = time.time()
+        with self._lock:
+            self._remember(key, created_at, value)
+            conn = self._connection()
+            if conn is None:
+                return
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, value, created_at)
+                )
+                self._writes_since_eviction += 1
+                if self._writes_since_eviction >= _DISK_EVICTION_INTERVAL:
+                    self._evict_disk()
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: Disk cache write failed: {str(e)}")
+
+    def _evict_disk(self):
+        self._writes_since_eviction = 0
+        if self.ttl_seconds > 0:
+            self._conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        self._conn.execute(
+            "DELETE FROM responses WHERE key NOT IN "
+            "(SELECT key FROM responses ORDER BY created_at DESC LIMIT ?)",
+            (self.max_disk_entries,)
+        )
+
+    def clear(self):
+        """Drop every entry from both tiers and reset the counters."""
+        with self._lock:
+            self._memory.clear()
+            conn = self._connection()
+            if conn is not None:
+                conn.execute("DELETE FROM responses")
+                conn.commit()
+            self.hits = self.misses = self.memory_hits = self.disk_hits = 0
+
+    def stats(self):
+        """Hit/miss counters and current tier sizes."""
+        with self._lock:
+            disk_entries = 0
+            conn = self._connection()
+            if conn is not None:
+                try:
+                    disk_entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+                except sqlite3.Error:
+                    pass
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+                "disk_path": self.path,
+            }
+
+
+# Shared cache used by the pipeline
+response_cache = ResponseCache()
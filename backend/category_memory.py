@@ -0,0 +1,177 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Category memory settings, overridable through the environment
+CATEGORY_MEMORY_PATH = os.environ.get(
+    "PRAISE_CATEGORY_MEMORY_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "category_memory.sqlite3")
+)
+# Bump to start a fresh dictionary, e.g. after changing the grouping prompt or model
+CATEGORY_MEMORY_VERSION = os.environ.get("PRAISE_CATEGORY_MEMORY_VERSION", "1")
+# Entries kept in process memory; older ones are read back from the SQLite file when needed
+CATEGORY_MEMORY_ENTRIES = int(os.environ.get("PRAISE_CATEGORY_MEMORY_ENTRIES", 20000))
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_CHUNK = 500
+
+_SEPARATORS = re.compile(r"[\s_\-]+")
+
+
+def normalize_attribute(attribute):
+    """
+    Key under which an attribute's category is remembered.
+
+    Case, surrounding punctuation and runs of whitespace, '-' or '_' are ignored,
+    so "Battery Life", "battery-life" and " battery_life." share one entry.
+    """
+    return _SEPARATORS.sub(" ", str(attribute).casefold()).strip(" .,;:!?\"'()[]{}")
+
+
+class CategoryMemory:
+    """
+    Persistent attribute -> category dictionary.
+
+    Grouping answers are written back after every categorization, so attributes
+    that recur across products ("weight", "color", ...) are categorized without a
+    model call. Entries are stored per `version`; lookups only see the current one.
+    At most `max_memory_entries` are kept in process memory, least recently used
+    first out; with an empty path that is all the dictionary holds.
+    """
+
+    def __init__(self, path=CATEGORY_MEMORY_PATH, version=CATEGORY_MEMORY_VERSION, max_memory_entries=CATEGORY_MEMORY_ENTRIES):
+        self.path = path
+        self.version = version
+        self.max_memory_entries = max_memory_entries
+        self._entries = OrderedDict()  # normalized attribute -> category, current version only, in LRU order
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.misses = 0
+        self.learned = 0
+
+    def _connection(self):
+        if self._conn is None and self.path:
+            try:
+                self._conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS categories ("
+                    "version TEXT NOT NULL, attribute TEXT NOT NULL, category TEXT NOT NULL, "
+                    "updated_at REAL NOT NULL, PRIMARY KEY (version, attribute))"
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: Category memory unavailable at {self.path}: {str(e)}")
+                self._conn = None
+                self.path = None
+        return self._conn
+
+    def _store(self, rows):
+        for key, category in rows:
+            self._entries[key] = category
+            self._entries.move_to_end(key)
+        while len(self._entries) > self.max_memory_entries:
+            self._entries.popitem(last=False)
+
+    def lookup(self, attributes):
+        """
+        Categories remembered for `attributes`.
+
+        Args:
+            attributes (list[str]): Attributes as they appear in the reviews
+
+        Returns:
+            dict: attribute -> category for every attribute found (keys as given)
+        """
+        keys = {attribute: normalize_attribute(attribute) for attribute in attributes}
+        with self._lock:
+            known = {key: self._entries[key] for key in set(keys.values()) if key in self._entries}
+            missing = [key for key in set(keys.values()) if key not in known]
+            conn = self._connection()
+            if missing and conn is not None:
+                try:
+                    for start in range(0, len(missing), _LOOKUP_CHUNK):
+                        chunk = missing[start:start + _LOOKUP_CHUNK]
+                        rows = conn.execute(
+                            "SELECT attribute, category FROM categories WHERE version = ? AND attribute IN "
+                            f"({', '.join('?' * len(chunk))})",
+                            (self.version, *chunk)
+                        ).fetchall()
+                        known.update(rows)
+                        self._store(rows)
+                except sqlite3.Error as e:
+                    print(f"Warning: Category memory read failed: {str(e)}")
+            self._store(known.items()) # marks the hits as recently used
+            found = {attribute: known[key] for attribute, key in keys.items() if key in known}
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+            return found
+
+    def remember(self, categories):
+        """Store attribute -> category pairs from a grouping answer."""
+        rows = {
+            normalize_attribute(attribute): category
+            for attribute, category in categories.items()
+            if normalize_attribute(attribute) and category
+        }
+        if not rows:
+            return
+        with self._lock:
+            self._store(rows.items())
+            self.learned += len(rows)
+            conn = self._connection()
+            if conn is None:
+                return
+            try:
+                now = time.time()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO categories (version, attribute, category, updated_at) VALUES (?, ?, ?, ?)",
+                    [(self.version, key, category, now) for key, category in rows.items()]
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Warning: Category memory write failed: {str(e)}")
+
+    def clear(self, all_versions=False):
+        """Forget the current version's entries (or every version) and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            conn = self._connection()
+            if conn is not None:
+                if all_versions:
+                    conn.execute("DELETE FROM categories")
+                else:
+                    conn.execute("DELETE FROM categories WHERE version = ?", (self.version,))
+                conn.commit()
+            self.hits = self.misses = self.learned = 0
+
+    def stats(self):
+        """Lookup counters and the size of the current version."""
+        with self._lock:
+            entries = len(self._entries)
+            conn = self._connection()
+            if conn is not None:
+                try:
+                    entries = conn.execute(
+                        "SELECT COUNT(*) FROM categories WHERE version = ?", (self.version,)
+                    ).fetchone()[0]
+                except sqlite3.Error:
+                    pass
+            lookups = self.hits + self.misses
+            return {
+                "version": self.version,
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "learned": self.learned,
+                "path": self.path,
+            }
+
+
+# Shared category memory used by the pipeline
+category_memory = CategoryMemory()
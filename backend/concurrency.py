@@ -0,0 +1,444 @@
+import asyncio
+import contextvars
+import os
+import random
+import threading
+import time
+from collections import deque
+
+# Limiter settings, overridable through the environment
+INITIAL_CONCURRENCY = int(os.environ.get("PRAISE_INITIAL_CONCURRENCY", 8))
+MAX_CONCURRENCY = int(os.environ.get("PRAISE_MAX_CONCURRENCY", 64))
+MAX_RATE_LIMIT_RETRIES = int(os.environ.get("PRAISE_MAX_RATE_LIMIT_RETRIES", 6))
+
+# Latency above this multiple of the observed floor counts as congestion
+LATENCY_TOLERANCE = 2.0
+# Smoothed error rate above which the window shrinks
+ERROR_RATE_THRESHOLD = 0.2
+# Minimum seconds between two multiplicative decreases, so a burst of 429s from
+# calls that were already in flight only halves the window once
+DECREASE_COOLDOWN = 1.0
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+
+# Request hedging, off unless enabled here or per session / request
+HEDGE_REQUESTS = os.environ.get("PRAISE_HEDGE_REQUESTS", "0") == "1"
+# A duplicate request is sent once a call takes longer than this percentile of recent calls of its stage
+HEDGE_PERCENTILE = float(os.environ.get("PRAISE_HEDGE_PERCENTILE", 0.95))
+# At most this share of recent calls may be hedged
+HEDGE_MAX_RATE = float(os.environ.get("PRAISE_HEDGE_MAX_RATE", 0.05))
+# Calls of a stage needed before its threshold is trusted
+HEDGE_MIN_SAMPLES = int(os.environ.get("PRAISE_HEDGE_MIN_SAMPLES", 20))
+HEDGE_WINDOW = 200
+
+
+def is_rate_limit_error(error):
+    """True for 429 / RESOURCE_EXHAUSTED / quota errors from the Gemini client."""
+    if getattr(error, "code", None) == 429:
+        return True
+    message = str(error)
+    return "RESOURCE_EXHAUSTED" in message or "429" in message or "quota" in message.lower()
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limiter shared by every model call in the process.
+
+    The window grows by about one slot per window's worth of healthy calls, holds
+    while latency rises above LATENCY_TOLERANCE times the observed floor, shrinks
+    gently when the error rate is high and halves on rate-limit errors. Waiters
+    are served in FIFO order. The limiter is not bound to one event loop, so the
+    server loop and synchronous callers running their own loops share one window.
+    """
+
+    def __init__(self, initial=INITIAL_CONCURRENCY, min_limit=1, max_limit=MAX_CONCURRENCY):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(max(min_limit, min(initial, max_limit)))
+        self.in_flight = 0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+        self._last_decrease = 0.0
+        self.latency_ewma = None
+        self.latency_floor = None
+        self.error_rate = 0.0
+        self.completed = 0
+        self.errors = 0
+        self.rate_limited = 0
+        self.retries = 0
+
+    @property
+    def window(self):
+        return max(self.min_limit, int(self.limit))
+
+    async def acquire(self):
+        """Wait for a free slot."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self.in_flight < self.window and not self._waiters:
+                self.in_flight += 1
+                return
+            waiter = loop.create_future()
+            self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif not waiter.cancelled():
+                    # A slot was granted just before the cancellation landed
+                    self._free_slot_locked()
+            raise
+
+    def _grant(self, waiter):
+        if waiter.cancelled():
+            with self._lock:
+                self._free_slot_locked()
+        elif not waiter.done():
+            waiter.set_result(None)
+
+    def _wake_locked(self):
+        while self._waiters and self.in_flight < self.window:
+            waiter = self._waiters.popleft()
+            self.in_flight += 1
+            waiter.get_loop().call_soon_threadsafe(self._grant, waiter)
+
+    def _free_slot_locked(self):
+        self.in_flight -= 1
+        self._wake_locked()
+
+    def _decrease_locked(self, factor):
+        now = time.monotonic()
+        if now - self._last_decrease >= DECREASE_COOLDOWN:
+            self.limit = max(self.min_limit, self.limit * factor)
+            self._last_decrease = now
+
+    def release(self, latency, outcome):
+        """
+        Free a slot and adapt the window.
+
+        Args:
+            latency (float): Seconds the call took
+            outcome (str): "ok", "error", "rate_limited" or "cancelled"
+        """
+        with self._lock:
+            if outcome == "ok":
+                self.completed += 1
+                self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+                # Let the floor drift up slowly so it follows a slower model or network
+                self.latency_floor = latency if self.latency_floor is None else min(self.latency_floor * 1.001, latency)
+                self.error_rate *= 0.95
+                if self.latency_ewma <= LATENCY_TOLERANCE * self.latency_floor:
+                    self.limit = min(self.max_limit, self.limit + 1.0 / self.window)
+            elif outcome == "rate_limited":
+                self.rate_limited += 1
+                self.error_rate = 0.95 * self.error_rate + 0.05
+                self._decrease_locked(0.5)
+            elif outcome == "error":
+                self.errors += 1
+                self.error_rate = 0.95 * self.error_rate + 0.05
+                if self.error_rate > ERROR_RATE_THRESHOLD:
+                    self._decrease_locked(0.9)
+            self._free_slot_locked()
+
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def set_max_limit(self, max_limit):
+        """Change the upper bound of the window, e.g. 1 for serial processing."""
+        with self._lock:
+            self.max_limit = max(self.min_limit, max_limit)
+            self.limit = min(self.limit, self.max_limit)
+            if max_limit > 1 and self.limit < INITIAL_CONCURRENCY:
+                self.limit = float(min(INITIAL_CONCURRENCY, self.max_limit))
+            self._wake_locked()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "window": self.window,
+                "max_window": self.max_limit,
+                "in_flight": self.in_flight,
+                "queue_depth": len(self._waiters),
+                "latency_ewma": self.latency_ewma,
+                "latency_floor": self.latency_floor,
+                "error_rate": self.error_rate,
+                "completed": self.completed,
+                "errors": self.errors,
+                "rate_limited": self.rate_limited,
+                "retries": self.retries,
+            }
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff for retry number `attempt` (0-based)."""
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+async def call_with_limiter(limiter, call, max_retries=MAX_RATE_LIMIT_RETRIES):
+    """
+    Run `call()` (a coroutine factory) inside a limiter slot, retrying rate-limit
+    errors with jittered backoff. Other errors are recorded and re-raised.
+    """
+    for attempt in range(max_retries + 1):
+        await limiter.acquire()
+        start = time.monotonic()
+        outcome = "cancelled"
+        try:
+            result = await call()
+            outcome = "ok"
+            return result
+        except Exception as e:
+            outcome = "rate_limited" if is_rate_limit_error(e) else "error"
+            if outcome == "error" or attempt == max_retries:
+                raise
+        finally:
+            limiter.release(time.monotonic() - start, outcome)
+        limiter.record_retry()
+        await asyncio.sleep(backoff_delay(attempt))
+
+
+class _Flight:
+    def __init__(self, loop):
+        self.loop = loop
+        self.task = None
+        self.waiters = 0
+        self.abandoned = False
+        self.events = []
+        self._changed = asyncio.Event()
+
+    def notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def changed(self):
+        await self._changed.wait()
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent work by key.
+
+    While work for a key is running, later callers with the same key join it instead
+    of starting their own: run() returns the first call's result, stream() replays and
+    then follows the first stream's events. The work is cancelled once every caller has
+    gone away. A flight belongs to the event loop that started it; callers on other
+    loops (synchronous entry points) start their own.
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.started = 0
+        self.coalesced = 0
+
+    def _join(self, key, start):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None and flight.loop is loop and not flight.abandoned and not flight.task.done():
+                flight.waiters += 1
+                self.coalesced += 1
+                return flight
+            flight = _Flight(loop)
+            flight.waiters = 1
+            self._flights[key] = flight
+            self.started += 1
+        flight.task = loop.create_task(start(flight))
+        flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        return flight
+
+    def _forget(self, key, flight):
+        flight.notify()
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def _leave(self, flight):
+        with self._lock:
+            flight.waiters -= 1
+            abandon = flight.waiters == 0 and not flight.task.done()
+            if abandon:
+                flight.abandoned = True
+        if abandon:
+            flight.task.cancel()
+
+    async def run(self, key, call):
+        """Await `call()` (a coroutine factory), or the call already running for `key`."""
+        async def start(flight):
+            return await call()
+
+        flight = self._join(key, start)
+        try:
+            return await asyncio.shield(flight.task)
+        finally:
+            self._leave(flight)
+
+    async def stream(self, key, events):
+        """Iterate `events()` (an async iterator factory), or the stream already running for `key` from its start."""
+        async def start(flight):
+            async for event in events():
+                flight.events.append(event)
+                flight.notify()
+
+        flight = self._join(key, start)
+        position = 0
+        try:
+            while True:
+                while position < len(flight.events):
+                    yield flight.events[position]
+                    position += 1
+                if flight.task.done():
+                    break
+                await flight.changed()
+            flight.task.result() # re-raise the stream's error
+        finally:
+            self._leave(flight)
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._flights), "started": self.started, "coalesced": self.coalesced}
+
+
+_hedging = contextvars.ContextVar("praise_hedging", default=None)
+
+
+def set_hedging(enabled):
+    """Enable or disable hedging for model calls made from the current context; None uses HEDGE_REQUESTS."""
+    _hedging.set(enabled)
+
+
+def hedging_enabled():
+    enabled = _hedging.get()
+    return HEDGE_REQUESTS if enabled is None else enabled
+
+
+class RequestHedger:
+    """
+    Hedged requests: when a model request has not returned after the rolling
+    HEDGE_PERCENTILE latency of its stage, a duplicate is sent and the first valid
+    response wins.
+
+    The duplicate does not take a limiter slot; instead, at most HEDGE_MAX_RATE of
+    the last HEDGE_WINDOW requests are hedged. Whichever request loses is cancelled
+    at once, so no traffic outlives the call. The latency saved by a winning hedge
+    is estimated from the stage's recent latencies above the time it won.
+    """
+
+    def __init__(self, percentile=HEDGE_PERCENTILE, max_rate=HEDGE_MAX_RATE, min_samples=HEDGE_MIN_SAMPLES,
+                 window=HEDGE_WINDOW):
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self.min_samples = min_samples
+        self.window = window
+        self._latencies = {} # stage -> recent latencies of original requests
+        self._recent = deque(maxlen=window) # 1 for each recent hedged request, else 0
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.capped = 0
+        self.saved_seconds = 0.0
+
+    def _threshold_locked(self, stage):
+        latencies = sorted(self._latencies.get(stage, ()))
+        if len(latencies) < self.min_samples:
+            return None
+        return latencies[min(len(latencies) - 1, int(self.percentile * len(latencies)))]
+
+    def threshold(self, stage):
+        """Seconds after which a request of `stage` is hedged, or None before enough samples."""
+        with self._lock:
+            return self._threshold_locked(stage)
+
+    def _observe(self, stage, latency):
+        with self._lock:
+            self._latencies.setdefault(stage, deque(maxlen=self.window)).append(latency)
+
+    def _admit(self, slow):
+        """Count a request; True if it is slow and may be hedged under the rate cap."""
+        with self._lock:
+            self.requests += 1
+            hedge = slow and sum(self._recent) + 1 <= self.max_rate * max(len(self._recent), self.min_samples)
+            self._recent.append(int(hedge))
+            if hedge:
+                self.hedged += 1
+            elif slow:
+                self.capped += 1
+            return hedge
+
+    def _hedge_won(self, stage, elapsed):
+        """
+        Count a winning hedge `elapsed` seconds after the original was sent.
+
+        The cancelled original would have taken at least `elapsed`; it is estimated as the
+        mean of the stage's recent latencies above that (no saving if there are none), and
+        `elapsed` is recorded as its latency so the tail is not lost from the threshold.
+        """
+        with self._lock:
+            slower = [latency for latency in self._latencies.get(stage, ()) if latency > elapsed]
+            self.hedge_wins += 1
+            if slower:
+                self.saved_seconds += sum(slower) / len(slower) - elapsed
+        self._observe(stage, elapsed)
+
+    async def run(self, stage, send, valid=None):
+        """
+        Send a request, hedging it if it is slow.
+
+        Args:
+            stage (str): Requests of one stage share a latency threshold
+            send (callable): Coroutine factory sending the request once
+            valid (callable): valid(response) is false for responses that should not win
+
+        Returns:
+            tuple: (response, "hedge_won", "original_won" or None if not hedged)
+        """
+        threshold = self.threshold(stage)
+        started = time.perf_counter()
+        original = asyncio.ensure_future(send())
+        tasks = [original]
+        try:
+            if threshold is not None:
+                await asyncio.wait(tasks, timeout=threshold)
+            if not self._admit(threshold is not None and not original.done()):
+                response = await original
+                self._observe(stage, time.perf_counter() - started)
+                return response, None
+            tasks.append(asyncio.ensure_future(send()))
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in tasks:
+                    if task in done and task.exception() is None and (valid is None or valid(task.result())):
+                        if task is original:
+                            self._observe(stage, time.perf_counter() - started)
+                            return task.result(), "original_won"
+                        self._hedge_won(stage, time.perf_counter() - started)
+                        return task.result(), "hedge_won"
+            return await original, "original_won" # neither response is valid: the original's result or error
+        finally:
+            # The losing request is not left running: it holds no limiter slot or key token
+            for task in tasks:
+                task.cancel()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "capped": self.capped,
+                "hedge_rate": self.hedged / self.requests if self.requests else 0.0,
+                "latency_saved_seconds": self.saved_seconds,
+                "thresholds": {stage: self._threshold_locked(stage) for stage in self._latencies},
+            }
+
+
+# Shared limiter used by the pipeline
+model_call_limiter = AdaptiveLimiter()
+request_hedger = RequestHedger()
+# Identical model calls in flight at the same time (same model, config and prompt) are made once
+model_call_flights = SingleFlight()
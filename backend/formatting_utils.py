@@ -1,116 +1,152 @@
-import pandas as pd
-
-def step1_markdown(extracted_attributes):
-    markdown_output = """"""
+import math
+import re
+
+try:
+    from wcwidth import wcswidth # count wide (e.g. CJK) characters as two columns
+except ImportError:
+    wcswidth = None
+
+_LINE_BREAK = re.compile(r"\r\n|[\r\n]")
+
+STEP2_COLUMNS = ("attribute", "evidence", "status", "value")
+STEP3_COLUMNS = ("attribute", "value", "evidence")
+
+
+def _cell_text(value):
+    """One cell's text: None as empty, line breaks as <br> and pipes escaped, so the cell stays in its row and column."""
+    if value is None:
+        return ""
+    return _LINE_BREAK.sub("<br>", str(value).strip()).replace("|", "\\|")
+
+def _is_number(value):
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, (int, float)):
+        return True
+    try:
+        return math.isfinite(float(value))
+    except (TypeError, ValueError):
+        return False
+
+def _text_width(text):
+    # Plain printable ASCII is the common case and needs no lookup
+    if wcswidth is None or (text.isascii() and text.isprintable()):
+        return len(text)
+    width = wcswidth(text)
+    return width if width >= 0 else len(text)
+
+def _pad(text, width, numeric):
+    """Pad `text` to `width` display columns, right-aligned for numbers."""
+    width -= _text_width(text) - len(text)
+    return text.rjust(width) if numeric else text.ljust(width)
+
+def markdown_table(headers, rows):
+    """
+    Render rows as a GitHub ("pipe") markdown table.
+
+    Columns are padded to their widest cell. Columns whose non-empty cells are all
+    numbers are right aligned, the others left aligned. Values are written with str():
+    None renders as an empty cell, line breaks as <br> and "|" is escaped.
+
+    Args:
+        headers (list[str]): Column titles
+        rows (list[list]): Cell values per row
+
+    Returns:
+        str: Table lines joined by newlines, "" when there are no columns
+    """
+    if not headers:
+        return ""
+    header_cells = [_cell_text(header) for header in headers]
+    body = [[_cell_text(value) for value in row] for row in rows]
+    numeric = [
+        any(value not in (None, "") for value in column) and all(_is_number(value) for value in column if value not in (None, ""))
+        for column in (zip(*rows) if rows else [[] for _ in headers])
+    ]
+    widths = [
+        max([_text_width(header) + 2, *(_text_width(row[i]) for row in body)]) for i, header in enumerate(header_cells)
+    ]
+    lines = [
+        "| " + " | ".join(_pad(cell, width, right) for cell, width, right in zip(header_cells, widths, numeric)) + " |",
+        "|" + "|".join("-" * (width + 1) + ":" if right else ":" + "-" * (width + 1) for width, right in zip(widths, numeric)) + "|",
+    ]
+    for row in body:
+        lines.append("| " + " | ".join(_pad(cell, width, right) for cell, width, right in zip(row, widths, numeric)) + " |")
+    return "\n".join(lines)
+
+def _evidence_cell(evidence):
+    return shorten_evidence("" if evidence is None else str(evidence))
+
+def _record_table(rows, columns):
+    """Table of the given keys of each row, with Evidence shortened."""
+    return markdown_table(
+        [column.capitalize() for column in columns],
+        [
+            [_evidence_cell(row.get(column)) if column == "evidence" else row.get(column) for column in columns]
+            for row in rows
+        ]
+    )
+
+def step1_markdown(extracted_attributes, start=1):
+    parts = []
     for i, review in enumerate(extracted_attributes):
-        markdown_output += f"### Review {i+1}:\n\n"
-        table = pd.DataFrame(review)
-        table.columns = [col.capitalize() for col in table.columns]
-        table = table.to_markdown(index=False)
-        markdown_output += table + "\n\n"
-        del table
+        # Columns in order of first appearance, like a DataFrame built from the rows
+        columns = list(dict.fromkeys(key for row in review for key in row))
+        table = markdown_table(
+            [str(column).capitalize() for column in columns],
+            [[row.get(column) for column in columns] for row in review]
+        )
+        parts.append(f"### Review {i+start}:\n\n{table}\n\n")
 
-    return markdown_output
+    return "".join(parts)
 
 def shorten_evidence(evidence):
     if len(evidence) > 75:
         return evidence[:75] + "..."
     return evidence
 
-def step2_markdown(all_dfs):
-    markdown_output = """"""
+def step2_markdown(all_dfs, start=1):
+    parts = []
     # Define expected headers for consistency, even for empty tables
-    headers = ["Attribute", "Evidence", "Status", "Value"]
+    headers = [column.capitalize() for column in STEP2_COLUMNS]
     empty_table_markdown = "| " + " | ".join(headers) + " |\n" + "| " + " | ".join(["---"] * len(headers)) + " |\n"
 
-    for i, df_data in enumerate(all_dfs):
-        df = pd.DataFrame(df_data)
-        markdown_output += f"### Review {i+1}:\n\n"
-
-        if df.empty:
-            # Append the predefined empty table markdown
-            markdown_output += empty_table_markdown + "\n"
+    for i, rows in enumerate(all_dfs):
+        parts.append(f"### Review {i+start}:\n\n")
+        if not rows:
+            parts.append(empty_table_markdown + "\n")
         else:
-            # Ensure 'evidence' column exists before applying shorten_evidence
-            if 'evidence' in df.columns:
-                 # Handle potential None values in evidence before applying len()
-                 df['evidence'] = df['evidence'].fillna('').astype(str).apply(shorten_evidence)
-            else:
-                 # Add empty evidence column if missing, maybe with None/NaN? Or empty string?
-                 df['evidence'] = '' # Add empty evidence if column missing
-
-            # Ensure all expected columns exist before capitalizing, add if missing
-            for col in ['attribute', 'evidence', 'status', 'value']:
-                 if col not in df.columns:
-                      df[col] = '' # Or pd.NA or None depending on desired output
+            parts.append(_record_table(rows, STEP2_COLUMNS) + "\n\n")
 
-            # Capitalize columns that exist
-            df.columns = [col.capitalize() for col in df.columns]
-
-            # Select and reorder columns to match headers before converting to markdown
-            # Use capitalized headers here
-            df_markdown = df.reindex(columns=headers, fill_value='').to_markdown(index=False)
-            markdown_output += df_markdown + "\n\n"
-
-    return markdown_output
+    return "".join(parts)
 
 def step3_markdown(groups):
-    markdown_output = """"""
     # Check if groups is a dictionary before iterating
     if not isinstance(groups, dict):
         print("Warning: step3_markdown received non-dict input for groups.")
         return "*Error: Invalid data format for categorization results.*\n"
 
-    for key in groups.keys(): # e.g., 'missing', 'matching'
-        markdown_output += f"## {str(key).capitalize()}\n\n" # Capitalize status, ensure key is string
-        status_group = groups[key]
+    parts = []
+    for key, status_group in groups.items(): # e.g., 'missing', 'matching'
+        status_title = str(key).capitalize()
+        parts.append(f"## {status_title}\n\n")
 
-        # Check if the status group is a dictionary
         if isinstance(status_group, dict) and status_group:
-            for category in status_group.keys(): # categories
-                markdown_output += f"### {str(category).capitalize()}\n\n" # Capitalize category, ensure key is string
-                category_data = status_group[category]
+            for category, category_data in status_group.items():
+                category_title = str(category).capitalize()
+                parts.append(f"### {category_title}\n\n")
 
-                # Check if category_data is a list and not empty
                 if isinstance(category_data, list) and category_data:
                     try:
-                        df = pd.DataFrame(category_data)
-                        # Ensure DataFrame is not empty before proceeding
-                        if not df.empty:
-                            # Check if 'evidence' column exists before applying shorten_evidence
-                            if 'evidence' in df.columns:
-                                 # Handle potential None/NaN before applying len() in shorten_evidence
-                                 df['evidence'] = df['evidence'].fillna('').astype(str).apply(shorten_evidence)
-                            else:
-                                 # Add empty evidence column if missing for consistent markdown output
-                                 df['evidence'] = '' # Assign empty string
-
-                            # Define expected columns (Capitalized) AFTER potential evidence creation
-                            expected_cols = ['Attribute', 'Value', 'Evidence']
-
-                            # Capitalize existing columns AFTER potentially adding 'evidence'
-                            df.columns = [str(col).capitalize() for col in df.columns]
-                            df.drop(columns=['Status'], inplace=True)
-                            # Add any other missing expected columns and reorder
-                            for col in expected_cols:
-                                 if col not in df.columns:
-                                      df[col] = '' # Add missing column with empty string
-
-                            # Reindex to ensure order and include all expected columns
-                            # Use capitalized expected_cols for reindexing
-                            df_markdown = df.reindex(columns=expected_cols, fill_value='').to_markdown(index=False)
-                            markdown_output += df_markdown + "\n\n"
-                        else:
-                             markdown_output += f"*No data found for {str(category).capitalize()} under {str(key).capitalize()}.*\n\n"
-
+                        parts.append(_record_table(category_data, STEP3_COLUMNS) + "\n\n")
                     except Exception as e:
-                        markdown_output += f"*Error generating table for {str(key).capitalize()}/{str(category).capitalize()}: {str(e)}*\n\n"
-                        print(f"Error creating DataFrame/Markdown for {key}/{category}: {str(e)}")
+                        parts.append(f"*Error generating table for {status_title}/{category_title}: {str(e)}*\n\n")
+                        print(f"Error creating markdown table for {key}/{category}: {str(e)}")
                 else:
-                     markdown_output += f"*No data found for {str(category).capitalize()} under {str(key).capitalize()}.*\n\n" # Handle empty category data list
+                    parts.append(f"*No data found for {category_title} under {status_title}.*\n\n")
         else:
-             markdown_output += f"*No categories found for {str(key).capitalize()}.*\n\n" # Handle empty or non-dict status group
+            parts.append(f"*No categories found for {status_title}.*\n\n")
 
-        markdown_output += "---\n\n" # Separator after each status group
+        parts.append("---\n\n") # Separator after each status group
 
-    return markdown_output
\ No newline at end of file
+    return "".join(parts)
@@ -0,0 +1,275 @@
+import asyncio
+import hashlib
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from concurrency import is_rate_limit_error
+
+# Key pool settings, overridable through the environment
+# Request rate each key starts at before its quota is learned, in requests per minute
+KEY_INITIAL_RPM = float(os.environ.get("PRAISE_KEY_INITIAL_RPM", 1000))
+KEY_MAX_RPM = float(os.environ.get("PRAISE_KEY_MAX_RPM", 10000))
+KEY_MIN_RPM = 1.0
+# Rate added per successful call, so a key probes back up after a rate-limit error
+KEY_RPM_STEP = 0.5
+# A bucket holds this many seconds' worth of requests (at least one)
+KEY_BURST_SECONDS = 1.0
+# A rate-limited key rests this long, doubling with each further rate-limit error in a row
+KEY_COOLDOWN_SECONDS = float(os.environ.get("PRAISE_KEY_COOLDOWN_SECONDS", 5))
+KEY_MAX_COOLDOWN_SECONDS = 60.0
+# Quotas are per minute, so the rate a key was sent over the last minute is what it allows
+QUOTA_WINDOW_SECONDS = 60.0
+# A key's learned rate is set this far below the rate that hit its quota
+QUOTA_MARGIN = 0.9
+
+
+def key_fingerprint(api_key):
+    """Short hash identifying an API key without keeping the key itself."""
+    return hashlib.sha256(str(api_key or "").encode("utf-8")).hexdigest()[:16]
+
+
+class KeyState:
+    """Token bucket, load and counters of one API key."""
+
+    def __init__(self, api_key, rpm=KEY_INITIAL_RPM):
+        self.api_key = api_key
+        self.fingerprint = key_fingerprint(api_key)
+        self.rpm = rpm
+        self.tokens = self.capacity
+        self.refilled = time.monotonic()
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.strikes = 0
+        self.sent = deque() # monotonic times of requests within QUOTA_WINDOW_SECONDS
+        self.calls = 0
+        self.rate_limited = 0
+
+    @property
+    def capacity(self):
+        return max(1.0, self.rpm / 60 * KEY_BURST_SECONDS)
+
+    def refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.refilled) * self.rpm / 60)
+        self.refilled = now
+
+    def wait_time(self, now):
+        """Seconds until this key may send a request."""
+        if now < self.cooldown_until:
+            return self.cooldown_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) * 60 / self.rpm
+
+    def window_rpm(self, now):
+        while self.sent and self.sent[0] < now - QUOTA_WINDOW_SECONDS:
+            self.sent.popleft()
+        return len(self.sent) * 60 / QUOTA_WINDOW_SECONDS
+
+
+# Event loop -> {key fingerprint: async API client}; a grpc.aio client only works on the loop it was made on
+_async_clients = weakref.WeakKeyDictionary()
+_clients_lock = threading.Lock()
+
+
+def _async_client(api_key):
+    """The generativelanguage async client for `api_key` on the running event loop."""
+    from google.ai import generativelanguage as glm
+    loop = asyncio.get_running_loop()
+    with _clients_lock:
+        clients = _async_clients.setdefault(loop, {})
+        fingerprint = key_fingerprint(api_key)
+        if fingerprint not in clients:
+            clients[fingerprint] = glm.GenerativeServiceAsyncClient(client_options={"api_key": api_key})
+        return clients[fingerprint]
+
+
+class KeyBoundModel:
+    """
+    A Gemini model that sends its requests with one API key.
+
+    Requests go through the generativelanguage client made for that key, so the key
+    configured with genai.configure (and the clients genai builds from it) stay as they
+    are. Built by the for_api_key of models from pipeline._build_model.
+    """
+
+    def __init__(self, model_name, generation_config=None, system_instruction=None, api_key=None):
+        self.model_name = model_name if "/" in model_name else f"models/{model_name}"
+        self.generation_config = generation_config
+        self.system_instruction = system_instruction
+        self.api_key = api_key
+
+    def _contents(self, contents):
+        from google.generativeai import protos
+        return [protos.Content(role="user", parts=[protos.Part(text=contents)])]
+
+    async def generate_content_async(self, contents):
+        from google.generativeai import protos
+        from google.generativeai.types import AsyncGenerateContentResponse
+        request = protos.GenerateContentRequest(
+            model=self.model_name,
+            contents=self._contents(contents),
+            generation_config=protos.GenerationConfig(**(self.generation_config or {})),
+            system_instruction=protos.Content(parts=[protos.Part(text=self.system_instruction)]) if self.system_instruction else None,
+        )
+        response = await _async_client(self.api_key).generate_content(request)
+        return AsyncGenerateContentResponse.from_response(response)
+
+    async def count_tokens_async(self, contents):
+        from google.generativeai import protos
+        return await _async_client(self.api_key).count_tokens(
+            protos.CountTokensRequest(model=self.model_name, contents=self._contents(contents))
+        )
+
+
+class KeyPool:
+    """
+    Spread model calls over several API keys.
+
+    Each call goes to the least-loaded key that is not cooling down and has a token
+    in its bucket. A rate-limit error cools the key down and lowers its rate to just
+    below what it was sent over the last minute, which is where its quota is; every
+    successful call raises the rate a little again. With fewer than two keys the pool
+    stays out of the way and calls use the globally configured key.
+    """
+
+    def __init__(self, initial_rpm=KEY_INITIAL_RPM):
+        self.initial_rpm = initial_rpm
+        self._keys = {} # fingerprint -> KeyState
+        self._bound = {} # (id(model), fingerprint) -> (model, model bound to the key)
+        self._lock = threading.Lock()
+        self.waits = 0
+
+    def configure(self, api_keys):
+        """Use `api_keys`; keys already in the pool keep what was learned about them."""
+        with self._lock:
+            keys = {}
+            for api_key in api_keys:
+                fingerprint = key_fingerprint(api_key)
+                keys[fingerprint] = self._keys.get(fingerprint) or KeyState(api_key, self.initial_rpm)
+            self._keys = keys
+            self._bound = {key: value for key, value in self._bound.items() if key[1] in keys}
+
+    def __len__(self):
+        return len(self._keys)
+
+    async def acquire(self):
+        """Wait for a key that may send a request and take one of its tokens."""
+        waited = False
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                best, delay = None, None
+                for state in self._keys.values():
+                    state.refill(now)
+                    wait = state.wait_time(now)
+                    if wait <= 0 and (best is None or (state.in_flight, -state.tokens) < (best.in_flight, -best.tokens)):
+                        best = state
+                    delay = wait if delay is None else min(delay, wait)
+                if best is not None:
+                    best.tokens -= 1
+                    best.in_flight += 1
+                    best.calls += 1
+                    best.sent.append(now)
+                    self.waits += int(waited)
+                    return best
+                if delay is None:
+                    raise RuntimeError("No API keys in the pool")
+            waited = True
+            await asyncio.sleep(max(delay, 0.01))
+
+    def release(self, state, outcome):
+        """
+        Return a key taken by acquire().
+
+        Args:
+            state (KeyState): The key
+            outcome (str): "ok", "rate_limited", "error" or "cancelled"
+        """
+        with self._lock:
+            state.in_flight -= 1
+            if outcome == "ok":
+                state.strikes = 0
+                state.rpm = min(KEY_MAX_RPM, state.rpm + KEY_RPM_STEP)
+            elif outcome == "rate_limited":
+                now = time.monotonic()
+                state.rate_limited += 1
+                quota = state.window_rpm(now) * QUOTA_MARGIN
+                # Below the learned rate already (e.g. the quota is shared with other processes): back off further
+                state.rpm = max(KEY_MIN_RPM, quota if quota < state.rpm else state.rpm * 0.8)
+                state.tokens = 0.0
+                state.cooldown_until = now + min(KEY_MAX_COOLDOWN_SECONDS, KEY_COOLDOWN_SECONDS * 2 ** state.strikes)
+                state.strikes += 1
+
+    def bind(self, model, api_key):
+        """
+        `model` sending its requests with `api_key`, from the model's for_api_key
+        (models built by pipeline._build_model and the local stand-ins have one).
+        """
+        fingerprint = key_fingerprint(api_key)
+        with self._lock:
+            entry = self._bound.get((id(model), fingerprint))
+            if entry is not None and entry[0] is model:
+                return entry[1]
+        if not hasattr(model, "for_api_key"):
+            raise TypeError(f"{type(model).__name__} cannot be bound to an API key (no for_api_key)")
+        bound = model.for_api_key(api_key)
+        with self._lock:
+            self._bound[(id(model), fingerprint)] = (model, bound)
+        return bound
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            keys = []
+            for state in self._keys.values():
+                state.refill(now)
+                keys.append({
+                    "key": state.fingerprint,
+                    "rpm": round(state.rpm, 1),
+                    "sent_last_minute": len([sent for sent in state.sent if sent >= now - QUOTA_WINDOW_SECONDS]),
+                    "in_flight": state.in_flight,
+                    "cooling_down_seconds": max(0.0, state.cooldown_until - now),
+                    "calls": state.calls,
+                    "rate_limited": state.rate_limited,
+                })
+            return {
+                "keys": len(keys),
+                "available": sum(1 for key in keys if not key["cooling_down_seconds"]),
+                "in_flight": sum(key["in_flight"] for key in keys),
+                "calls": sum(key["calls"] for key in keys),
+                "rate_limited": sum(key["rate_limited"] for key in keys),
+                "waits": self.waits,
+                "per_key": keys,
+            }
+
+
+async def call_with_key(pool, model, call):
+    """
+    Run `call(bound_model)` (a coroutine factory) with a key from the pool.
+
+    A rate-limited key is cooled down and the call moves on to another key; the error
+    is raised once every key has been tried. With fewer than two keys in the pool this
+    is call(model).
+    """
+    if len(pool) < 2:
+        return await call(model)
+    tries = len(pool)
+    for attempt in range(tries):
+        state = await pool.acquire()
+        outcome = "cancelled"
+        try:
+            result = await call(pool.bind(model, state.api_key))
+            outcome = "ok"
+            return result
+        except Exception as e:
+            outcome = "rate_limited" if is_rate_limit_error(e) else "error"
+            if outcome == "error" or attempt == tries - 1:
+                raise
+        finally:
+            pool.release(state, outcome)
+
+
+# Shared by every model call in the process
+key_pool = KeyPool()
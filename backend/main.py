@@ -1,45 +1,113 @@
+import io
+import os
 import uuid
 from fastapi import FastAPI, HTTPException, Depends, status
 from fastapi.middleware.cors import CORSMiddleware
-import google.generativeai as genai
-import pandas as pd
+from fastapi.responses import Response, StreamingResponse
+import metrics
 from pipeline import (
+    cascade_stats,
+    organize_results,
+    merge_organized_results
+)
+from attribute_index import AttributeIndex
+from batch_jobs import (
+    BATCH_MAX_CONCURRENCY,
+    BATCH_PROCESSES,
+    BatchJob,
+    list_jobs,
+    open_job,
+    read_products,
+    resolve_input_path,
+    start_job_thread
+)
+from records import MATCH_STATUSES, matchings_to_records, records_from_rows, records_to_rows
+from responses import CompressionMiddleware, FastJSONResponse, dumps
+from async_pipeline import (
+    KEY_VALIDATION_TTL_SECONDS,
     check_heartbeat_status,
+    probe_api,
     complete_pipeline,
-    extract_review_attributes,
-    match_with_description,
-    categorize_attributes,
-    organize_results,
-    test_model
+    iter_review_attributes,
+    iter_review_matchings,
+    categorize_attributes
 )
+from cache import response_cache
+from category_memory import category_memory
+from concurrency import SingleFlight, model_call_flights, model_call_limiter, request_hedger, set_hedging
+from key_pool import key_fingerprint, key_pool
+from session_store import create_session_store
 from formatting_utils import (
     step1_markdown,
     step2_markdown,
     step3_markdown
 )
 from pydantic import BaseModel, Field
-from typing import Dict, Any, List
-
-api_key_configured = False
-configured_api_key = None
-MAX_WORKERS = 15 # set to 1 for serial operations
-
-# Structure: { session_id: { "input": {...}, "step1_result": {...}, "step2_result": {...}, ... } }
-session_data: Dict[str, Dict[str, Any]] = {}
-
-app = FastAPI()
+from typing import List, Literal, Optional
+
+DEFAULT_MAX_WORKERS = None # per-step cap on model calls in flight; None leaves it to the adaptive limiter, 1 is serial
+
+# Structure: { session_id: { "input": {...}, "step1_extract": {...}, "step2_match": {...}, "step3_categorize": {...},
+#   "category_map": {attribute: category}, "organized_reviews": int } }
+# Reviews can be appended to a session; each step then only processes the reviews its cached result does not cover.
+# Settings: "configured_key_fingerprints" (hashes of the keys last given to /configure, never the keys), "max_workers".
+# Use PRAISE_SESSION_STORE=sqlite to share them across workers.
+session_store = create_session_store()
+
+# API keys are only kept in process memory. Every worker picks up PRAISE_API_KEYS (comma-separated,
+# first key first) or GOOGLE_API_KEY on first use; /configure replaces them in the worker it reaches.
+ENV_API_KEYS = list(dict.fromkeys(
+    key.strip() for key in os.environ.get("PRAISE_API_KEYS", os.environ.get("GOOGLE_API_KEY", "")).split(",") if key.strip()
+))
+
+# Earlier versions stored the raw keys as settings
+for _legacy_setting in ("configured_api_key", "configured_api_keys"):
+    if session_store.get_setting(_legacy_setting) is not None:
+        session_store.set_setting(_legacy_setting, None)
+
+# Key this worker process passed to genai.configure, and the pool it gave key_pool
+process_api_key = None
+process_api_keys = []
+
+# Steps running in this worker, keyed by (session_id, step): a repeated request (retry,
+# double click) follows the running step instead of starting its model calls again
+step_flights = SingleFlight()
+
+app = FastAPI(default_response_class=FastJSONResponse)
+
+def get_max_workers():
+    return session_store.get_setting("max_workers", DEFAULT_MAX_WORKERS)
+
+def use_api_keys(api_keys):
+    """Send this worker's model calls with `api_keys`: the first through genai.configure, all of them through the key pool."""
+    global process_api_key, process_api_keys
+    import google.generativeai as genai # imported on first use, it is most of the server's import time
+    genai.configure(api_key=api_keys[0])
+    key_pool.configure(api_keys)
+    process_api_key, process_api_keys = api_keys[0], list(api_keys)
+
+def apply_shared_api_key():
+    """Configure this worker from ENV_API_KEYS unless it already has keys; returns whether it has any."""
+    if process_api_key is None and ENV_API_KEYS:
+        use_api_keys(ENV_API_KEYS)
+    return process_api_key is not None
 
 async def check_configuration():
-    if not api_key_configured:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="API key not configured. Please configure via /configure endpoint first."
-        )
+    if not apply_shared_api_key():
+        detail = "API key not configured. Please configure via /configure endpoint first."
+        if session_store.get_setting("configured_key_fingerprints"):
+            detail = (
+                "API keys were configured on another worker; keys are not shared between workers. "
+                "Set PRAISE_API_KEYS (or GOOGLE_API_KEY) for every worker, or call /configure again."
+            )
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
 
 async def get_session(session_id: str = Depends(lambda session_id: session_id)):
-    session = session_data.get(session_id)
+    session = session_store.get(session_id)
     if not session:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+    # Model calls made for this request follow the session's hedging choice
+    set_hedging(session["input"].get("hedge_requests"))
     return session
 
 app.add_middleware(
@@ -48,37 +116,107 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# gzip or brotli for JSON and text bodies of clients that accept them
+app.add_middleware(CompressionMiddleware)
 
 # ---Models---
 class ApiKeyRequest(BaseModel):
-    api_key: str = Field(..., min_length=1)
+    api_key: Optional[str] = Field(None, min_length=1)
+    api_keys: List[str] = [] # pool of keys to spread model calls over, in addition to api_key
 
 class StartSessionRequest(BaseModel):
     seller_description: str
     reviews: list[str]
+    use_cache: bool = True # set to False to bypass cached model responses
+    batched_matching: bool = False # match several reviews per model call
+    sharded_grouping: bool = False # group large attribute sets in concurrent chunks
+    canonical_attributes: bool = False # merge near-duplicate attribute names before matching
+    prefilter_reviews: bool = False # skip reviews with no factual content ("Great!") without a model call
+    dedup_reviews: bool = False # extract and match near-duplicate reviews once per cluster
+    lean_schema: bool = False # extract and match without the reasoning fields (fewer output tokens)
+    hedge_requests: Optional[bool] = None # resend slow model requests; None follows PRAISE_HEDGE_REQUESTS
+    pipelined: bool = False # /full_pipeline: match each review as soon as it is extracted (canonical names then follow completion order)
+
+class AppendReviewsRequest(BaseModel):
+    session_id: str
+    reviews: list[str]
 
 class SessionIdRequest(BaseModel):
     session_id: str
+    markdown: bool = True # set to False to leave markdown out of step results (render later via /markdown)
+    timings: bool = False # set to True to add this request's per-stage timing breakdown to the result
+    # "json" leaves out markdown, "markdown" returns only markdown, "summary" only counts; "all" follows `markdown`
+    fields: Literal["all", "json", "markdown", "summary"] = "all"
+    offset: int = Field(0, ge=0) # first review of per-review results (extract, match) to return
+    limit: Optional[int] = Field(None, ge=1) # number of reviews to return; None for all
+
+class MarkdownRequest(BaseModel):
+    session_id: str
+    step: str # "extract", "match" or "categorize"
+
+class BatchJobRequest(BaseModel):
+    input_path: Optional[str] = None # JSONL or CSV file in PRAISE_BATCH_INPUT_DIR, relative to it
+    content: Optional[str] = None # or the file's contents
+    format: Optional[str] = None # "jsonl" or "csv"; taken from input_path's extension if omitted
+    processes: int = Field(BATCH_PROCESSES, ge=1)
+    max_concurrency: int = Field(BATCH_MAX_CONCURRENCY, ge=1) # model calls in flight across the job's processes
+    use_cache: bool = True
+    batched_matching: bool = False
+    sharded_grouping: bool = False
+    canonical_attributes: bool = False
+    prefilter_reviews: bool = False
+    dedup_reviews: bool = False
+    lean_schema: bool = False
+    hedge_requests: Optional[bool] = None
+
+class BatchJobIdRequest(BaseModel):
+    job_id: str
+
+class BatchJobResumeRequest(BatchJobIdRequest):
+    processes: int = Field(BATCH_PROCESSES, ge=1)
+    max_concurrency: int = Field(BATCH_MAX_CONCURRENCY, ge=1)
+
+class BatchJobResultRequest(BaseModel):
+    job_id: str
+    product_id: str
 
 # --- Endpoints ---
 @app.post("/configure")
 async def configure_api(request: ApiKeyRequest):
-    """Configure the Gemini API key."""
-    global api_key_configured, configured_api_key
+    """
+    Configure the Gemini API key, or a pool of keys to spread model calls over.
+
+    Keys are checked with a token count rather than a generation, and a key that
+    passed within KEY_VALIDATION_TTL_SECONDS is accepted again without a check.
+    With two or more keys, each model call goes to the least-loaded key that has
+    quota left (see key_pool.py).
+    """
+    global process_api_key, process_api_keys
+    api_keys = list(dict.fromkeys(key.strip() for key in [request.api_key or "", *request.api_keys] if key.strip()))
+    if not api_keys:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Provide api_key or api_keys.")
     try:
-        genai.configure(api_key=request.api_key)
-        test_model.generate_content('test', generation_config=genai.types.GenerationConfig(max_output_tokens=1))
-        
-        api_key_configured = True
-        configured_api_key = request.api_key
+        use_api_keys(api_keys)
+        for position, api_key in enumerate(api_keys):
+            try:
+                await probe_api(api_key, max_age=KEY_VALIDATION_TTL_SECONDS)
+            except Exception as e:
+                if len(api_keys) > 1:
+                    e.args = (f"Key {position + 1} of {len(api_keys)}: {e}",)
+                raise
+
+        # Only hashes are shared, so other workers can tell why they have no keys
+        session_store.set_setting("configured_key_fingerprints", [key_fingerprint(api_key) for api_key in api_keys])
 
         # Reset to default value after successful configuration
-        global MAX_WORKERS
-        MAX_WORKERS = 15
+        session_store.set_setting("max_workers", DEFAULT_MAX_WORKERS)
+        if len(api_keys) > 1:
+            return {"message": f"{len(api_keys)} API keys configured successfully."}
         return {"message": "API key configured successfully."}
     except Exception as e:
-        api_key_configured = False
-        configured_api_key = None
+        process_api_key, process_api_keys = None, []
+        key_pool.configure([])
+        session_store.set_setting("configured_key_fingerprints", None)
         error_detail = f"Invalid API key or configuration failed: {str(e)}"
         if "API key not valid" in str(e):
             error_detail = "Invalid API Key provided."
@@ -90,148 +228,607 @@ async def configure_api(request: ApiKeyRequest):
 
 @app.get("/heartbeat", dependencies=[Depends(check_configuration)])
 async def get_heartbeat():
-    """Check API status after configuration."""
-    return {"status": check_heartbeat_status()}
+    """Check API status after configuration (a cached probe, see async_pipeline.probe_api)."""
+    return {"status": await check_heartbeat_status(process_api_key)}
 
 @app.post("/start_session", dependencies=[Depends(check_configuration)])
 async def start_session(request: StartSessionRequest):
     """Starts a new analysis session and returns a session ID."""
     session_id = str(uuid.uuid4())
-    session_data[session_id] = {
+    session_store.put(session_id, {
         "input": request.dict(),
         "step1_extract": None,
         "step2_match": None,
         "step3_categorize": None,
         "step4_organize": None,
-    }
+        "category_map": None,
+        "organized_reviews": 0,
+    })
     print(f"Started session: {session_id}")
     return {"session_id": session_id}
 
+@app.post("/append_reviews", dependencies=[Depends(check_configuration)])
+async def append_reviews(request: AppendReviewsRequest):
+    """
+    Add reviews to an existing session.
+
+    Cached step results are kept: the next /extract, /match and /categorize run only
+    for the new reviews and merge them into the session's results.
+    """
+    # Appended in one store update, so a step finishing meanwhile or another append is not overwritten
+    session = session_store.update(request.session_id, lambda stored: stored["input"]["reviews"].extend(request.reviews))
+    if not session:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
+    print(f"Appended {len(request.reviews)} reviews to session: {request.session_id}")
+    return {"session_id": request.session_id, "num_reviews": len(session["input"]["reviews"])}
+
 @app.get("/set_num_worker")
 async def set_num_workers():
     """Enable/Disable parallel processing"""
-    global MAX_WORKERS
-
-    if MAX_WORKERS == 1:
-        MAX_WORKERS = 15
-    elif MAX_WORKERS == 15:
-        MAX_WORKERS = 1
+    max_workers = DEFAULT_MAX_WORKERS if get_max_workers() == 1 else 1
+    session_store.set_setting("max_workers", max_workers)
+
+    return {"message": f"Parallel processing {'enabled' if max_workers != 1 else 'disabled'}."}
+
+@app.get("/concurrency_stats")
+async def get_concurrency_stats():
+    """
+    Current window, queue depth and outcome counters of the adaptive model-call limiter,
+    how many identical model calls and repeated step requests joined one in flight, and
+    the hedged request counters.
+    """
+    return {
+        **model_call_limiter.stats(),
+        "hedging": request_hedger.stats(),
+        "model_call_flights": model_call_flights.stats(),
+        "step_flights": step_flights.stats(),
+    }
 
-    return {"message": f"Parallel processing {'enabled' if MAX_WORKERS == 15 else 'disabled'}."}
+@app.get("/cascade_stats")
+async def get_cascade_stats():
+    """Model cascade counters: answers kept from the fast model and escalations by stage and problem."""
+    return cascade_stats.stats()
+
+@app.get("/key_pool_stats")
+async def get_key_pool_stats():
+    """Learned rate, load, cooldown and rate-limit counters of each pooled API key (identified by a hash)."""
+    return key_pool.stats()
+
+@app.get("/session_stats")
+async def get_session_stats():
+    """Size and eviction counters of the session store."""
+    return session_store.stats()
+
+@app.get("/cache_stats")
+async def get_cache_stats():
+    """Hit/miss counters and sizes of the model response cache."""
+    return response_cache.stats()
+
+@app.post("/cache_clear", dependencies=[Depends(check_configuration)])
+async def clear_cache():
+    """Drop every cached model response."""
+    response_cache.clear()
+    return {"message": "Response cache cleared."}
+
+@app.get("/metrics")
+async def get_metrics():
+    """
+    Prometheus metrics of this worker process.
+
+    Model call latency, outcomes, retries, error classes and token counts by stage
+    and model, stage wall times, and the current limiter, single-flight, hedging,
+    model cascade, key pool, cache, category memory and session store counters as gauges.
+    """
+    gauges = []
+    for prefix, source, stats in (
+        ("praise_limiter", "adaptive limiter", model_call_limiter.stats()),
+        ("praise_model_call_flights", "model call coalescing", model_call_flights.stats()),
+        ("praise_step_flights", "step request coalescing", step_flights.stats()),
+        ("praise_hedging", "request hedging", request_hedger.stats()),
+        ("praise_cascade", "model cascade", cascade_stats.stats()),
+        ("praise_key_pool", "API key pool", key_pool.stats()),
+        ("praise_response_cache", "response cache", response_cache.stats()),
+        ("praise_category_memory", "category memory", category_memory.stats()),
+        ("praise_session_store", "session store", session_store.stats()),
+    ):
+        for name, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                gauges.append((f"{prefix}_{name}", f"{name} of the {source}", value))
+    return Response(metrics.render(gauges), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/category_memory_stats")
+async def get_category_memory_stats():
+    """Size, version and hit counters of the persistent attribute -> category dictionary."""
+    return category_memory.stats()
+
+@app.post("/category_memory_clear", dependencies=[Depends(check_configuration)])
+async def clear_category_memory():
+    """Forget every remembered attribute category of the current version."""
+    category_memory.clear()
+    return {"message": "Category memory cleared."}
+
+# Per-review list in the cached result of steps 1 and 2
+STEP_ROWS = {"step1_extract": "extracted_attributes", "step2_match": "all_dataframes"}
+
+def _reviews_done(session, step_key):
+    """Number of reviews (from the start of the input) covered by a step's cached result."""
+    result = session.get(step_key)
+    if not result:
+        return 0
+    if step_key == "step3_categorize":
+        # Sessions cached before reviews could be appended have no counter and cover everything matched
+        return session.get("organized_reviews") or len(session["step2_match"]["all_dataframes"])
+    return len(result[STEP_ROWS[step_key]])
+
+def _failed_reviews(session, step_key):
+    """Indices of the reviews whose model calls failed in a step's cached result; rerunning the step retries them."""
+    return (session.get(step_key) or {}).get("failed_reviews", [])
+
+def _step_complete(session, step_key):
+    return (
+        bool(session.get(step_key)) and _reviews_done(session, step_key) >= len(session["input"]["reviews"])
+        and not _failed_reviews(session, step_key)
+    )
+
+def _require_step(session, step_key, detail):
+    if not _step_complete(session, step_key):
+        failed = _failed_reviews(session, step_key)
+        if failed:
+            detail += f" {len(failed)} reviews failed; run the step again to retry them."
+        raise HTTPException(status_code=400, detail=detail)
+
+def _pending_reviews(session, step_key, count):
+    """
+    Groups of review indices a step still has to run: the reviews that failed in its
+    cached result, then the reviews it does not cover yet. Each group comes with True
+    if its skip and duplicate counts are new (a retry's are already in the cached stats).
+    """
+    done = _reviews_done(session, step_key)
+    return [(_failed_reviews(session, step_key), False), (list(range(done, count)), True)]
+
+# Session key and markdown renderer of each step. Markdown is not stored in the
+# session; it is rendered from the cached JSON only when a response asks for it.
+STEP_MARKDOWN = {
+    "extract": ("step1_extract", lambda result, start=1: step1_markdown(result["extracted_attributes"], start)),
+    "match": ("step2_match", lambda result, start=1: step2_markdown(result["all_dataframes"], start)),
+    "categorize": ("step3_categorize", lambda result, start=1: step3_markdown(result["results"])),
+}
+
+def _step_summary(step, result):
+    """Counts describing a step result: its counters, reviews and rows, and rows per status (and category)."""
+    summary = {key: value for key, value in result.items() if isinstance(value, int) and not isinstance(value, bool)}
+    if "failed_reviews" in result:
+        summary["failed_reviews"] = len(result["failed_reviews"])
+    if step == "categorize":
+        groups = result["results"]
+        summary["statuses"] = {status: sum(len(items) for items in group.values()) for status, group in groups.items()}
+        summary["categories"] = {
+            status: {category: len(items) for category, items in group.items()} for status, group in groups.items()
+        }
+        return summary
+    per_review = result[STEP_ROWS[STEP_MARKDOWN[step][0]]]
+    summary["reviews"] = len(per_review)
+    summary["rows"] = sum(len(rows) for rows in per_review)
+    if step == "match":
+        statuses = dict.fromkeys(MATCH_STATUSES, 0)
+        for rows in per_review:
+            for row in rows:
+                if row.get("status") in statuses:
+                    statuses[row["status"]] += 1
+        summary["statuses"] = statuses
+    return summary
+
+def _step_response(step, result, request, timing=None):
+    """
+    A step result as returned to the client: the fields `request` selects, per-review rows
+    limited to its page, and the timing breakdown only if requested.
+    """
+    if request.fields == "summary":
+        response = {"summary": _step_summary(step, result)}
+    else:
+        response = {key: value for key, value in result.items() if key not in ("markdown", "timings")}
+        rows_key = STEP_ROWS.get(STEP_MARKDOWN[step][0])
+        if rows_key is not None and (request.offset or request.limit is not None):
+            rows = response[rows_key]
+            end = None if request.limit is None else request.offset + request.limit
+            response[rows_key] = rows[request.offset:end]
+            response["page"] = {"offset": request.offset, "limit": request.limit, "total_reviews": len(rows)}
+        if request.fields == "markdown" or (request.fields == "all" and request.markdown):
+            with metrics.stage_timer("markdown"):
+                markdown = STEP_MARKDOWN[step][1](response, request.offset + 1)
+            if request.fields == "markdown":
+                response = {key: value for key, value in response.items() if key == "page"}
+            response["markdown"] = markdown
+    if timing is not None:
+        response["timings"] = timing.to_dict()
+    return response
+
+def _save_step(session_id, session, **results):
+    """
+    Store a step's results in the session, keeping whatever other requests stored
+    while the step ran (e.g. reviews appended meanwhile, which the next run picks up).
+    """
+    session.update(results)
+    latest = session_store.update(session_id, lambda stored: stored.update(results))
+    if latest is not None and latest is not session:
+        session.update(latest)
+
+def _request_timing(request):
+    """Start timing the request; returns the Timing to include in the response, or None."""
+    timing = metrics.start_timing()
+    return timing if request.timings else None
+
+async def _extract_events(session_id, session):
+    """
+    Step 1 as events: ("review", rows of one review) as each finishes, then ("result", step result).
+
+    Reviews whose extraction call failed are listed in the result's "failed_reviews" and the
+    step stays incomplete; running it again retries only those reviews and any new ones.
+    """
+    if _step_complete(session, "step1_extract"):
+        print(f"Using cached extraction for session: {session_id}")
+        yield "result", session["step1_extract"]
+        return
+
+    reviews = session["input"]["reviews"]
+    done = _reviews_done(session, "step1_extract")
+    pending = _pending_reviews(session, "step1_extract", len(reviews))
+    print(f"Running extraction for session: {session_id} ({sum(len(indices) for indices, _ in pending)} reviews)")
+    extracted_attributes = (session["step1_extract"]["extracted_attributes"] if done else []) + [[] for _ in reviews[done:]]
+    stats = {name: session["step1_extract"].get(name, 0) if done else 0 for name in ("skipped_reviews", "duplicate_reviews")}
+    failed_reviews = set()
+    with metrics.stage_timer("extract"):
+        for indices, new in pending:
+            if not indices:
+                continue
+            failed = set()
+            async for position, attributes in iter_review_attributes(
+                [reviews[index] for index in indices], max_concurrency=get_max_workers(), use_cache=session["input"]["use_cache"],
+                prefilter=session["input"].get("prefilter_reviews", False), dedup=session["input"].get("dedup_reviews", False),
+                stats=stats if new else None, lean=session["input"].get("lean_schema", False), failed=failed
+            ):
+                extracted_attributes[indices[position]] = attributes
+                yield "review", {"step": "extract", "index": indices[position], "rows": attributes}
+            failed_reviews.update(indices[position] for position in failed)
+    result = {"extracted_attributes": extracted_attributes, **stats}
+    if failed_reviews:
+        result["failed_reviews"] = sorted(failed_reviews)
+    _save_step(session_id, session, step1_extract=result) # caching the result
+    yield "result", result
+
+async def _match_events(session_id, session):
+    """
+    Step 2 as events: ("review", matched rows of one review) as each finishes, then ("result", step result).
+
+    Failed matching calls are handled as in _extract_events.
+    """
+    if _step_complete(session, "step2_match"):
+        print(f"Using cached matching for session: {session_id}")
+        yield "result", session["step2_match"] # Return cached result
+        return
+
+    seller_description = session["input"]["seller_description"]
+    extracted_attributes = session["step1_extract"]["extracted_attributes"]
+    done = _reviews_done(session, "step2_match")
+    pending = _pending_reviews(session, "step2_match", len(extracted_attributes))
+    print(f"Running matching for session: {session_id} ({sum(len(indices) for indices, _ in pending)} reviews)")
+    attribute_index = None
+    if session["input"].get("canonical_attributes"):
+        # Steps 2-4 see canonical names; the index maps them back to the extracted names
+        attribute_index = AttributeIndex.from_dict(session["step2_match"].get("attribute_index") if done else None)
+    all_dataframes = (session["step2_match"]["all_dataframes"] if done else []) + [[] for _ in extracted_attributes[done:]]
+    stats = {name: session["step2_match"].get(name, 0) if done else 0 for name in ("skipped_matches", "duplicate_matches")}
+    failed_reviews = set()
+    with metrics.stage_timer("match"):
+        for indices, new in pending:
+            if not indices:
+                continue
+            attributes_to_match = [extracted_attributes[index] for index in indices]
+            if attribute_index is not None:
+                with metrics.stage_timer("canonicalize"):
+                    attributes_to_match = attribute_index.canonicalize(attributes_to_match)
+            failed = set()
+            async for position, rows in iter_review_matchings(
+                seller_description, attributes_to_match, max_concurrency=get_max_workers(),
+                use_cache=session["input"]["use_cache"], batched=session["input"]["batched_matching"],
+                stats=stats if new else None, lean=session["input"].get("lean_schema", False), failed=failed
+            ):
+                # serializable format (list of dicts per review)
+                all_dataframes[indices[position]] = records_to_rows(matchings_to_records([{"result": rows}]))[0]
+                yield "review", {"step": "match", "index": indices[position], "rows": rows}
+            failed_reviews.update(indices[position] for position in failed)
+    result = {"all_dataframes": all_dataframes, **stats}
+    if attribute_index is not None:
+        result["attribute_index"] = attribute_index.to_dict()
+    if failed_reviews:
+        result["failed_reviews"] = sorted(failed_reviews)
+    _save_step(session_id, session, step2_match=result) # Cache the result
+    yield "result", result
+
+async def _categorize_events(session_id, session):
+    yield "result", await _run_categorize(session_id, session)
+
+async def _single_flight(step, events, session_id, session):
+    """
+    Run a step's events once per (session, step) at a time; concurrent requests for the
+    same step get the running step's events instead of making their own model calls.
+    """
+    async for event in step_flights.stream((session_id, step), lambda: events(session_id, session)):
+        yield event
+    # A request that joined another's step holds a session copy without that step's results
+    latest = session_store.get(session_id)
+    if latest:
+        session.update(latest)
+
+async def _final_result(events):
+    """Drain a step's events and return its result."""
+    result = None
+    async for event, data in events:
+        if event == "result":
+            result = data
+    return result
+
+async def _with_markdown(step, events, request, timing=None):
+    """Pass a step's events through, shaping its result as `request` asks (see _step_response)."""
+    async for event, data in events:
+        if event == "result":
+            data = _step_response(step, data, request, timing)
+        yield event, data
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {dumps(data).decode('utf-8')}\n\n"
+
+def _event_stream(events, error_prefix):
+    """Wrap step events as a Server-Sent Events response; failures become an `error` event."""
+    async def stream():
+        try:
+            async for event, data in events:
+                yield _sse(event, data)
+        except Exception as e:
+            yield _sse("error", {"detail": f"{error_prefix}: {str(e)}"})
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.post("/extract", dependencies=[Depends(check_configuration)])
 async def extract_attributes_session(request: SessionIdRequest):
     """Step 1: Extract factual details for a given session."""
+    timing = _request_timing(request)
     session = await get_session(request.session_id)
-    if not session: # just in case, though get_session should handle it
-         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
-
-    if session.get("step1_extract"):
-        print(f"Using cached extraction for session: {request.session_id}")
-        return session["step1_extract"]
-
     try:
-        print(f"Running extraction for session: {request.session_id}")
-        reviews = session["input"]["reviews"]
-        extracted_attributes = extract_review_attributes(reviews, num_workers=MAX_WORKERS)
-        markdown_output = step1_markdown(extracted_attributes)
-        result = {"extracted_attributes": extracted_attributes, "markdown": markdown_output}
-        session["step1_extract"] = result # caching the result
-        return result
+        return FastJSONResponse(await _final_result(
+            _with_markdown(
+                "extract", _single_flight("extract", _extract_events, request.session_id, session), request, timing
+            )
+        ))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Extraction failed: {str(e)}")
 
+@app.post("/extract_stream", dependencies=[Depends(check_configuration)])
+async def extract_attributes_session_stream(request: SessionIdRequest):
+    """Step 1 as Server-Sent Events: one `review` event per review as it finishes, then a `result` event."""
+    timing = _request_timing(request)
+    session = await get_session(request.session_id)
+    return _event_stream(
+        _with_markdown(
+            "extract", _single_flight("extract", _extract_events, request.session_id, session), request, timing
+        ),
+        "Extraction failed"
+    )
+
 @app.post("/match", dependencies=[Depends(check_configuration)])
 async def match_attributes_session(request: SessionIdRequest):
     """Step 2: Match extracted attributes for a given session."""
+    timing = _request_timing(request)
     session = await get_session(request.session_id)
-    if not session:
-         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
-
-    if session.get("step2_match"):
-        print(f"Using cached matching for session: {request.session_id}")
-        return session["step2_match"] # Return cached result
-
-    if not session.get("step1_extract"):
-        raise HTTPException(status_code=400, detail="Extraction step must be completed first for this session.")
-
+    if not _step_complete(session, "step2_match"):
+        _require_step(session, "step1_extract", "Extraction step must be completed first for this session.")
     try:
-        print(f"Running matching for session: {request.session_id}")
-        seller_description = session["input"]["seller_description"]
-        extracted_attributes = session["step1_extract"]["extracted_attributes"]
-        all_dataframes = match_with_description(seller_description, extracted_attributes, num_workers=MAX_WORKERS)
-
-        # serializable format (list of dicts)
-        serializable_dataframes = [df.to_dict('records') for df in all_dataframes]
-        markdown_output = step2_markdown(serializable_dataframes) # Use serializable format for markdown
-
-        result = {"all_dataframes": serializable_dataframes, "markdown": markdown_output}
-        session["step2_match"] = result # Cache the result
-        return result
+        return FastJSONResponse(await _final_result(
+            _with_markdown("match", _single_flight("match", _match_events, request.session_id, session), request, timing)
+        ))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Matching failed: {str(e)}")
 
+@app.post("/match_stream", dependencies=[Depends(check_configuration)])
+async def match_attributes_session_stream(request: SessionIdRequest):
+    """Step 2 as Server-Sent Events: one `review` event per review as it finishes, then a `result` event."""
+    timing = _request_timing(request)
+    session = await get_session(request.session_id)
+    if not _step_complete(session, "step2_match"):
+        _require_step(session, "step1_extract", "Extraction step must be completed first for this session.")
+    return _event_stream(
+        _with_markdown("match", _single_flight("match", _match_events, request.session_id, session), request, timing),
+        "Matching failed"
+    )
+
+async def _run_categorize(session_id, session):
+    if _step_complete(session, "step3_categorize"):
+        print(f"Using cached categorization for session: {session_id}")
+        return session["step3_categorize"] # Return cached result
+
+    all_dataframes = session["step2_match"]["all_dataframes"]
+    done = _reviews_done(session, "step3_categorize")
+    print(f"Running categorization for session: {session_id} ({len(all_dataframes) - done} new reviews)")
+    new_records = [records_from_rows(rows) for rows in all_dataframes[done:]]
+
+    # Only attributes missing from the session's category map are sent to the model
+    with metrics.stage_timer("categorize"):
+        categories, _ = await categorize_attributes(
+            new_records, use_cache=session["input"]["use_cache"], known_categories=session.get("category_map") if done else None,
+            sharded=session["input"].get("sharded_grouping", False)
+        )
+    # Check if categorize_attributes returned an error
+    if isinstance(categories, dict) and categories.get('error'):
+         raise Exception(f"Categorization pipeline step failed: {categories.get('error')}")
+
+    with metrics.stage_timer("organize"):
+        results = organize_results(new_records, categories)
+        if done:
+            results = merge_organized_results(session["step3_categorize"]["results"], results)
+    # Check if organize_results implicitly failed (e.g., returned unexpected structure) - basic check
+    if not isinstance(results, dict) or not all(k in results for k in ["missing", "matching", "contradictory", "partially_matching"]):
+         raise Exception("Organize results step produced invalid output structure.")
+
+    final_result = {"results": results}
+    _save_step( # Cache the result
+        session_id, session, step3_categorize=final_result, category_map=categories, organized_reviews=len(all_dataframes)
+    )
+    return final_result
+
 @app.post("/categorize", dependencies=[Depends(check_configuration)])
 async def categorize_session(request: SessionIdRequest):
     """Step 3: Group attributes into categories for a given session."""
+    timing = _request_timing(request)
     session = await get_session(request.session_id)
-    if not session:
-         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Session not found")
-
-    if session.get("step3_categorize"):
-        print(f"Using cached categorization for session: {request.session_id}")
-        return session["step3_categorize"] # Return cached result
+    if not _step_complete(session, "step3_categorize"):
+        _require_step(session, "step2_match", "Matching step must be completed first for this session.")
+    try:
+        result = await _final_result(_single_flight("categorize", _categorize_events, request.session_id, session))
+        return FastJSONResponse(_step_response("categorize", result, request, timing))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Categorization failed: {str(e)}")
 
-    if not session.get("step2_match"):
-        raise HTTPException(status_code=400, detail="Matching step must be completed first for this session.")
+@app.post("/analyze_stream", dependencies=[Depends(check_configuration)])
+async def analyze_session_stream(request: SessionIdRequest):
+    """
+    Run every remaining step of a session as Server-Sent Events.
 
-    try:
-        print(f"Running categorization for session: {request.session_id}")
-        serializable_dataframes = session["step2_match"]["all_dataframes"]
+    Emits `review` events for each review's extracted and matched rows as they finish,
+    a `step_result` event when extraction and matching complete, and a final `result`
+    event with the organized results of categorization.
+    """
+    timing = _request_timing(request)
+    session = await get_session(request.session_id)
 
-        # --- Robust DataFrame Reconstruction ---
-        dataframes = []
-        for i, df_dict in enumerate(serializable_dataframes):
-            try:
-                # Attempt to create DataFrame, handle empty dict list specifically
-                if isinstance(df_dict, list): # It should be list of records
-                     df = pd.DataFrame(df_dict)
-                     dataframes.append(df)
+    async def events():
+        for step, step_events in (("extract", _extract_events), ("match", _match_events)):
+            async for event, data in _with_markdown(
+                step, _single_flight(step, step_events, request.session_id, session), request
+            ):
+                if event == "result":
+                    yield "step_result", {"step": step, "result": data}
                 else:
-                     # Log unexpected format if it's not a list (as expected from to_dict('records'))
-                     print(f"Warning: Expected list of dicts for DataFrame #{i}, but got {type(df_dict)}. Skipping.")
-                     dataframes.append(pd.DataFrame()) # Append empty DF to maintain list length if needed downstream
-            except Exception as df_error:
-                print(f"Error reconstructing DataFrame #{i} from dict: {df_dict}. Error: {str(df_error)}")
-                # Append an empty DataFrame to avoid breaking downstream logic expecting a list
-                dataframes.append(pd.DataFrame())
-        # --- End Robust Reconstruction ---
-
-        categories, _ = categorize_attributes(dataframes)
-        # Check if categorize_attributes returned an error
-        if isinstance(categories, dict) and categories.get('error'):
-             raise Exception(f"Categorization pipeline step failed: {categories.get('error')}")
-
-        results = organize_results(dataframes, categories) # organize_results expects list of DFs
-        # Check if organize_results implicitly failed (e.g., returned unexpected structure) - basic check
-        if not isinstance(results, dict) or not all(k in results for k in ["missing", "matching", "contradictory", "partially_matching"]):
-             raise Exception("Organize results step produced invalid output structure.")
-
-        markdown_output = step3_markdown(results)
-
-        final_result = {"results": results, "markdown": markdown_output}
-        session["step3_categorize"] = final_result # Cache the result
-        return final_result
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Categorization failed: {str(e)}")
+                    yield event, data
+            failed = _failed_reviews(session, STEP_MARKDOWN[step][0])
+            if failed:
+                raise RuntimeError(f"{step} failed for {len(failed)} reviews; run the analysis again to retry them")
+        result = await _final_result(_single_flight("categorize", _categorize_events, request.session_id, session))
+        yield "result", _step_response("categorize", result, request, timing)
+
+    return _event_stream(events(), "Analysis failed")
+
+@app.post("/markdown")
+async def get_step_markdown(request: MarkdownRequest):
+    """Render the markdown of a completed step from the session's cached results."""
+    if request.step not in STEP_MARKDOWN:
+        raise HTTPException(status_code=400, detail=f"Unknown step '{request.step}'. Use one of: {', '.join(STEP_MARKDOWN)}.")
+    session = await get_session(request.session_id)
+    step_key, render = STEP_MARKDOWN[request.step]
+    if not session.get(step_key):
+        raise HTTPException(status_code=400, detail=f"Step '{request.step}' has not been run for this session.")
+    return FastJSONResponse({"markdown": render(session[step_key])})
+
+
+def _get_batch_job(job_id):
+    try:
+        return open_job(job_id)
+    except KeyError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Batch job not found")
+
+@app.post("/batch_job_start", dependencies=[Depends(check_configuration)])
+async def start_batch_job(request: BatchJobRequest):
+    """
+    Create a batch job from a JSONL or CSV file and run it in the background.
+
+    Products are processed by a pool of worker processes sharing `max_concurrency`
+    model calls; every step of every product is checkpointed, so an interrupted
+    job continues where it stopped via /batch_job_resume.
+    """
+    if (request.input_path is None) == (request.content is None):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Provide either input_path or content.")
+    input_path = None
+    if request.input_path is not None:
+        try:
+            input_path = resolve_input_path(request.input_path)
+        except PermissionError as e:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+    try:
+        if input_path is not None:
+            products = read_products(input_path, request.format)
+        else:
+            products = read_products(io.StringIO(request.content), request.format or "jsonl")
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Could not read products: {str(e)}")
+    options = request.dict(exclude={"input_path", "content", "format", "processes", "max_concurrency"})
+    job = BatchJob.create(products, options, input_path)
+    start_job_thread(
+        job, processes=request.processes, max_concurrency=request.max_concurrency,
+        api_key=process_api_key, api_keys=process_api_keys
+    )
+    print(f"Started batch job {job.job_id} with {len(products)} products")
+    return job.progress()
+
+@app.post("/batch_job_resume", dependencies=[Depends(check_configuration)])
+async def resume_batch_job(request: BatchJobResumeRequest):
+    """Continue an interrupted job; only steps without a checkpoint are run again."""
+    job = _get_batch_job(request.job_id)
+    if job.progress()["status"] == "running" or not start_job_thread(
+        job, processes=request.processes, max_concurrency=request.max_concurrency,
+        api_key=process_api_key, api_keys=process_api_keys
+    ):
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Batch job is already running.")
+    return job.progress()
+
+@app.post("/batch_job_status")
+async def get_batch_job_status(request: BatchJobIdRequest):
+    """Progress, per-step checkpoint counts and throughput of a batch job."""
+    return _get_batch_job(request.job_id).progress()
+
+@app.get("/batch_jobs")
+async def get_batch_jobs():
+    """Progress of every batch job."""
+    return [open_job(job_id).progress() for job_id in list_jobs()]
+
+@app.post("/batch_job_result")
+async def get_batch_job_result(request: BatchJobResultRequest):
+    """Organized results of one product of a batch job."""
+    result = _get_batch_job(request.job_id).result(request.product_id)
+    if result is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No result for this product yet")
+    return result
 
 
 @app.post("/full_pipeline", dependencies=[Depends(check_configuration)])
 async def analyze_product(request: StartSessionRequest): # Reuse StartSessionRequest model
-    """Run the complete pipeline in one call (no session state used)."""
+    """
+    Run the complete pipeline in one call (no session state used).
+
+    The body is the organized results; the X-Skipped-* headers count the reviews that
+    needed no extraction or matching call, the X-Duplicate-* headers those that reused
+    the result of a near-duplicate review. Server-Timing has the wall time of each stage.
+    """
+    timing = metrics.start_timing()
+    set_hedging(request.hedge_requests)
     try:
-        results = complete_pipeline(request.seller_description, request.reviews)
-        return results
+        stats = {"skipped_reviews": 0, "skipped_matches": 0, "duplicate_reviews": 0, "duplicate_matches": 0}
+        results = await complete_pipeline(
+            request.seller_description, request.reviews, max_concurrency=get_max_workers(),
+            use_cache=request.use_cache, batched_matching=request.batched_matching,
+            sharded_grouping=request.sharded_grouping, canonical_attributes=request.canonical_attributes,
+            prefilter_reviews=request.prefilter_reviews, dedup_reviews=request.dedup_reviews, stats=stats,
+            pipelined=request.pipelined, lean_schema=request.lean_schema
+        )
+        return FastJSONResponse(results, headers={
+            "X-Skipped-Reviews": str(stats["skipped_reviews"]),
+            "X-Skipped-Matches": str(stats["skipped_matches"]),
+            "X-Duplicate-Reviews": str(stats["duplicate_reviews"]),
+            "X-Duplicate-Matches": str(stats["duplicate_matches"]),
+            "Server-Timing": timing.server_timing(),
+        })
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
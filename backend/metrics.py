@@ -0,0 +1,270 @@
+"""
+Process-wide metrics in Prometheus text format, plus per-request timing breakdowns.
+
+Model calls are recorded by stage ("extract", "match", "batch_match", "group")
+and model name: latency of every API attempt and of the whole call including
+limiter queueing and retries, outcomes, retries, error classes and the prompt /
+output token counts from the response usage metadata. Local work (steps,
+organizing, markdown rendering) is timed with stage_timer.
+
+Everything recorded inside a start_timing() scope is also added to that scope's
+Timing, which the API returns alongside results on request. Counters are per
+process; with several workers each one exposes its own /metrics.
+"""
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram buckets in seconds
+MODEL_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+STAGE_LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value):
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=MODEL_LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (math.inf,)
+        self._values = {} # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [0] * len(self.buckets) + [0.0, 0]
+            for position, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[position] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, series in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', _number(bound))])} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-2])}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {series[-1]}")
+        return lines
+
+
+model_call_seconds = Histogram(
+    "praise_model_call_duration_seconds", "Model call latency including limiter queueing and retries", ("stage", "model")
+)
+model_attempt_seconds = Histogram(
+    "praise_model_attempt_duration_seconds", "Latency of single model API attempts", ("stage", "model")
+)
+model_calls = Counter(
+    "praise_model_calls_total", "Model calls by outcome (ok, cached, coalesced, error)", ("stage", "model", "outcome")
+)
+model_retries = Counter("praise_model_retries_total", "Model API attempts that were retried", ("stage", "model"))
+model_errors = Counter("praise_model_errors_total", "Failed model API attempts by error class", ("stage", "model", "error_class"))
+model_tokens = Counter("praise_model_tokens_total", "Tokens reported in response usage metadata", ("stage", "model", "kind"))
+model_hedges = Counter(
+    "praise_model_hedges_total", "Hedged model requests by which request returned the winning response", ("stage", "model", "outcome")
+)
+stage_seconds = Histogram(
+    "praise_stage_duration_seconds", "Wall time of pipeline steps and local work", ("stage",), STAGE_LATENCY_BUCKETS
+)
+
+METRICS = (
+    model_call_seconds, model_attempt_seconds, model_calls, model_retries, model_errors, model_tokens, model_hedges, stage_seconds
+)
+
+
+class Timing:
+    """Per-request breakdown: wall time per stage and model call totals per call stage."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.model_calls = {}
+        self._lock = threading.Lock()
+
+    def add_stage(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def _totals_locked(self, stage):
+        return self.model_calls.setdefault(stage, {
+            "calls": 0, "cached": 0, "coalesced": 0, "hedged": 0, "hedge_wins": 0, "retries": 0, "errors": 0, "seconds": 0.0, "prompt_tokens": 0, "output_tokens": 0,
+        })
+
+    def add_call(self, stage, seconds=0.0, cached=False, retries=0, error=False, coalesced=False):
+        with self._lock:
+            totals = self._totals_locked(stage)
+            totals["calls"] += 1
+            totals["cached"] += int(cached)
+            totals["coalesced"] += int(coalesced)
+            totals["retries"] += retries
+            totals["errors"] += int(error)
+            totals["seconds"] += seconds
+
+    def add_hedge(self, stage, hedge_won):
+        with self._lock:
+            totals = self._totals_locked(stage)
+            totals["hedged"] += 1
+            totals["hedge_wins"] += int(hedge_won)
+
+    def add_tokens(self, stage, prompt_tokens, output_tokens):
+        with self._lock:
+            totals = self._totals_locked(stage)
+            totals["prompt_tokens"] += prompt_tokens
+            totals["output_tokens"] += output_tokens
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                "total_seconds": time.perf_counter() - self.started,
+                "stages": dict(self.stages),
+                "model_calls": {stage: dict(totals) for stage, totals in self.model_calls.items()},
+            }
+
+    def server_timing(self):
+        """Value for a Server-Timing header: one entry per stage, durations in milliseconds."""
+        with self._lock:
+            entries = [f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.stages.items()]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.1f}")
+        return ", ".join(entries)
+
+
+_current_timing = contextvars.ContextVar("praise_timing", default=None)
+
+
+def start_timing():
+    """Start collecting a Timing for the current request; tasks started from here share it."""
+    timing = Timing()
+    _current_timing.set(timing)
+    return timing
+
+
+def current_timing():
+    return _current_timing.get()
+
+
+@contextmanager
+def stage_timer(stage):
+    """Time a block as `stage` in praise_stage_duration_seconds and the current Timing."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - started
+        stage_seconds.observe(seconds, stage)
+        timing = current_timing()
+        if timing is not None:
+            timing.add_stage(stage, seconds)
+
+
+def model_name(model):
+    return str(getattr(model, "model_name", type(model).__name__)).rsplit("/", 1)[-1]
+
+
+def record_attempt(stage, model, seconds, response=None, error=None):
+    """
+    Record one model API attempt.
+
+    Args:
+        stage (str): Pipeline stage the call belongs to
+        model (str): Model name
+        seconds (float): Attempt latency
+        response: The response, for its usage metadata
+        error (Exception): The error if the attempt failed
+    """
+    model_attempt_seconds.observe(seconds, stage, model)
+    if error is not None:
+        model_errors.inc(stage, model, type(error).__name__)
+        return
+    usage = getattr(response, "usage_metadata", None)
+    prompt_tokens = getattr(usage, "prompt_token_count", 0) or 0
+    output_tokens = getattr(usage, "candidates_token_count", 0) or 0
+    if prompt_tokens or output_tokens:
+        model_tokens.inc(stage, model, "prompt", amount=prompt_tokens)
+        model_tokens.inc(stage, model, "output", amount=output_tokens)
+        timing = current_timing()
+        if timing is not None:
+            timing.add_tokens(stage, prompt_tokens, output_tokens)
+
+
+def record_call(stage, model, seconds, cached=False, retries=0, error=None, coalesced=False):
+    """
+    Record a whole model call: served from cache, joined to an identical call in
+    flight (coalesced), or made after `retries` retried attempts.
+    """
+    outcome = "cached" if cached else "coalesced" if coalesced else "error" if error is not None else "ok"
+    model_calls.inc(stage, model, outcome)
+    if not cached:
+        model_call_seconds.observe(seconds, stage, model)
+    if retries:
+        model_retries.inc(stage, model, amount=retries)
+    timing = current_timing()
+    if timing is not None:
+        timing.add_call(stage, seconds, cached, retries, error is not None, coalesced)
+
+
+def record_hedge(stage, model, outcome):
+    """Record a hedged request; `outcome` is "hedge_won" or "original_won"."""
+    model_hedges.inc(stage, model, outcome)
+    timing = current_timing()
+    if timing is not None:
+        timing.add_hedge(stage, outcome == "hedge_won")
+
+
+def render(gauges=()):
+    """
+    All metrics in Prometheus text exposition format.
+
+    Args:
+        gauges (iterable): Extra (name, help, value) gauges sampled at scrape time
+    """
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    for name, documentation, value in gauges:
+        lines += [f"# HELP {name} {documentation}", f"# TYPE {name} gauge", f"{name} {_number(value)}"]
+    return "\n".join(lines) + "\n"
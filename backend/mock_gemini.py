@@ -0,0 +1,460 @@
+"""
+Local stand-in for the Gemini models, for benchmarks and offline runs.
+
+MockModel mimics the parts of GenerativeModel the pipeline uses
+(`generate_content_async`, `generate_content`, `model_name` and the config
+attributes hashed into cache keys). It answers with canned, schema-valid
+responses derived from the prompt, after a latency drawn from a configurable
+distribution, and can inject 429s, server errors and malformed output.
+
+install_mock_models() swaps the models in pipeline.py. Setting PRAISE_MOCK_GEMINI
+to a latency spec (e.g. "lognormal:0.8,0.5") does the same when pipeline.py is
+imported, so a whole server can run against the stand-in.
+"""
+import ast
+import asyncio
+import copy
+import json
+import os
+import random
+import threading
+import time
+import zlib
+from collections import deque
+
+# Stand-in settings, overridable through the environment
+MOCK_LATENCY = os.environ.get("PRAISE_MOCK_GEMINI", "")
+MOCK_RATE_LIMIT_RATE = float(os.environ.get("PRAISE_MOCK_RATE_LIMIT_RATE", 0.0))
+MOCK_ERROR_RATE = float(os.environ.get("PRAISE_MOCK_ERROR_RATE", 0.0))
+MOCK_MALFORMED_RATE = float(os.environ.get("PRAISE_MOCK_MALFORMED_RATE", 0.0))
+# Extra latency per output token, so shorter answers are faster as with the real model
+MOCK_SECONDS_PER_OUTPUT_TOKEN = float(os.environ.get("PRAISE_MOCK_SECONDS_PER_OUTPUT_TOKEN", 0.0))
+# Cascade (fast_*) models answer after this fraction of the latency, and this share of
+# their answers fail the quality checks
+MOCK_FAST_LATENCY_SCALE = float(os.environ.get("PRAISE_MOCK_FAST_LATENCY_SCALE", 0.5))
+MOCK_FAST_INVALID_RATE = float(os.environ.get("PRAISE_MOCK_FAST_INVALID_RATE", 0.1))
+# Fake quota: requests per minute each API key may send to each model (0 for no limit)
+MOCK_KEY_RPM = float(os.environ.get("PRAISE_MOCK_KEY_RPM", 0.0))
+
+# pipeline.py model attribute -> kind of canned response
+MODEL_KINDS = {
+    "extraction_model": "extract",
+    "matching_model": "match",
+    "batch_matching_model": "batch_match",
+    "lean_extraction_model": "extract",
+    "lean_matching_model": "match",
+    "lean_batch_matching_model": "batch_match",
+    "fast_extraction_model": "extract",
+    "fast_matching_model": "match",
+    "fast_batch_matching_model": "batch_match",
+    "fast_lean_extraction_model": "extract",
+    "fast_lean_matching_model": "match",
+    "fast_lean_batch_matching_model": "batch_match",
+    "grouping_model": "group",
+    "test_model": "heartbeat",
+}
+
+CATEGORIES = ("Physical Attributes", "Performance", "Materials", "Usability", "Packaging")
+STATUSES = ("matching", "partially_matching", "contradictory", "missing")
+
+# Rejected calls return after this fraction of the sampled latency
+_REJECT_LATENCY_FRACTION = 0.1
+
+
+def parse_latency(spec):
+    """
+    Build a latency sampler from a spec string.
+
+    Specs: "0.5" or "fixed:0.5", "uniform:low,high", "normal:mean,sd",
+    "lognormal:median,sigma" and "exponential:mean", all in seconds.
+
+    Returns:
+        callable: rng -> latency in seconds (never negative)
+    """
+    spec = str(spec or "0").strip()
+    kind, _, args = spec.partition(":") if ":" in spec else ("fixed", "", spec)
+    try:
+        values = [float(value) for value in args.split(",") if value.strip()]
+    except ValueError:
+        raise ValueError(f"Invalid latency spec: {spec}")
+    samplers = {
+        "fixed": (1, lambda rng, v: v[0]),
+        "uniform": (2, lambda rng, v: rng.uniform(v[0], v[1])),
+        "normal": (2, lambda rng, v: rng.gauss(v[0], v[1])),
+        "lognormal": (2, lambda rng, v: v[0] * rng.lognormvariate(0.0, v[1])),
+        "exponential": (1, lambda rng, v: rng.expovariate(1.0 / v[0]) if v[0] > 0 else 0.0),
+    }
+    if kind not in samplers or len(values) != samplers[kind][0]:
+        raise ValueError(f"Invalid latency spec: {spec}")
+    sample = samplers[kind][1]
+    return lambda rng: max(0.0, sample(rng, values))
+
+
+class MockRateLimitError(Exception):
+    code = 429
+
+
+class MockServerError(Exception):
+    code = 500
+
+
+class MockUsage:
+    def __init__(self, prompt_token_count, candidates_token_count):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+        self.total_token_count = prompt_token_count + candidates_token_count
+
+
+class MockCountTokensResponse:
+    def __init__(self, total_tokens):
+        self.total_tokens = total_tokens
+
+
+class MockResponse:
+    def __init__(self, text, prompt):
+        self.text = text
+        self.usage_metadata = MockUsage(_tokens(prompt), _tokens(text))
+
+
+def _tokens(text):
+    return len(text) // 4 + 1
+
+
+def _stable_choice(options, key):
+    return options[zlib.crc32(str(key).encode("utf-8")) % len(options)]
+
+
+def _after(prompt, marker):
+    return prompt.split(marker, 1)[1] if marker in prompt else ""
+
+
+def _extract_answer(prompt):
+    from review_filter import content_words
+    review = _after(prompt, "\n")
+    words = list(dict.fromkeys(content_words(review)))[:6]
+    # Reasoning about as long as the real model's, so the lean schema's savings show up in benchmarks
+    return json.dumps({
+        "chain_of_thought": " ".join(
+            f"The review mentions '{word}', which describes the product itself and can be verified, so it is a fact "
+            f"and becomes an attribute." for word in words
+        ),
+        "discarded_opinions": [],
+        "extracted_attributes": [
+            {"attribute": word, "value": words[i + 1] if i + 1 < len(words) else "mentioned"} for i, word in enumerate(words)
+        ],
+    })
+
+
+def _description(prompt):
+    return _after(prompt, "Seller Description:\n").split("\n\nExtracted Attributes", 1)[0].split("\n\nReviews", 1)[0]
+
+
+def _evidence(attribute, description):
+    """A few words quoted from the description, around the attribute if it occurs there."""
+    words = description.split()
+    position = next((i for i, word in enumerate(words) if str(attribute).lower() in word.lower()), 0)
+    return " ".join(words[max(0, position - 3):position + 4]) or None
+
+
+def _match_rows(attributes, description):
+    rows = []
+    for row in attributes:
+        if not isinstance(row, dict):
+            continue
+        status = _stable_choice(STATUSES, row.get("attribute"))
+        evidence = None if status == "missing" else _evidence(row.get("attribute"), description)
+        rows.append({**row, "status": status, "evidence": evidence})
+    return rows
+
+
+def _match_reasoning(attributes):
+    return " ".join(
+        f"The review says the {row.get('attribute')} is {row.get('value')}; I searched the seller description for it "
+        f"and compared the wording before choosing a status." for row in attributes if isinstance(row, dict)
+    )
+
+
+def _match_answer(prompt):
+    attributes = json.loads(_after(prompt, "Extracted Attributes:\n") or "[]")
+    return json.dumps({"reasoning": _match_reasoning(attributes), "result": _match_rows(attributes, _description(prompt))})
+
+
+def _batch_match_answer(prompt):
+    reviews = json.loads(_after(prompt, "Reviews:\n") or "[]")
+    return json.dumps({
+        "reasoning": " ".join(_match_reasoning(review["attributes"]) for review in reviews),
+        "reviews": [
+            {"review_index": review["review_index"], "result": _match_rows(review["attributes"], _description(prompt))}
+            for review in reviews
+        ],
+    })
+
+
+def _group_answer(prompt):
+    # The pipeline sends either a list literal or a comma-separated string
+    requested = _after(prompt, "\n\nattributes: ").split("\n\nexisting categories", 1)[0].strip()
+    try:
+        attributes = ast.literal_eval(requested)
+    except (ValueError, SyntaxError):
+        attributes = [attribute.strip() for attribute in requested.split(", ") if attribute.strip()]
+    lines = [f"{attribute}: {_stable_choice(CATEGORIES, attribute)}" for attribute in attributes]
+    return "<thinking>Grouped by what each attribute describes.</thinking>\n<answer>\n" + "\n".join(lines) + "\n</answer>"
+
+
+_ANSWERS = {
+    "extract": _extract_answer,
+    "match": _match_answer,
+    "batch_match": _batch_match_answer,
+    "group": _group_answer,
+    "heartbeat": lambda prompt: "ok",
+}
+
+
+def canned_response(kind, prompt, generation_config=None):
+    """Schema-valid response text of a `kind` model for `prompt`, limited to the fields of the config's response schema."""
+    text = _ANSWERS[kind](prompt)
+    schema = (generation_config or {}).get("response_schema")
+    if schema is None:
+        return text
+    fields = set(schema.properties.keys())
+    return json.dumps({key: value for key, value in json.loads(text).items() if key in fields})
+
+
+def _invalid_answer(text):
+    """The answer with its rows broken the way a weaker model's might be: unknown statuses, blank attribute names."""
+    data = json.loads(text)
+    rows = data.get("extracted_attributes") or data.get("result") or [
+        row for review in data.get("reviews", []) for row in review["result"]
+    ]
+    for row in rows:
+        if "status" in row:
+            row["status"] = "unclear"
+        else:
+            row["attribute"] = ""
+    return json.dumps(data)
+
+
+def _key_label(api_key):
+    return None if api_key is None else f"{zlib.crc32(str(api_key).encode('utf-8')):08x}"
+
+
+class MockQuota:
+    """Fake per-key quota: at most `rpm` accepted requests per API key and model in any `window_seconds`."""
+
+    def __init__(self, rpm=0.0, window_seconds=60.0):
+        self.rpm = rpm
+        self.window_seconds = window_seconds
+        self._sent = {} # (key label, model name) -> monotonic times of accepted requests
+        self._lock = threading.Lock()
+
+    def allow(self, api_key, model_name):
+        if self.rpm <= 0:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            sent = self._sent.setdefault((_key_label(api_key), model_name), deque())
+            while sent and sent[0] <= now - self.window_seconds:
+                sent.popleft()
+            if len(sent) >= self.rpm * self.window_seconds / 60:
+                return False
+            sent.append(now)
+            return True
+
+
+class MockStats:
+    """Call, error and concurrency counters shared by the installed mock models."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.calls = {}
+            self.key_calls = {}
+            self.rate_limited = 0
+            self.errors = 0
+            self.malformed = 0
+            self.in_flight = 0
+            self.max_in_flight = 0
+            self.prompt_tokens = 0
+            self.output_tokens = 0
+            self.service_latencies = []
+
+    def begin(self, kind, api_key=None):
+        with self._lock:
+            self.calls[kind] = self.calls.get(kind, 0) + 1
+            label = _key_label(api_key)
+            self.key_calls[label] = self.key_calls.get(label, 0) + 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def end(self, latency, outcome, response=None):
+        with self._lock:
+            self.in_flight -= 1
+            self.service_latencies.append(latency)
+            if outcome == "rate_limited":
+                self.rate_limited += 1
+            elif outcome == "error":
+                self.errors += 1
+            elif outcome == "malformed":
+                self.malformed += 1
+            if response is not None:
+                self.prompt_tokens += response.usage_metadata.prompt_token_count
+                self.output_tokens += response.usage_metadata.candidates_token_count
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "calls": dict(self.calls),
+                "total_calls": sum(self.calls.values()),
+                "calls_per_key": dict(self.key_calls),
+                "rate_limited": self.rate_limited,
+                "errors": self.errors,
+                "malformed": self.malformed,
+                "max_in_flight": self.max_in_flight,
+                "prompt_tokens": self.prompt_tokens,
+                "output_tokens": self.output_tokens,
+            }
+
+
+class MockModel:
+    """
+    Drop-in for a GenerativeModel that answers locally.
+
+    Args:
+        kind (str): Canned response kind, see MODEL_KINDS
+        latency (str): Latency spec, see parse_latency
+        rate_limit_rate (float): Probability of a 429 RESOURCE_EXHAUSTED error per call
+        error_rate (float): Probability of a 500 error per call
+        malformed_rate (float): Probability of truncated, unparsable output per call
+        seconds_per_output_token (float): Latency added per output token
+        latency_scale (float): Factor applied to sampled latencies, for faster model tiers
+        invalid_rate (float): Probability of well-formed output that fails the cascade quality checks
+        api_key (str): Key the requests are sent with (None for the globally configured one), see for_api_key
+        quota (MockQuota): Per-key limit; requests over it fail with a 429
+        stats (MockStats): Counters to update
+    """
+
+    def __init__(self, kind, model_name="models/gemini-2.0-flash", generation_config=None, system_instruction=None,
+                 latency="0", rate_limit_rate=0.0, error_rate=0.0, malformed_rate=0.0, seconds_per_output_token=0.0,
+                 latency_scale=1.0, invalid_rate=0.0, api_key=None, quota=None, seed=None, stats=None):
+        self.kind = kind
+        self.model_name = model_name
+        self._generation_config = generation_config or {}
+        self._system_instruction = system_instruction
+        self.latency = latency
+        self._sample_latency = parse_latency(latency)
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.malformed_rate = malformed_rate
+        self.seconds_per_output_token = seconds_per_output_token
+        self.latency_scale = latency_scale
+        self.invalid_rate = invalid_rate
+        self.api_key = api_key
+        self.quota = quota
+        self._rng = random.Random(seed)
+        self.stats = stats or MockStats()
+
+    def _plan(self, prompt):
+        """Decide the outcome and latency of one call: (outcome, latency, response or None)."""
+        latency = self._sample_latency(self._rng) * self.latency_scale
+        roll = self._rng.random()
+        if self.quota is not None and not self.quota.allow(self.api_key, self.model_name):
+            return "rate_limited", latency * _REJECT_LATENCY_FRACTION, None
+        if roll < self.rate_limit_rate:
+            return "rate_limited", latency * _REJECT_LATENCY_FRACTION, None
+        if roll < self.rate_limit_rate + self.error_rate:
+            return "error", latency * _REJECT_LATENCY_FRACTION, None
+        text = canned_response(self.kind, prompt, self._generation_config)
+        outcome = "ok"
+        if roll < self.rate_limit_rate + self.error_rate + self.malformed_rate:
+            text, outcome = text[:len(text) // 2], "malformed"
+        elif self._rng.random() < self.invalid_rate:
+            text = _invalid_answer(text)
+        response = MockResponse(text, prompt)
+        return outcome, latency + self.seconds_per_output_token * response.usage_metadata.candidates_token_count, response
+
+    def _finish(self, outcome, latency, response):
+        self.stats.end(latency, outcome, response)
+        if outcome == "rate_limited":
+            raise MockRateLimitError("429 RESOURCE_EXHAUSTED: mock quota exceeded")
+        if outcome == "error":
+            raise MockServerError("500 Internal error (mock)")
+        return response
+
+    def for_api_key(self, api_key):
+        """This model sending its requests with `api_key` (see key_pool.KeyPool.bind)."""
+        bound = copy.copy(self)
+        bound.api_key = api_key
+        return bound
+
+    async def generate_content_async(self, prompt, **kwargs):
+        self.stats.begin(self.kind, self.api_key)
+        outcome, latency, response = self._plan(str(prompt))
+        try:
+            await asyncio.sleep(latency)
+        except BaseException:
+            self.stats.end(latency, "cancelled")
+            raise
+        return self._finish(outcome, latency, response)
+
+    def generate_content(self, prompt, **kwargs):
+        self.stats.begin(self.kind, self.api_key)
+        outcome, latency, response = self._plan(str(prompt))
+        time.sleep(latency)
+        return self._finish(outcome, latency, response)
+
+    async def count_tokens_async(self, contents, **kwargs):
+        # No generation, so a small fraction of a call's latency, and not counted in stats
+        await asyncio.sleep(self._sample_latency(self._rng) * self.latency_scale * _REJECT_LATENCY_FRACTION)
+        return MockCountTokensResponse(_tokens(str(contents)))
+
+
+def install_mock_models(pipeline_module=None, latency=None, rate_limit_rate=None, error_rate=None, malformed_rate=None,
+                        seconds_per_output_token=None, key_rpm=None, seed=None, stats=None):
+    """
+    Replace the pipeline's models with MockModels.
+
+    Each mock keeps the name, generation config and system instruction of the model it
+    replaces, so response-cache keys stay distinct per model. Options left as None take
+    the PRAISE_MOCK_* environment settings. The mocks share a fake per-key quota. Cascade (fast_*) models are faster and
+    give invalid answers at PRAISE_MOCK_FAST_* rates.
+
+    Returns:
+        tuple: (MockStats shared by the mocks, dict of the replaced models for restore_models)
+    """
+    if pipeline_module is None:
+        import pipeline as pipeline_module
+    stats = stats or MockStats()
+    quota = MockQuota(MOCK_KEY_RPM if key_rpm is None else key_rpm)
+    originals = {}
+    for position, (name, kind) in enumerate(MODEL_KINDS.items()):
+        original = getattr(pipeline_module, name, None)
+        if original is None:
+            continue
+        originals[name] = original
+        fast = name.startswith("fast_")
+        setattr(pipeline_module, name, MockModel(
+            kind,
+            model_name=getattr(original, "model_name", "models/gemini-2.0-flash"),
+            generation_config=getattr(original, "_generation_config", None),
+            system_instruction=getattr(original, "_system_instruction", None),
+            latency=MOCK_LATENCY if latency is None else latency,
+            rate_limit_rate=MOCK_RATE_LIMIT_RATE if rate_limit_rate is None else rate_limit_rate,
+            error_rate=MOCK_ERROR_RATE if error_rate is None else error_rate,
+            malformed_rate=MOCK_MALFORMED_RATE if malformed_rate is None else malformed_rate,
+            seconds_per_output_token=MOCK_SECONDS_PER_OUTPUT_TOKEN if seconds_per_output_token is None else seconds_per_output_token,
+            latency_scale=MOCK_FAST_LATENCY_SCALE if fast else 1.0,
+            invalid_rate=MOCK_FAST_INVALID_RATE if fast else 0.0,
+            quota=quota,
+            seed=None if seed is None else seed + position,
+            stats=stats,
+        ))
+    return stats, originals
+
+
+def restore_models(pipeline_module, originals):
+    """Put back the models replaced by install_mock_models."""
+    for name, model in originals.items():
+        setattr(pipeline_module, name, model)
@@ -38,6 +38,29 @@ generation_config_extraction = {
   "response_mime_type": "application/json",
 }
 
+match_result_schema = content.Schema(
+    type = content.Type.ARRAY,
+    items = content.Schema(
+        type = content.Type.OBJECT,
+        required = ["attribute", "value", "status", "evidence"],
+        properties = {
+            "attribute": content.Schema(
+                type = content.Type.STRING, 
+            ),
+            "value": content.Schema(
+                type = content.Type.STRING,
+            ),
+            "status": content.Schema(
+                type = content.Type.STRING,
+            ),
+            "evidence": content.Schema(
+                type = content.Type.STRING,
+                nullable = True, # the prompts ask for null when the attribute is missing
+            ),
+        },
+    ),
+)
+
 generation_config_matching = {
   "temperature": 1,
   "top_p": 0.95,
@@ -50,24 +73,35 @@ generation_config_matching = {
         "reasoning": content.Schema(
             type = content.Type.STRING,
         ),
-        "result": content.Schema(
+        "result": match_result_schema,
+    },
+  ),
+  "response_mime_type": "application/json",
+}
+
+# Matching for several reviews in one call, results keyed by review_index
+generation_config_batch_matching = {
+  "temperature": 1,
+  "top_p": 0.95,
+  "top_k": 40,
+  "max_output_tokens": 8192,
+  "response_schema": content.Schema(
+    type = content.Type.OBJECT,
+    required = ["reasoning", "reviews"],
+    properties = {
+        "reasoning": content.Schema(
+            type = content.Type.STRING,
+        ),
+        "reviews": content.Schema(
             type = content.Type.ARRAY,
             items = content.Schema(
                 type = content.Type.OBJECT,
-                required = ["attribute", "value", "status", "evidence"],
+                required = ["review_index", "result"],
                 properties = {
-                    "attribute": content.Schema(
-                        type = content.Type.STRING, 
-                    ),
-                    "value": content.Schema(
-                        type = content.Type.STRING,
-                    ),
-                    "status": content.Schema(
-                        type = content.Type.STRING,
-                    ),
-                    "evidence": content.Schema(
-                        type = content.Type.STRING,
+                    "review_index": content.Schema(
+                        type = content.Type.INTEGER,
                     ),
+                    "result": match_result_schema,
                 },
             ),
         ),
@@ -76,6 +110,55 @@ generation_config_matching = {
   "response_mime_type": "application/json",
 }
 
+# Lean variants: the same answers without the reasoning fields, which the pipeline
+# discards anyway and which make up most of the output tokens
+extracted_attributes_schema = generation_config_extraction["response_schema"].properties["extracted_attributes"]
+
+generation_config_extraction_lean = {
+  "temperature": 1,
+  "top_p": 0.95,
+  "top_k": 40,
+  "max_output_tokens": 8192,
+  "response_schema": content.Schema(
+    type = content.Type.OBJECT,
+    required = ["extracted_attributes"],
+    properties = {
+        "extracted_attributes": extracted_attributes_schema,
+    },
+  ),
+  "response_mime_type": "application/json",
+}
+
+generation_config_matching_lean = {
+  "temperature": 1,
+  "top_p": 0.95,
+  "top_k": 40,
+  "max_output_tokens": 8192,
+  "response_schema": content.Schema(
+    type = content.Type.OBJECT,
+    required = ["result"],
+    properties = {
+        "result": match_result_schema,
+    },
+  ),
+  "response_mime_type": "application/json",
+}
+
+generation_config_batch_matching_lean = {
+  "temperature": 1,
+  "top_p": 0.95,
+  "top_k": 40,
+  "max_output_tokens": 8192,
+  "response_schema": content.Schema(
+    type = content.Type.OBJECT,
+    required = ["reviews"],
+    properties = {
+        "reviews": generation_config_batch_matching["response_schema"].properties["reviews"],
+    },
+  ),
+  "response_mime_type": "application/json",
+}
+
 generation_config_grouping = {
   "temperature": 0.4,
   "top_p": 0.95,
@@ -1,306 +1,593 @@
-from model_config import (
-    generation_config_extraction,
-    generation_config_matching,
-    generation_config_grouping,
-    generation_config_heartbeat
-)
-import google.generativeai as genai
+import functools
 import json
-import pandas as pd
-from concurrent.futures import ThreadPoolExecutor
-from prompts import (
-    system_prompt_extract,
-    system_prompt_match,
-    grouping_prompt
-)
-
-# Initialize models
-extraction_model = genai.GenerativeModel(
-    model_name = "gemini-2.0-flash",
-    generation_config = generation_config_extraction,
-    system_instruction = system_prompt_extract
-)
-
-matching_model = genai.GenerativeModel(
-    model_name = "gemini-2.0-flash",
-    generation_config = generation_config_matching,
-    system_instruction = system_prompt_match
-)
-
-grouping_model = genai.GenerativeModel(
-    model_name = "gemini-2.0-flash",
-    generation_config = generation_config_grouping,
-    system_instruction = grouping_prompt
-)
-
-test_model = genai.GenerativeModel(
-    model_name = "gemini-1.5-flash-8b",
-    generation_config=generation_config_heartbeat
-)
+import os
+import re
+import sys
+import threading
+from cache import cache_key, response_cache
+from key_pool import KeyBoundModel
+from category_memory import normalize_attribute
+from records import MATCH_STATUSES, records_from_rows
+import asyncio
+from prompts import grouping_prompt
+
+# Models are built on first use, so importing this module (and the API server) does not
+# load google.generativeai; PRAISE_LAZY_INIT=0 builds them all at import instead
+LAZY_INIT = os.environ.get("PRAISE_LAZY_INIT", "1") != "0"
+
+# Model attribute -> (model name, generation config in model_config, system prompt in prompts)
+MODEL_SPECS = {
+    "extraction_model": ("gemini-2.0-flash", "generation_config_extraction", "system_prompt_extract"),
+    "matching_model": ("gemini-2.0-flash", "generation_config_matching", "system_prompt_match"),
+    "batch_matching_model": ("gemini-2.0-flash", "generation_config_batch_matching", "system_prompt_match_batch"),
+    # Lean variants answer without the reasoning fields (see model_config)
+    "lean_extraction_model": ("gemini-2.0-flash", "generation_config_extraction_lean", "system_prompt_extract_lean"),
+    "lean_matching_model": ("gemini-2.0-flash", "generation_config_matching_lean", "system_prompt_match_lean"),
+    "lean_batch_matching_model": ("gemini-2.0-flash", "generation_config_batch_matching_lean", "system_prompt_match_batch_lean"),
+    "grouping_model": ("gemini-2.0-flash", "generation_config_grouping", "grouping_prompt"),
+    "test_model": ("gemini-1.5-flash-8b", "generation_config_heartbeat", None),
+}
+
+# Model cascade: extraction and matching calls go to CASCADE_MODEL first and are escalated
+# to the models above when the answer fails validation or the quality checks below
+# (e.g. "gemini-1.5-flash-8b"; empty turns the cascade off)
+CASCADE_MODEL = os.environ.get("PRAISE_CASCADE_MODEL", "")
+
+# Cascade twin attribute -> the model it stands in front of
+CASCADE_MODELS = {
+    f"fast_{name}": name for name in (
+        "extraction_model", "matching_model", "batch_matching_model",
+        "lean_extraction_model", "lean_matching_model", "lean_batch_matching_model",
+    )
+}
+
+# Local stand-in models (latency spec, e.g. "lognormal:0.8,0.5") for benchmarks and offline runs
+MOCK_GEMINI = os.environ.get("PRAISE_MOCK_GEMINI", "")
+
+_models_lock = threading.RLock()
+_mocks_installed = False
+
+def _build_model(name):
+    """Build the GenerativeModel of a MODEL_SPECS or CASCADE_MODELS attribute (None for a cascade twin when the cascade is off)."""
+    import google.generativeai as genai
+    import model_config
+    import prompts
+    if name in CASCADE_MODELS:
+        if not CASCADE_MODEL:
+            return None
+        model_name, config, prompt = MODEL_SPECS[CASCADE_MODELS[name]]
+        model_name = CASCADE_MODEL
+    else:
+        model_name, config, prompt = MODEL_SPECS[name]
+    generation_config = getattr(model_config, config)
+    system_instruction = getattr(prompts, prompt) if prompt else None
+    model = genai.GenerativeModel(
+        model_name = model_name,
+        generation_config = generation_config,
+        system_instruction = system_instruction
+    )
+    # How key_pool sends this model's requests with another API key
+    model.for_api_key = functools.partial(KeyBoundModel, model_name, generation_config, system_instruction)
+    return model
+
+def _install_mocks():
+    global _mocks_installed
+    _mocks_installed = True
+    from mock_gemini import install_mock_models
+    install_mock_models(sys.modules[__name__])
+
+def __getattr__(name):
+    """Build models on first access (module attributes set by install_mock_models or tests take precedence)."""
+    if name not in MODEL_SPECS and name not in CASCADE_MODELS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    with _models_lock:
+        if name not in globals():
+            if MOCK_GEMINI and not _mocks_installed:
+                _install_mocks() # reads every model through here, then replaces them
+            else:
+                globals()[name] = _build_model(name)
+        return globals()[name]
+
+if not LAZY_INIT:
+    for _name in (*MODEL_SPECS, *CASCADE_MODELS):
+        globals()[_name] = _build_model(_name)
+    if MOCK_GEMINI:
+        _install_mocks()
+
+def _async_pipeline():
+    import async_pipeline # imported lazily, async_pipeline builds on this module
+    return async_pipeline
+
+_loop = None
+_loop_lock = threading.Lock()
+
+def _background_loop():
+    """
+    The event loop the synchronous entry points run their coroutines on.
+
+    One loop on a daemon thread for the life of the process: genai's grpc.aio client is
+    tied to the loop it was first used on, so a fresh loop per call (asyncio.run) fails
+    with "Event loop is closed" from the second call on.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="pipeline-loop", daemon=True).start()
+        return _loop
+
+def _run(coroutine):
+    """Run `coroutine` on the background loop and wait for its result; works with or without a running loop in the caller."""
+    loop = _background_loop()
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is loop:
+        coroutine.close()
+        raise RuntimeError("Synchronous pipeline functions cannot be called from the pipeline loop; await async_pipeline instead")
+    return asyncio.run_coroutine_threadsafe(coroutine, loop).result()
 
 def check_heartbeat_status():
     """Check if API is responsive."""
-    try:
-        test_model.generate_content("test").text
-    except Exception as e:
-        return "heartbeat failed"
-    return "heartbeat success"
+    return _run(_async_pipeline().check_heartbeat_status())
 
-def extract_factual_product_details(review):
-    """Extract factual details from a product review."""
+def _is_json(text):
     try:
-        response = extraction_model.generate_content(f"Extract factual product details from the review: \n{review}")
-        return json.loads(response.text)
-    except Exception as e:
-        return {"error": str(e), "extracted_attributes": []}
+        json.loads(text)
+        return True
+    except ValueError:
+        return False
 
-def get_table_match(product_description, extracted_attributes):
-    """Match extracted attributes against the seller description."""
-    prompt = f"""
+def _has_answer_tags(text):
+    return '<answer>' in text and '</answer>' in text
+
+def cache_lookup(model, prompt, use_cache=True):
+    """Return (cache key, cached text or None) for a model call."""
+    key = cache_key(model, prompt)
+    if not use_cache:
+        return key, None
+    return key, response_cache.get(key)
+
+def cache_store(key, text, validate=None):
+    """Store a fresh response, skipping ones that fail `validate`."""
+    if validate is None or validate(text):
+        response_cache.set(key, text)
+
+def generate_text(model, prompt, use_cache=True, validate=None, stage="other"):
+    """Synchronous wrapper for async_pipeline.generate_text."""
+    return _run(_async_pipeline().generate_text(model, prompt, use_cache, validate, stage))
+
+def extraction_prompt(review):
+    return f"Extract factual product details from the review: \n{review}"
+
+def matching_prompt(product_description, extracted_attributes):
+    return f"""
 Seller Description:
 {product_description}
 
 Extracted Attributes:
 {json.dumps(extracted_attributes)}"""
+
+def batch_matching_prompt(product_description, batch):
+    reviews = [{"review_index": index, "attributes": attributes} for index, attributes in batch]
+    return f"""
+Seller Description:
+{product_description}
+
+Reviews:
+{json.dumps(reviews)}"""
+
+def grouping_request(attributes, existing_categories=None):
+    request = grouping_prompt + "\n\nattributes: " + str(attributes)
+    if existing_categories:
+        # Incremental grouping: steer new attributes into the categories already in use
+        request += "\n\nexisting categories (reuse one of these when it fits): " + ", ".join(sorted(existing_categories))
+    return request
+
+def parse_grouping_response(response_text):
+    """Parse the `attribute: category` lines inside <answer> tags of a grouping response."""
+    categories = {}
+    if '<answer>' in response_text and '</answer>' in response_text:
+        answer_part = response_text.split('<answer>', 1)[1].split('</answer>', 1)[0].strip()
+        lines = answer_part.split('\n')
+        for line in lines:
+            if ':' in line:
+                parts = line.split(':', 1) # Split only on the first colon
+                attribute = parts[0].strip()
+                category = parts[1].strip()
+                if attribute: # Ensure attribute is not empty
+                    categories[attribute] = category
+            else:
+                print(f"Warning: Skipping malformed line in grouping response: {line}")
+        if not categories:
+             print(f"Warning: Could not parse any categories from response: {response_text}")
+             # Optionally, return an error or default categories here
+             # return {"error": "Failed to parse categories from LLM response"}
+        return categories
+    else:
+        print(f"Error: Could not find <answer> tags in grouping response: {response_text}")
+        return {"error": "Invalid format from grouping model"}
+
+# Attributes per grouping call in sharded categorization; keeps each answer well
+# below the grouping model's output limit
+GROUPING_SHARD_SIZE = 200
+
+def plan_grouping_shards(attributes, shard_size=GROUPING_SHARD_SIZE):
+    """Split attributes into consecutive chunks of at most `shard_size` for concurrent grouping."""
+    shard_size = max(1, shard_size)
+    return [attributes[start:start + shard_size] for start in range(0, len(attributes), shard_size)]
+
+def match_requested_attributes(categories, attributes):
+    """
+    Key a parsed grouping answer by the attributes that were asked for.
+
+    Answer lines that only differ from a requested attribute in case or spacing are
+    accepted for it; lines for attributes that were not asked for are dropped.
+    """
+    answers = {normalize_attribute(attr): category for attr, category in categories.items()}
+    return {
+        attr: categories[attr] if attr in categories else answers[normalize_attribute(attr)]
+        for attr in attributes
+        if attr in categories or normalize_attribute(attr) in answers
+    }
+
+def _label_key(label):
+    key = normalize_attribute(label)
+    # Treat simple plurals as the same label ("physical attributes" / "physical attribute")
+    return key[:-1] if key.endswith("s") and not key.endswith("ss") and len(key) > 3 else key
+
+def reconcile_category_labels(categories, preferred_labels=()):
+    """
+    Merge category labels that different grouping calls spelled differently.
+
+    Labels that match up to case, spacing, punctuation or a plural 's' are mapped to a
+    single spelling: one of `preferred_labels` (e.g. categories already in use) if it
+    matches, otherwise the spelling used for the most attributes.
+
+    Args:
+        categories (dict): attribute -> category label
+        preferred_labels (iterable): Labels to keep as they are
+
+    Returns:
+        dict: attribute -> reconciled category label
+    """
+    counts = {}
+    for label in categories.values():
+        counts[label] = counts.get(label, 0) + 1
+    canonical = {}
+    for label in preferred_labels:
+        canonical.setdefault(_label_key(label), label)
+    for label, _ in sorted(counts.items(), key=lambda item: (-item[1], item[0])):
+        canonical.setdefault(_label_key(label), label)
+    return {attr: canonical[_label_key(label)] for attr, label in categories.items()}
+
+# Batched matching budgets. Tokens are estimated at ~4 characters each; output
+# is budgeted per attribute since every attribute produces a result row plus reasoning.
+MATCH_BATCH_MAX_REVIEWS = 25
+MATCH_BATCH_INPUT_TOKENS = 6000
+MATCH_BATCH_OUTPUT_TOKENS = 6000
+MATCH_OUTPUT_TOKENS_PER_ATTRIBUTE = 100
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+def plan_match_batches(extracted_attributes_list, max_reviews=MATCH_BATCH_MAX_REVIEWS,
+                       input_token_budget=MATCH_BATCH_INPUT_TOKENS, output_token_budget=MATCH_BATCH_OUTPUT_TOKENS):
+    """
+    Pack reviews into batches for batched matching, sizing each batch to the token budget.
+
+    Reviews without attributes are left out, since there is nothing to match.
+
+    Args:
+        extracted_attributes_list (list): List of extracted attributes from reviews
+        max_reviews (int): Upper bound on reviews per batch
+        input_token_budget (int): Estimated attribute tokens allowed per request
+        output_token_budget (int): Estimated output tokens allowed per request
+
+    Returns:
+        list: Batches, each a list of (review_index, attributes) pairs
+    """
+    batches = []
+    batch, input_tokens, output_tokens = [], 0, 0
+    for index, attributes in enumerate(extracted_attributes_list):
+        if not attributes:
+            continue
+        review_input = estimate_tokens(json.dumps(attributes))
+        review_output = len(attributes) * MATCH_OUTPUT_TOKENS_PER_ATTRIBUTE
+        if batch and (len(batch) >= max_reviews
+                      or input_tokens + review_input > input_token_budget
+                      or output_tokens + review_output > output_token_budget):
+            batches.append(batch)
+            batch, input_tokens, output_tokens = [], 0, 0
+        batch.append((index, attributes))
+        input_tokens += review_input
+        output_tokens += review_output
+    if batch:
+        batches.append(batch)
+    return batches
+
+def parse_batch_matching_response(response_text, batch):
+    """
+    Split a batched matching response back into per-review matching responses.
+
+    Returns:
+        dict: review_index -> {"result": [...]}, only for indices present in both batch and response
+    """
+    data = json.loads(response_text)
+    expected = {index for index, _ in batch}
+    matchings = {}
+    for entry in data.get("reviews", []):
+        index = entry.get("review_index") if isinstance(entry, dict) else None
+        if index in expected:
+            matchings.setdefault(index, {"result": []})["result"].extend(entry.get("result") or [])
+    return matchings
+
+# Quality checks deciding whether a cascade answer is kept. Each returns the problem
+# found ("json", "schema", "status", "evidence") or None for an acceptable answer.
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+def _normalize_text(text):
+    return _NON_WORD.sub(" ", str(text).lower()).strip()
+
+def extraction_problem(response_text):
+    """Problem with an extraction answer: not JSON, or attributes that are not non-empty attribute/value pairs."""
     try:
-        response = matching_model.generate_content(prompt)
-        return json.loads(response.text)
-    except Exception as e:
-        return {"error": str(e), "result": []}
+        data = json.loads(response_text)
+    except ValueError:
+        return "json"
+    rows = data.get("extracted_attributes") if isinstance(data, dict) else None
+    if not isinstance(rows, list):
+        return "schema"
+    for row in rows:
+        if not isinstance(row, dict) or not str(row.get("attribute") or "").strip() or row.get("value") is None:
+            return "schema"
+    return None
 
-from prompts import grouping_prompt # Import the prompt
+def _matching_rows_problem(rows, product_description):
+    if not isinstance(rows, list):
+        return "schema"
+    description = _normalize_text(product_description)
+    for row in rows:
+        if not isinstance(row, dict) or not row.get("attribute"):
+            return "schema"
+        if row.get("status") not in MATCH_STATUSES:
+            return "status"
+        # Evidence has to be quoted from the description, except for missing attributes
+        evidence = row.get("evidence")
+        if row["status"] != "missing" and (not evidence or _normalize_text(evidence) not in description):
+            return "evidence"
+    return None
 
-def group_attributes(attributes):
-    """Group attributes into logical categories."""
+def matching_problem(response_text, product_description):
+    """Problem with a matching answer: not JSON, unknown status values, or evidence not found in the description."""
     try:
-        response_text = grouping_model.generate_content(grouping_prompt + "\n\nattributes: " + str(attributes)).text
+        data = json.loads(response_text)
+    except ValueError:
+        return "json"
+    if not isinstance(data, dict):
+        return "schema"
+    return _matching_rows_problem(data.get("result"), product_description)
 
-        categories = {}
-        if '<answer>' in response_text and '</answer>' in response_text:
-            answer_part = response_text.split('<answer>', 1)[1].split('</answer>', 1)[0].strip()
-            lines = answer_part.split('\n')
-            for line in lines:
-                if ':' in line:
-                    parts = line.split(':', 1) # Split only on the first colon
-                    attribute = parts[0].strip()
-                    category = parts[1].strip()
-                    if attribute: # Ensure attribute is not empty
-                        categories[attribute] = category
-                else:
-                    print(f"Warning: Skipping malformed line in grouping response: {line}")
-            if not categories:
-                 print(f"Warning: Could not parse any categories from response: {response_text}")
-                 # Optionally, return an error or default categories here
-                 # return {"error": "Failed to parse categories from LLM response"}
-            return categories
-        else:
-            print(f"Error: Could not find <answer> tags in grouping response: {response_text}")
-            return {"error": "Invalid format from grouping model"}
-
-    except Exception as e:
-        print(f"Error during attribute grouping: {str(e)}")
-        return {"error": f"Failed during grouping: {str(e)}"}
-
-def extract_review_attributes(reviews, num_workers = 15) -> list:
+def batch_matching_problem(response_text, product_description, batch):
+    """Problem with a batched matching answer, including reviews of the batch it left out."""
+    try:
+        matchings = parse_batch_matching_response(response_text, batch)
+    except (ValueError, AttributeError, TypeError):
+        return "json"
+    if len(matchings) < len(batch):
+        return "schema"
+    for resp in matchings.values():
+        problem = _matching_rows_problem(resp["result"], product_description)
+        if problem:
+            return problem
+    return None
+
+class CascadeStats:
+    """Per-stage counts of cascade answers kept from the fast model and escalations by problem."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages = {}
+
+    def record(self, stage, problem=None):
+        """Count a cascade call; `problem` is None when the fast model's answer was kept."""
+        with self._lock:
+            counts = self.stages.setdefault(stage, {"fast": 0, "escalated": 0, "problems": {}})
+            if problem is None:
+                counts["fast"] += 1
+            else:
+                counts["escalated"] += 1
+                counts["problems"][problem] = counts["problems"].get(problem, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            fast = sum(counts["fast"] for counts in self.stages.values())
+            escalated = sum(counts["escalated"] for counts in self.stages.values())
+            return {
+                "fast_model": CASCADE_MODEL or None,
+                "fast": fast,
+                "escalated": escalated,
+                "escalation_rate": escalated / (fast + escalated) if fast + escalated else 0.0,
+                "stages": {
+                    stage: {**counts, "problems": dict(counts["problems"])} for stage, counts in self.stages.items()
+                },
+            }
+
+cascade_stats = CascadeStats()
+
+# Synchronous entry points. They run the async_pipeline coroutines on the background loop, so model calls
+# share the response cache and the adaptive concurrency limiter with the API server.
+
+def extract_factual_product_details(review, use_cache=True, lean=False):
+    """Extract factual details from a product review."""
+    return _run(_async_pipeline().extract_factual_product_details(review, use_cache, lean))
+
+def get_table_match(product_description, extracted_attributes, use_cache=True, lean=False):
+    """Match extracted attributes against the seller description."""
+    return _run(_async_pipeline().get_table_match(product_description, extracted_attributes, use_cache, lean))
+
+def get_batch_table_match(product_description, batch, use_cache=True, lean=False):
+    """Match the attributes of several reviews in one call, see async_pipeline.get_batch_table_match."""
+    return _run(_async_pipeline().get_batch_table_match(product_description, batch, use_cache, lean))
+
+def group_attributes(attributes, use_cache=True):
+    """Group attributes into logical categories."""
+    return _run(_async_pipeline().group_attributes(attributes, use_cache))
+
+def extract_review_attributes(reviews, num_workers = None, use_cache = True, prefilter = False, dedup = False, lean = False) -> list:
     """
     Step 1: Extract factual details from multiple product reviews.
     
     Args:
         reviews (list[str]): List of product reviews
+        num_workers (int): Maximum number of model calls in flight, None to leave it to the adaptive limiter
+        use_cache (bool): Whether to serve repeated calls from the response cache
+        prefilter (bool): Skip reviews without factual content ("Great!", "5 stars") without a model call
+        dedup (bool): Extract near-duplicate reviews once and copy the result to every copy
+        lean (bool): Use the lean schema, which answers without chain_of_thought and discarded_opinions
         
     Returns:
         list: List of extracted attributes from each review
     """
-    print("Starting attribute extraction...")
-    with ThreadPoolExecutor(max_workers=num_workers) as executor:
-        responses = list(executor.map(lambda review: extract_factual_product_details(review), reviews))
-    extracted_attributes = [resp.get('extracted_attributes', []) for resp in responses]
-    print(f"Extracted attributes from {len(reviews)} reviews")
-    return extracted_attributes
-
-def match_with_description(seller_desc, extracted_attributes_list, num_workers = 15):
+    return _run(_async_pipeline().extract_review_attributes(reviews, num_workers, use_cache, prefilter, dedup, lean=lean))
+
+def match_with_description(seller_desc, extracted_attributes_list, num_workers = None, use_cache = True, batched = False, lean = False):
     """
     Step 2: Match extracted attributes against seller description.
     
     Args:
         seller_desc (str): The seller's product description
         extracted_attributes_list (list): List of extracted attributes from reviews
+        num_workers (int): Maximum number of model calls in flight, None to leave it to the adaptive limiter
+        use_cache (bool): Whether to serve repeated calls from the response cache
+        batched (bool): Match several reviews per call, sending the seller description once per batch
+        lean (bool): Use the lean schema, which answers without reasoning
         
     Returns:
-        list: Dataframes containing matched attributes
+        list: Per-review lists of MatchRecord
     """
-    print("Starting attribute matching...")
-    with ThreadPoolExecutor(max_workers=num_workers) as executor:
-        review_matchings = list(executor.map(
-            lambda extracted_attribute: get_table_match(seller_desc, extracted_attribute), 
-            extracted_attributes_list
-        ))
-    print("Attribute matching completed")
-    
-    # Create dataframes from matching results, ensuring one DF per review
-    all_dataframes = []
-    for resp in review_matchings:
-        # Create DataFrame from 'result' list, or an empty list if 'result' is missing/empty
-        # This ensures we have a DataFrame (potentially empty) for each review
-        matched_data = resp.get('result', [])
-        all_dataframes.append(pd.DataFrame(matched_data))
+    return _run(_async_pipeline().match_with_description(seller_desc, extracted_attributes_list, num_workers, use_cache, batched, lean=lean))
 
-    return all_dataframes
+def merge_batch_matchings(batch_matchings, num_reviews):
+    """Flatten per-batch {review_index: response} dicts into one response per review, in review order."""
+    review_matchings = [{"result": []} for _ in range(num_reviews)]
+    for matchings in batch_matchings:
+        for index, resp in matchings.items():
+            review_matchings[index] = resp
+    return review_matchings
 
-def categorize_attributes(all_dataframes):
+def collect_unique_attributes(all_records):
+    """Collect the sorted unique attributes of all reviews for grouping."""
+    unique_attributes = {
+        str(record.attribute)
+        for records in all_records
+        for record in records_from_rows(records)
+        if record.attribute is not None
+    }
+    return sorted(unique_attributes) # Sorted so the grouping prompt is stable for the cache
+
+def categorize_attributes(all_records, use_cache = True, known_categories=None, sharded=False):
     """
     Step 3: Group attributes into logical categories.
     
     Args:
-        all_dataframes (list): List of dataframes with matched attributes
+        all_records (list): Per-review lists of matched attribute records
+        use_cache (bool): Whether to serve repeated calls from the response cache
+        known_categories (dict): Attribute -> category map from an earlier run; only attributes not in it are grouped
+        sharded (bool): Group chunks of GROUPING_SHARD_SIZE attributes concurrently
         
     Returns:
         tuple: (categories dict, list of all unique attributes)
     """
-    # Collect all attributes for grouping, handling empty/malformed DFs
-    all_attributes = []
-    for df in all_dataframes:
-        if not df.empty and 'attribute' in df.columns: # Check if DF is valid
-             # Ensure attributes are strings and handle potential NaN/None
-            valid_attributes = df['attribute'].dropna().astype(str).unique()
-            all_attributes.extend(valid_attributes)
-        else:
-            print(f"Warning: Skipping empty or malformed DataFrame in categorize_attributes.")
-
-    all_attributes = list(set(all_attributes)) # Get unique attributes
-
-    if not all_attributes:
-        print("No attributes found in reviews")
-        return {}, []
-    
-    print("Starting attribute grouping...")
-    # Convert list of attributes to a string
-    attribute_str = ", ".join(all_attributes)
-    
-    # Attempt grouping with retries
-    max_attempts = 5
-    categories = {}
-    for attempt in range(max_attempts):
-        try:
-            categories = group_attributes(attribute_str)
-            if isinstance(categories, dict) and not categories.get('error'):
-                break
-            print(f"Retry {attempt+1}/{max_attempts} for grouping")
-        except Exception as e:
-            print(f"Grouping attempt {attempt+1} failed: {str(e)}")
-        
-        if attempt == max_attempts - 1:
-            print("Failed to group attributes after multiple attempts")
-            categories = {attr: "uncategorized" for attr in all_attributes}
-    
-    return categories, all_attributes
+    return _run(_async_pipeline().categorize_attributes(all_records, use_cache, known_categories, sharded))
 
-def organize_results(all_dataframes, categories):
+def organize_results(all_records, categories):
     """
     Step 4: Organize results by matching status and category.
     
     Args:
-        all_dataframes (list): List of dataframes with matched attributes
+        all_records (list): Per-review lists of MatchRecord (lists of row dicts or DataFrames are also accepted)
         categories (dict): Mapping from attribute to category
         
     Returns:
         dict: Organized results by status and category
     """
-    # Separate attributes by matching status
-    missing = []
-    matching = []
-    contradictory = []
-    partially_matching = []
-
-    # --- Robust DataFrame Processing ---
-    for i, df in enumerate(all_dataframes):
-        if isinstance(df, pd.DataFrame) and not df.empty:
-            # Check if 'status' column exists
-            if 'status' in df.columns:
-                try:
-                    # Filter and extend safely
-                    missing.extend(df[df['status'] == 'missing'].to_dict('records'))
-                    matching.extend(df[df['status'] == 'matching'].to_dict('records'))
-                    contradictory.extend(df[df['status'] == 'contradictory'].to_dict('records'))
-                    partially_matching.extend(df[df['status'] == 'partially_matching'].to_dict('records'))
-                except Exception as e:
-                    print(f"Warning: Error processing DataFrame #{i} in organize_results: {str(e)}")
-            else:
-                 print(f"Warning: DataFrame #{i} missing 'status' column in organize_results.")
-        # else: # Optional: Log if a non-dataframe or empty dataframe is encountered
-        #    print(f"Warning: Skipping invalid or empty DataFrame #{i} in organize_results.")
-
-    # --- Robust Category Application ---
-    combined_items = missing + matching + contradictory + partially_matching
-    for item in combined_items:
-        # Check if item is a dict and has 'attribute' key
-        if isinstance(item, dict) and 'attribute' in item:
-            attr = item['attribute']
-            # Check if categories is a dict and attr exists
-            if isinstance(categories, dict) and attr in categories:
-                 item['category'] = categories[attr]
+    if not isinstance(categories, dict):
+        print("Warning: 'categories' is not a dictionary in organize_results.")
+        categories = {}
+
+    result = {status: {} for status in MATCH_STATUSES}
+    uncategorized = set()
+
+    # Single pass: bucket every row by status, then by category, in review order
+    for records in all_records:
+        for record in records_from_rows(records):
+            status_group = result.get(record.status)
+            if status_group is None:
+                continue # Unknown or missing status
+            if record.attribute is None:
+                print(f"Warning: Skipping invalid item in category application: {record.to_dict()}")
+                category = "invalid_item"
             else:
-                 item['category'] = "uncategorized"
-                 if not isinstance(categories, dict):
-                      print(f"Warning: 'categories' is not a dictionary in organize_results.")
-                 elif attr not in categories:
-                      print(f"Warning: Attribute '{attr}' not found in categories dict.")
-        else:
-             print(f"Warning: Skipping invalid item in category application: {item}")
-             # Decide how to handle invalid items, e.g., assign default category or skip
-             if isinstance(item, dict): item['category'] = "invalid_item"
-
-
-    # Group by categories
-    result = {
-        "missing": {},
-        "matching": {},
-        "contradictory": {},
-        "partially_matching": {}
-    }
-    
-    # Organize by category
-    for status, items in [("missing", missing), ("matching", matching), 
-                        ("contradictory", contradictory), ("partially_matching", partially_matching)]:
-        category_items = {}
-        for item in items:
-            category = item['category']
-            if category not in category_items:
-                category_items[category] = []
-            category_items[category].append({k: v for k, v in item.items() if k != 'category'})
-        result[status] = category_items
-    
+                category = categories.get(record.attribute)
+                if category is None:
+                    category = "uncategorized"
+                    uncategorized.add(record.attribute)
+            category_items = status_group.get(category)
+            if category_items is None:
+                category_items = status_group[category] = []
+            category_items.append(record.to_dict())
+
+    if uncategorized:
+        print(f"Warning: {len(uncategorized)} attributes not found in categories dict.")
+
     return result
 
-def complete_pipeline(seller_desc, reviews):
+def merge_organized_results(results, new_results):
+    """
+    Append the organized rows of newly added reviews to earlier organize_results output.
+
+    Gives the same result as organizing all reviews at once with the same categories,
+    since rows are kept in review order within each category.
+
+    Args:
+        results (dict): Organized results of the earlier reviews, updated in place
+        new_results (dict): Organized results of the new reviews
+
+    Returns:
+        dict: The merged results
+    """
+    for status, status_group in new_results.items():
+        merged_group = results.setdefault(status, {})
+        for category, items in status_group.items():
+            merged_group.setdefault(category, []).extend(items)
+    return results
+
+def complete_pipeline(seller_desc, reviews, use_cache=True, batched_matching=False, sharded_grouping=False, canonical_attributes=False,
+                      prefilter_reviews=False, dedup_reviews=False, pipelined=False, lean_schema=False):
     """
     Complete product review analysis pipeline that calls each step in sequence.
     
     Args:
         seller_desc (str): The seller's product description
         reviews (list[str]): List of product reviews
+        use_cache (bool): Whether to serve repeated calls from the response cache
+        batched_matching (bool): Match several reviews per call in step 2
+        sharded_grouping (bool): Group attributes in concurrent chunks in step 3
+        canonical_attributes (bool): Merge near-duplicate attribute names after step 1
+        prefilter_reviews (bool): Skip reviews without factual content before step 1
+        dedup_reviews (bool): Run steps 1 and 2 once per cluster of near-duplicate reviews
+        pipelined (bool): Match each review as soon as it is extracted instead of after all extractions;
+            with canonical_attributes, canonical names then depend on the order reviews finish in
+        lean_schema (bool): Extract and match without the reasoning fields in the responses
         
     Returns:
         dict: Categorized product attributes with matching status
     """
-    # Step 1: Extract factual details from reviews
-    extracted_attributes = extract_review_attributes(reviews)
-    
-    # Step 2: Match extracted attributes with seller description
-    all_dataframes = match_with_description(seller_desc, extracted_attributes)
-    
-    if not all_dataframes:
-        print("No valid matching results found")
-        return {}
-    
-    # Step 3: Group attributes by category
-    categories, all_attributes = categorize_attributes(all_dataframes)
-    
-    if not all_attributes:
-        return {}
-    
-    # Step 4: Organize results by category
-    result = organize_results(all_dataframes, categories)
-    
-    print("Pipeline completed successfully")
-    return result
+    return _run(_async_pipeline().complete_pipeline(
+        seller_desc, reviews, use_cache=use_cache, batched_matching=batched_matching, sharded_grouping=sharded_grouping,
+        canonical_attributes=canonical_attributes, prefilter_reviews=prefilter_reviews,
+        dedup_reviews=dedup_reviews, pipelined=pipelined, lean_schema=lean_schema
+    ))
@@ -54,7 +54,7 @@ Output:
 }
 """
 
-system_prompt_match = """You are a product information comparison expert. Your task is to compare factual product details extracted from customer reviews against the seller's official product description.
+_match_rules = """You are a product information comparison expert. Your task is to compare factual product details extracted from customer reviews against the seller's official product description.
 
 Follow this systematic process:
 
@@ -75,7 +75,9 @@ Follow this systematic process:
    - Remove attributes containing user specific information (e.g. particular size of a product for the user, weight of the user, comparison, etc).
    - Remove attributes containing any opinions or subjective assessments.
 
-Think step by step about each attribute-value pair before deciding its category or discarding it. Return valid JSON with this format:
+Think step by step about each attribute-value pair before deciding its category or discarding it."""
+
+system_prompt_match = _match_rules + """ Return valid JSON with this format:
 
 {
     "reasoning": "<your step by step thinking about each attribute-value pair>",
@@ -119,6 +121,194 @@ Output:
 
 """
 
+# The batched prompt shares the rules, with its own output format and example in place
+# of the single-review ones
+system_prompt_match_batch = _match_rules + """
+
+BATCHED INPUT:
+You will receive the attributes of several reviews at once, each tagged with its "review_index". Compare every review's attributes against the same seller description, independently of the other reviews.
+Return valid JSON with one entry per review_index in the input, using this format:
+
+{
+    "reasoning": "<your step by step thinking, briefly, per review>",
+    "reviews": [
+        {
+            "review_index": <review_index from the input>,
+            "result": [
+                {
+                    "attribute": <attribute_name>,
+                    "evidence": <relevant_text_from_seller_description_or_null_if_missing>,
+                    "status": <"missing"|"contradictory"|"matching"|"partially_matching">,
+                    "value": <attribute_value>
+                }
+            ]
+        }
+    ]
+}
+
+Include a review with an empty "result" list if all of its attributes were removed.
+
+---
+
+Example:
+
+Seller Description: "A great pair of pants. It's overall very lightweight, and the fabric is soft."
+Reviews:
+[{"review_index": 0, "attributes": [{"attribute": "size", "value": "10"}, {"attribute": "texture", "value": "soft"}]}, {"review_index": 1, "attributes": [{"attribute": "fit", "value": "loose"}]}]
+
+Output:
+{
+    "reasoning": "Review 0: the size depends on the user, so I discard it; the seller description says the fabric is soft. Review 1: the seller description does not mention the fit.",
+    "reviews": [
+        {
+            "review_index": 0,
+            "result": [
+                {"attribute": "texture", "evidence": "the fabric is soft", "status": "matching", "value": "soft"}
+            ]
+        },
+        {
+            "review_index": 1,
+            "result": [
+                {"attribute": "fit", "evidence": null, "status": "missing", "value": "loose"}
+            ]
+        }
+    ]
+}
+
+---
+
+"""
+
+# Lean variants for the lean response schemas: the same task, answered without
+# writing out the reasoning
+
+system_prompt_extract_lean = """You are a product information extraction expert. Your task is to extract only factual details from product reviews while discarding subjective opinions.
+
+For EACH piece of information, decide silently whether it is factual (objective, measurable properties such as dimensions, materials, features) or an opinion (likes/dislikes, judgments). Keep only the facts, as clean attribute-value pairs:
+- Standardize similar attributes (e.g., "weight"/"heaviness")
+- Focus on product-specific attributes, not the user or their experience
+
+Do not explain your decisions. Return valid JSON with this format:
+{
+    "extracted_attributes": [
+        {"attribute": <attribute>, "value": <value>}
+    ]
+}
+
+---
+
+For example:
+
+Review: The speaker is very loud, but a bit too loud for my ears. It is also lightweight and portable.
+Output:
+{
+    "extracted_attributes": [
+        {"attribute": "volume", "value": "loud"},
+        {"attribute": "weight", "value": "lightweight"},
+        {"attribute": "portability", "value": "portable"}
+    ]
+}
+
+Review: The fabric is made of satin and very soft. It can also be washed in a machine. I like it a lot.
+Output:
+{
+    "extracted_attributes": [
+        {"attribute": "fabric", "value": "satin"},
+        {"attribute": "texture", "value": "soft"},
+        {"attribute": "washing", "value": "machine washable"}
+    ]
+}
+"""
+
+_match_rules_lean = """You are a product information comparison expert. Your task is to compare factual product details extracted from customer reviews against the seller's official product description.
+
+For each attribute-value pair, search the seller's description for it and classify it as:
+- "missing": Information present in attribute but absent from seller description
+- "contradictory": Information that directly conflicts with seller description
+- "matching": Information that perfectly aligns with seller description
+- "partially_matching": Information that somewhat aligns with seller description
+
+For matching, contradictory, or partially matching information, cite the specific text from the seller's description as evidence.
+Remove attributes containing user specific information (e.g. particular size of a product for the user, weight of the user, comparison, etc) or opinions.
+
+Do not explain your decisions."""
+
+system_prompt_match_lean = _match_rules_lean + """ Return valid JSON with this format:
+
+{
+    "result": [
+        {
+            "attribute": <attribute_name>,
+            "evidence": <relevant_text_from_seller_description_or_null_if_missing>,
+            "status": <"missing"|"contradictory"|"matching"|"partially_matching">,
+            "value": <attribute_value>
+        }
+    ]
+}
+
+---
+
+Example:
+
+Seller Description: "A great pair of pants. It's overall very lightweight, and the fabric is soft."
+Review Attributes: [{"attribute": "size", "value": "10"}, {"attribute": "size", "value": "11"}, {"attribute": "texture", "value": "soft"}, {"attribute": "fit", "value": "loose"}]
+
+Output:
+{
+    "result": [
+        {"attribute": "texture", "evidence": "the fabric is soft", "status": "matching", "value": "soft"},
+        {"attribute": "fit", "evidence": null, "status": "missing", "value": "loose"}
+    ]
+}
+
+---
+
+"""
+
+system_prompt_match_batch_lean = _match_rules_lean + """
+
+BATCHED INPUT:
+You will receive the attributes of several reviews at once, each tagged with its "review_index". Compare every review's attributes against the same seller description, independently of the other reviews.
+Return valid JSON with one entry per review_index in the input, using this format:
+
+{
+    "reviews": [
+        {
+            "review_index": <review_index from the input>,
+            "result": [
+                {
+                    "attribute": <attribute_name>,
+                    "evidence": <relevant_text_from_seller_description_or_null_if_missing>,
+                    "status": <"missing"|"contradictory"|"matching"|"partially_matching">,
+                    "value": <attribute_value>
+                }
+            ]
+        }
+    ]
+}
+
+Include a review with an empty "result" list if all of its attributes were removed.
+
+---
+
+Example:
+
+Seller Description: "A great pair of pants. It's overall very lightweight, and the fabric is soft."
+Reviews:
+[{"review_index": 0, "attributes": [{"attribute": "size", "value": "10"}, {"attribute": "texture", "value": "soft"}]}, {"review_index": 1, "attributes": [{"attribute": "fit", "value": "loose"}]}]
+
+Output:
+{
+    "reviews": [
+        {"review_index": 0, "result": [{"attribute": "texture", "evidence": "the fabric is soft", "status": "matching", "value": "soft"}]},
+        {"review_index": 1, "result": [{"attribute": "fit", "evidence": null, "status": "missing", "value": "loose"}]}
+    ]
+}
+
+---
+
+"""
+
 grouping_prompt = """You are a product attribute categorization expert. Group product attributes into logical categories. Use broad, intuitive categories.
 Your output must begin with your reasoning in <reasoning> tags. Then, in <answer> tags, write the mapping: product attribute -> category.
 Avoid overly specific classifications and try to generalize attributes into a few categories.
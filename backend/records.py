@@ -0,0 +1,64 @@
+MATCH_STATUSES = ("missing", "matching", "contradictory", "partially_matching")
+
+_FIELDS = ("attribute", "value", "status", "evidence")
+
+
+class MatchRecord:
+    """One matched attribute of one review, as returned by the matching model."""
+
+    __slots__ = ("attribute", "value", "status", "evidence", "extra")
+
+    def __init__(self, attribute, value=None, status=None, evidence=None, extra=None):
+        self.attribute = attribute
+        self.value = value
+        self.status = status
+        self.evidence = evidence
+        self.extra = extra # any unexpected keys from the model, kept for output
+
+    @classmethod
+    def from_dict(cls, row):
+        extra = {k: v for k, v in row.items() if k not in _FIELDS} or None
+        return cls(row.get("attribute"), row.get("value"), row.get("status"), row.get("evidence"), extra)
+
+    def to_dict(self):
+        row = {"attribute": self.attribute, "value": self.value, "status": self.status, "evidence": self.evidence}
+        if self.extra:
+            row.update(self.extra)
+        return row
+
+    def __repr__(self):
+        return f"MatchRecord({self.to_dict()!r})"
+
+
+def records_from_rows(rows):
+    """
+    Build the records of one review from its matched rows.
+
+    Accepts a list of dicts (as stored in a session or returned by the model), a list
+    of MatchRecord, or anything with pandas' `to_dict('records')`. Malformed rows are skipped.
+    """
+    if hasattr(rows, "to_dict") and not isinstance(rows, dict):
+        rows = rows.to_dict("records")
+    if not isinstance(rows, list):
+        print(f"Warning: Expected a list of rows, but got {type(rows)}. Skipping.")
+        return []
+    records = []
+    for row in rows:
+        if isinstance(row, MatchRecord):
+            records.append(row)
+        elif isinstance(row, dict):
+            records.append(MatchRecord.from_dict(row))
+        else:
+            print(f"Warning: Skipping invalid row: {row}")
+    return records
+
+
+def matchings_to_records(review_matchings):
+    """Turn one matching response per review into one list of records per review."""
+    return [records_from_rows(resp.get('result') or []) for resp in review_matchings]
+
+
+def records_to_rows(all_records):
+    """Serializable form of per-review records (list of lists of dicts)."""
+    return [[record.to_dict() for record in records] for records in all_records]
+
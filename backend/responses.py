@@ -0,0 +1,128 @@
+import asyncio
+import gzip
+import json
+import os
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import orjson # several times faster than json for large step results
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Compression settings, overridable through the environment
+# Smaller bodies are sent as they are
+COMPRESS_MIN_BYTES = int(os.environ.get("PRAISE_COMPRESS_MIN_BYTES", 1024))
+# Fast levels: most of the size reduction of the maximum levels at a fraction of the CPU time
+GZIP_LEVEL = int(os.environ.get("PRAISE_GZIP_LEVEL", 5))
+BROTLI_QUALITY = int(os.environ.get("PRAISE_BROTLI_QUALITY", 4))
+# Bodies at least this large are compressed off the event loop
+COMPRESS_THREAD_MIN_BYTES = 128 * 1024
+
+COMPRESSIBLE_TYPES = ("text/", "application/json")
+
+
+def dumps(content):
+    """Compact JSON bytes: orjson if installed, otherwise the json module without whitespace."""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with dumps()."""
+
+    def render(self, content):
+        return dumps(content)
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    The content coding to compress with for an Accept-Encoding header: "br" (when the
+    brotli package is installed) or "gzip", whichever the client ranks higher; None if
+    it accepts neither.
+    """
+    available = ("br", "gzip") if brotli is not None else ("gzip",)
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding:
+            weights[coding] = quality
+    best, best_quality = None, 0.0
+    for coding in available: # in order of preference on equal quality
+        quality = weights.get(coding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """
+    Compress JSON and text responses with brotli or gzip, as the client accepts.
+
+    Only complete bodies are compressed; streamed responses (Server-Sent Events) are
+    passed through as they are, so every event still reaches the client as it happens.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        start = None
+
+        async def send_compressed(message):
+            nonlocal start
+            if message["type"] == "http.response.start":
+                start = message # held back until the body shows whether to compress
+                return
+            if start is None or message["type"] != "http.response.body":
+                await send(message)
+                return
+            headers = MutableHeaders(raw=start["headers"])
+            body = message.get("body", b"")
+            content_type = headers.get("content-type", "")
+            if (message.get("more_body") or "content-encoding" in headers or len(body) < self.minimum_size
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)):
+                await send(start)
+                start = None
+                await send(message)
+                return
+            if len(body) >= COMPRESS_THREAD_MIN_BYTES:
+                body = await asyncio.to_thread(compress, body, encoding)
+            else:
+                body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(body))
+            headers.add_vary_header("Accept-Encoding")
+            await send(start)
+            start = None
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_compressed)
@@ -0,0 +1,130 @@
+import os
+import re
+import numpy as np
+
+# Dedup settings, overridable through the environment
+# Minimum Jaccard similarity of character shingles for two reviews to count as copies
+DEDUP_THRESHOLD = float(os.environ.get("PRAISE_DEDUP_THRESHOLD", 0.9))
+DEDUP_PERMUTATIONS = int(os.environ.get("PRAISE_DEDUP_PERMUTATIONS", 64))
+SHINGLE_SIZE = 5
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_NON_WORD = re.compile(r"[\W_]+")
+_NUMBER = re.compile(r"\d+")
+
+
+def normalize_review(review):
+    """Review text with case, punctuation and whitespace differences removed."""
+    return _NON_WORD.sub(" ", str(review).lower()).strip()
+
+
+def shingles(text):
+    """Set of SHINGLE_SIZE-character substrings of a normalized review (the text itself if shorter)."""
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def _jaccard(a, b):
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+
+def lsh_bands(num_permutations, threshold):
+    """
+    Split the signature into (bands, rows) so that pairs around `threshold` become candidates.
+
+    Picks the split whose S-curve midpoint (1/bands)^(1/rows) is closest to, but not
+    above, the threshold, which favors recall; candidates are verified exactly afterwards.
+    """
+    best = (num_permutations, 1)
+    best_gap = None
+    for rows in range(1, num_permutations + 1):
+        if num_permutations % rows:
+            continue
+        bands = num_permutations // rows
+        midpoint = (1 / bands) ** (1 / rows)
+        if midpoint <= threshold and (best_gap is None or threshold - midpoint < best_gap):
+            best, best_gap = (bands, rows), threshold - midpoint
+    return best
+
+
+class MinHasher:
+    """MinHash signatures over character shingles with a fixed set of random permutations."""
+
+    def __init__(self, num_permutations=DEDUP_PERMUTATIONS, seed=1):
+        rng = np.random.RandomState(seed)
+        self.num_permutations = num_permutations
+        # Multipliers over the whole field: 32-bit ones leave (a * x + b) mod p nearly
+        # monotonic in x, so the permutations pick the same minimum shingles
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=num_permutations, dtype=np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=num_permutations, dtype=np.uint64)
+
+    def signature(self, shingle_set):
+        # Python's string hash is salted per process, which is fine: signatures are only
+        # compared within one find_duplicates call
+        hashes = np.fromiter((hash(s) & _MAX_HASH for s in shingle_set), dtype=np.uint64, count=len(shingle_set))
+        # ((a * x + b) mod p) keeping the low 32 bits, one row per permutation; the product
+        # wraps at 64 bits, which keeps it a good mix
+        permuted = ((np.outer(self._a, hashes) + self._b[:, None]) % _MERSENNE_PRIME) & _MAX_HASH
+        return permuted.min(axis=1)
+
+
+def find_duplicates(reviews, threshold=DEDUP_THRESHOLD, num_permutations=DEDUP_PERMUTATIONS):
+    """
+    Cluster near-duplicate reviews.
+
+    Reviews identical after normalize_review are grouped directly. The remaining
+    distinct texts are bucketed with MinHash LSH, and a candidate joins a cluster
+    only if its exact shingle Jaccard similarity with the cluster's first review
+    reaches `threshold` and it states the same numbers: "12 inch" and "10 inch"
+    differ in a few characters, but not in the fact.
+
+    Args:
+        reviews (list[str]): Review texts
+        threshold (float): Minimum Jaccard similarity; 1.0 only merges normalized-identical reviews
+
+    Returns:
+        list[int]: For each review, the index of its cluster representative (itself if unique)
+    """
+    representatives = []
+    by_text = {} # normalized text -> representative index
+    hasher = None
+    bands, rows = lsh_bands(num_permutations, threshold)
+    buckets = {} # (band, band signature) -> representative indices
+    shingle_sets = {} # representative index -> shingles
+    signatures = {} # representative index -> MinHash signature
+    numbers = {} # representative index -> numbers in the review, in order
+    # Candidates whose signatures agree on clearly fewer positions than the threshold are
+    # not worth an exact comparison
+    min_agreement = max(0.0, threshold - 0.15)
+
+    for index, review in enumerate(reviews):
+        text = normalize_review(review)
+        if text in by_text:
+            representatives.append(by_text[text])
+            continue
+        representative = index
+        if threshold < 1.0:
+            review_numbers = _NUMBER.findall(text)
+            shingle_set = shingles(text)
+            hasher = hasher or MinHasher(num_permutations)
+            signature = hasher.signature(shingle_set)
+            keys = [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(bands)]
+            candidates = sorted({candidate for key in keys for candidate in buckets.get(key, ())})
+            for candidate in candidates:
+                if numbers[candidate] != review_numbers or np.mean(signature == signatures[candidate]) < min_agreement:
+                    continue
+                if _jaccard(shingle_set, shingle_sets[candidate]) >= threshold:
+                    representative = candidate
+                    break
+            if representative == index:
+                shingle_sets[index] = shingle_set
+                signatures[index] = signature
+                numbers[index] = review_numbers
+                for key in keys:
+                    buckets.setdefault(key, []).append(index)
+        by_text[text] = representative
+        representatives.append(representative)
+    return representatives
+
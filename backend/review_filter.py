@@ -0,0 +1,92 @@
+import json
+import math
+import os
+import re
+
+# Pre-filter settings, overridable through the environment
+# Reviews with fewer content words (after removing stop words, praise and ratings) are skipped
+PREFILTER_MIN_CONTENT_WORDS = int(os.environ.get("PRAISE_PREFILTER_MIN_CONTENT_WORDS", 1))
+# Optional JSON file with word-feature weights ({"bias": float, "weights": {feature: float}, "threshold": float})
+PREFILTER_MODEL_PATH = os.environ.get("PRAISE_PREFILTER_MODEL", "")
+
+_WORD = re.compile(r"[^\W_]+(?:['’][^\W_]+)*")
+_RATING = re.compile(r"\b\d+(?:[.,]\d+)?\s*(?:/\s*\d+|out of \d+|stars?)\b")
+
+_STOP_WORDS = frozenset("""
+a about after again all also am an and any are as at be because been before being but by can could
+did do does doing don't for from get got had has have having he her here him his how i i'm i've if in
+into is it it's its just me more most much my no not now of on one only or our out over really same
+she so some such than that that's the their them then there these they this those to too up us very
+was we were what when which while who why will with would you your yes wow oh
+""".split())
+
+# Sentiment and filler words that carry no product facts on their own
+# Words like "cheap", "works", "described" or "item" are left out: "feels cheap", "works with
+# USB-C" and "not as described" are claims the matching step checks against the description
+_OPINION_WORDS = frozenset("""
+amazing awesome awful bad best better buy bought cool disappointed disappointing excellent fantastic
+fine good great happy hate hated highly horrible junk like liked love loved lovely nice ok okay perfect
+perfectly poor product purchase recommend recommended rubbish satisfied star stars super superb terrible
+thank thanks useless waste wonderful worst worth
+""".split())
+
+
+def content_words(review):
+    """Lowercase words of a review that are not stop words, praise, or part of a star rating."""
+    text = _RATING.sub(" ", str(review).lower())
+    return [word for word in _WORD.findall(text) if word not in _STOP_WORDS and word not in _OPINION_WORDS]
+
+
+class ReviewFilter:
+    """
+    Cheap local check for reviews with no factual content ("Great!", "Love it", "5 stars").
+
+    A review passes if it keeps at least `min_content_words` content words. If a
+    word-feature model is loaded, passing reviews must also score at least its
+    threshold under a logistic model over their content words.
+    """
+
+    def __init__(self, min_content_words=PREFILTER_MIN_CONTENT_WORDS, weights=None, bias=0.0, threshold=0.5):
+        self.min_content_words = min_content_words
+        self.weights = weights or {}
+        self.bias = bias
+        self.threshold = threshold
+
+    @classmethod
+    def from_file(cls, path, min_content_words=PREFILTER_MIN_CONTENT_WORDS):
+        """Load word-feature weights from JSON; falls back to the heuristics alone on errors."""
+        try:
+            with open(path) as f:
+                model = json.load(f)
+            return cls(min_content_words, model.get("weights", {}), model.get("bias", 0.0), model.get("threshold", 0.5))
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"Warning: Could not load review filter model from {path}: {str(e)}")
+            return cls(min_content_words)
+
+    def score(self, words):
+        """Probability of factual content under the word-feature model."""
+        features = set(words)
+        features.add("__length__%d" % min(len(words), 10))
+        if any(word.isdigit() for word in words):
+            features.add("__has_number__")
+        logit = self.bias + sum(self.weights.get(feature, 0.0) for feature in features)
+        return 1.0 / (1.0 + math.exp(-max(-60.0, min(60.0, logit))))
+
+    def is_factual(self, review):
+        words = content_words(review)
+        if len(words) < self.min_content_words:
+            return False
+        if self.weights:
+            return self.score(words) >= self.threshold
+        return True
+
+
+def create_review_filter():
+    """Build the filter configured by PRAISE_PREFILTER_MIN_CONTENT_WORDS and PRAISE_PREFILTER_MODEL."""
+    if PREFILTER_MODEL_PATH:
+        return ReviewFilter.from_file(PREFILTER_MODEL_PATH)
+    return ReviewFilter()
+
+
+# Shared filter used by the pipeline
+review_filter = create_review_filter()
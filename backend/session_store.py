@@ -0,0 +1,311 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+# Session store settings, overridable through the environment
+SESSION_STORE_BACKEND = os.environ.get("PRAISE_SESSION_STORE", "memory") # "memory" or "sqlite"
+SESSION_DB_PATH = os.environ.get(
+    "PRAISE_SESSION_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions.sqlite3")
+)
+SESSION_SPILL_DIR = os.environ.get(
+    "PRAISE_SESSION_SPILL_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "session_spill")
+)
+SESSION_MAX_BYTES = int(os.environ.get("PRAISE_SESSION_MAX_BYTES", 256 * 1024 * 1024))
+SESSION_TTL_SECONDS = int(os.environ.get("PRAISE_SESSION_TTL_SECONDS", 24 * 3600))
+
+# Run expiry sweeps once every N writes instead of on each one
+_EXPIRY_SWEEP_INTERVAL = 64
+
+
+class SessionStore(ABC):
+    """
+    Interface for session storage.
+
+    Sessions are JSON-serializable dicts. Callers that modify a session returned by
+    `get` must `put` it back for the change to be visible to other workers; `update`
+    does both atomically, for changes made after a long wait (a step's model calls)
+    that must not overwrite what other requests stored meanwhile.
+    Settings are small process-wide values (API key state, worker count) that
+    should be shared the same way as sessions.
+    """
+
+    @abstractmethod
+    def get(self, session_id):
+        """The stored session, or None if there is none or it expired."""
+
+    @abstractmethod
+    def put(self, session_id, session):
+        """Store `session`, replacing any stored under `session_id`."""
+
+    @abstractmethod
+    def update(self, session_id, apply):
+        """
+        Read the stored session, change it with `apply(session)` and store it, as one step.
+
+        Returns:
+            dict: The updated session, or None if there is no such session
+        """
+
+    @abstractmethod
+    def delete(self, session_id):
+        """Remove a session; a missing one is ignored."""
+
+    @abstractmethod
+    def get_setting(self, name, default=None):
+        """A setting's value, or `default` if it was never set."""
+
+    @abstractmethod
+    def set_setting(self, name, value):
+        """Store a JSON-serializable setting."""
+
+    def stats(self):
+        return {}
+
+
+class MemorySessionStore(SessionStore):
+    """
+    In-process session store with a byte budget.
+
+    Sessions are kept in LRU order. When the budget is exceeded the least recently
+    used sessions are spilled to JSON files in `spill_dir` (or dropped if no spill
+    directory is set) and loaded back on their next access. Sessions idle longer
+    than `ttl_seconds` are removed from memory and disk.
+    """
+
+    def __init__(self, max_bytes=SESSION_MAX_BYTES, ttl_seconds=SESSION_TTL_SECONDS, spill_dir=SESSION_SPILL_DIR):
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.spill_dir = spill_dir
+        self._sessions = OrderedDict() # session_id -> (last_access, size, session)
+        self._settings = {}
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._writes_since_sweep = 0
+        self.spilled = 0
+        self.evicted = 0
+
+    def _spill_path(self, session_id):
+        return os.path.join(self.spill_dir, f"{session_id}.json")
+
+    def _expired(self, last_access):
+        return self.ttl_seconds > 0 and time.time() - last_access > self.ttl_seconds
+
+    def _drop(self, session_id):
+        entry = self._sessions.pop(session_id, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _spill(self, session_id, session):
+        if not self.spill_dir:
+            self.evicted += 1
+            return
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            with open(self._spill_path(session_id), "w") as f:
+                json.dump(session, f)
+            self.spilled += 1
+        except OSError as e:
+            print(f"Warning: Could not spill session {session_id} to disk: {str(e)}")
+            self.evicted += 1
+
+    def _load_spilled(self, session_id):
+        if not self.spill_dir:
+            return None
+        path = self._spill_path(session_id)
+        try:
+            if self._expired(os.path.getmtime(path)):
+                os.remove(path)
+                return None
+            with open(path) as f:
+                session = json.load(f)
+            os.remove(path)
+            return session
+        except (OSError, ValueError):
+            return None
+
+    def _sweep(self):
+        self._writes_since_sweep = 0
+        for session_id, (last_access, _, _) in list(self._sessions.items()):
+            if self._expired(last_access):
+                self._drop(session_id)
+        if self.spill_dir and os.path.isdir(self.spill_dir):
+            for name in os.listdir(self.spill_dir):
+                path = os.path.join(self.spill_dir, name)
+                try:
+                    if self._expired(os.path.getmtime(path)):
+                        os.remove(path)
+                except OSError:
+                    pass
+
+    def _store(self, session_id, session):
+        size = len(json.dumps(session))
+        self._drop(session_id)
+        self._sessions[session_id] = (time.time(), size, session)
+        self._bytes += size
+        # Spill least recently used sessions until within budget, keeping the one just stored
+        while self._bytes > self.max_bytes and len(self._sessions) > 1:
+            old_id, (_, _, old_session) = next(iter(self._sessions.items()))
+            self._drop(old_id)
+            self._spill(old_id, old_session)
+
+    def get(self, session_id):
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                if self._expired(entry[0]):
+                    self._drop(session_id)
+                    return None
+                self._sessions[session_id] = (time.time(), entry[1], entry[2])
+                self._sessions.move_to_end(session_id)
+                return entry[2]
+            session = self._load_spilled(session_id)
+            if session is not None:
+                self._store(session_id, session)
+            return session
+
+    def put(self, session_id, session):
+        with self._lock:
+            self._store(session_id, session)
+            self._writes_since_sweep += 1
+            if self._writes_since_sweep >= _EXPIRY_SWEEP_INTERVAL:
+                self._sweep()
+
+    def update(self, session_id, apply):
+        with self._lock:
+            session = self.get(session_id)
+            if session is not None:
+                apply(session)
+                self.put(session_id, session)
+            return session
+
+    def delete(self, session_id):
+        with self._lock:
+            self._drop(session_id)
+            if self.spill_dir:
+                try:
+                    os.remove(self._spill_path(session_id))
+                except OSError:
+                    pass
+
+    def get_setting(self, name, default=None):
+        return self._settings.get(name, default)
+
+    def set_setting(self, name, value):
+        self._settings[name] = value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": "memory",
+                "sessions_in_memory": len(self._sessions),
+                "bytes_in_memory": self._bytes,
+                "max_bytes": self.max_bytes,
+                "spilled": self.spilled,
+                "evicted": self.evicted,
+            }
+
+
+class SqliteSessionStore(SessionStore):
+    """
+    Session store backed by a SQLite file.
+
+    Every worker process on the box that points at the same file sees the same
+    sessions and settings, so requests for one session can land on any worker.
+    Sessions not updated for `ttl_seconds` are deleted.
+    """
+
+    def __init__(self, path=SESSION_DB_PATH, ttl_seconds=SESSION_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._writes_since_sweep = 0
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS settings (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+
+    def get(self, session_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        if row is None or (self.ttl_seconds > 0 and time.time() - row[1] > self.ttl_seconds):
+            return None
+        return json.loads(row[0])
+
+    def put(self, session_id, session):
+        data = json.dumps(session)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?)",
+                (session_id, data, time.time())
+            )
+            self._writes_since_sweep += 1
+            if self.ttl_seconds > 0 and self._writes_since_sweep >= _EXPIRY_SWEEP_INTERVAL:
+                self._writes_since_sweep = 0
+                self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl_seconds,))
+            self._conn.commit()
+
+    def update(self, session_id, apply):
+        with self._lock:
+            # The write lock is taken before reading, so no other worker can write in between
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT data, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()
+                if row is None or (self.ttl_seconds > 0 and time.time() - row[1] > self.ttl_seconds):
+                    self._conn.rollback()
+                    return None
+                session = json.loads(row[0])
+                apply(session)
+                self._conn.execute(
+                    "UPDATE sessions SET data = ?, updated_at = ? WHERE session_id = ?",
+                    (json.dumps(session), time.time(), session_id)
+                )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+            return session
+
+    def delete(self, session_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+
+    def get_setting(self, name, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM settings WHERE name = ?", (name,)).fetchone()
+        return json.loads(row[0]) if row is not None else default
+
+    def set_setting(self, name, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO settings (name, value) VALUES (?, ?)", (name, json.dumps(value))
+            )
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM sessions").fetchone()
+        return {"backend": "sqlite", "path": self.path, "sessions": count, "bytes": size}
+
+
+def create_session_store(backend=SESSION_STORE_BACKEND):
+    """Build the session store selected by PRAISE_SESSION_STORE."""
+    if backend == "sqlite":
+        return SqliteSessionStore()
+    if backend != "memory":
+        print(f"Warning: Unknown session store backend '{backend}', using memory")
+    return MemorySessionStore()
@@ -0,0 +1,119 @@
+"""
+Benchmark worker startup: import time and the latency of the first requests.
+
+Each run is a fresh interpreter (as a new gunicorn worker or a cold-started
+container would be) that imports main.py and then sends /configure, /heartbeat
+twice and /full_pipeline through FastAPI's test client, against the local
+Gemini stand-in. Runs alternate between lazy (PRAISE_LAZY_INIT=1) and eager
+model initialisation, so the two can be compared on the same machine.
+
+    python startup_benchmark.py --runs 5 --latency fixed:0.2
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Timed steps of a run, in order
+STEPS = ("import", "configure", "heartbeat", "heartbeat_cached", "first_pipeline")
+INIT_MODES = {"lazy": "1", "eager": "0"}
+
+
+def _child(reviews):
+    """Run in the fresh interpreter: time the import and the first requests, print them as JSON."""
+    timings = {}
+    started = time.perf_counter()
+    import main
+    timings["import"] = time.perf_counter() - started
+
+    from fastapi.testclient import TestClient
+    from benchmark import synthetic_reviews
+    client = TestClient(main.app)
+    stdout = sys.stdout
+    sys.stdout = open(os.devnull, "w") # the pipeline's progress output
+    try:
+        for step, method, path, body in (
+            ("configure", "POST", "/configure", {"api_key": "startup-benchmark"}),
+            ("heartbeat", "GET", "/heartbeat", None),
+            ("heartbeat_cached", "GET", "/heartbeat", None),
+            ("first_pipeline", "POST", "/full_pipeline", {
+                "seller_description": "A 12 inch cast iron skillet, pre-seasoned, weighing 8 pounds.",
+                "reviews": synthetic_reviews(reviews),
+            }),
+        ):
+            started = time.perf_counter()
+            response = client.request(method, path, json=body)
+            response.raise_for_status()
+            timings[step] = time.perf_counter() - started
+    finally:
+        sys.stdout.close()
+        sys.stdout = stdout
+    print(json.dumps(timings))
+
+
+def run_once(init_mode, args):
+    """Time one fresh worker; returns {step: seconds}."""
+    env = dict(os.environ)
+    env.update({
+        "PRAISE_LAZY_INIT": INIT_MODES[init_mode],
+        "PRAISE_MOCK_GEMINI": args.latency,
+        "PRAISE_SESSION_STORE": "memory",
+        "PRAISE_CACHE_PATH": "",
+        "PRAISE_CATEGORY_MEMORY_PATH": "",
+        "PYTHONWARNINGS": "ignore",
+    })
+    started = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", "--reviews", str(args.reviews)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    timings = json.loads(output.strip().splitlines()[-1])
+    timings["process"] = time.perf_counter() - started
+    return timings
+
+
+def main(argv=None):
+    from benchmark import summarize
+    from formatting_utils import markdown_table
+
+    parser = argparse.ArgumentParser(description="Benchmark import time and first-request latency of a fresh worker.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per init mode")
+    parser.add_argument("--init", default="lazy,eager", help="Comma-separated: lazy, eager")
+    parser.add_argument("--latency", default="fixed:0.1", help="Model latency spec, see mock_gemini.parse_latency")
+    parser.add_argument("--reviews", type=int, default=5, help="Reviews sent to /full_pipeline")
+    parser.add_argument("--output", help="Write the full results as JSON")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        _child(args.reviews)
+        return
+
+    init_modes = [mode.strip() for mode in args.init.split(",") if mode.strip()]
+    unknown = set(init_modes) - set(INIT_MODES)
+    if unknown:
+        parser.error(f"Unknown init mode: {', '.join(sorted(unknown))}")
+
+    runs = {mode: [] for mode in init_modes}
+    for position in range(args.runs):
+        for mode in init_modes: # interleaved, so both see the same disk cache and machine load
+            print(f"Startup run {position + 1}/{args.runs} ({mode})...", file=sys.stderr)
+            runs[mode].append(run_once(mode, args))
+
+    results = {
+        mode: {step: summarize([timings[step] for timings in mode_runs]) for step in (*STEPS, "process")}
+        for mode, mode_runs in runs.items()
+    }
+    rows = [
+        [mode, step, round(summary["p50"] * 1000, 1), round(summary["p95"] * 1000, 1), round(summary["max"] * 1000, 1)]
+        for mode, steps in results.items() for step, summary in steps.items()
+    ]
+    print(markdown_table(["init", "step", "p50 ms", "p95 ms", "max ms"], rows))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"runs": runs, "summary": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
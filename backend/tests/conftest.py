@@ -0,0 +1,19 @@
+import os
+import sys
+import tempfile
+
+# The backend modules read their settings at import: run everything against the local
+# Gemini stand-in, with in-memory sessions and no files outside a temporary directory
+_TMP = tempfile.mkdtemp(prefix="praise-tests-")
+os.environ.update({
+    "PRAISE_MOCK_GEMINI": "0",
+    "PRAISE_SESSION_STORE": "memory",
+    "PRAISE_SESSION_SPILL_DIR": os.path.join(_TMP, "session_spill"),
+    "PRAISE_CACHE_PATH": "",
+    "PRAISE_CATEGORY_MEMORY_PATH": "",
+    "PRAISE_BATCH_DIR": os.path.join(_TMP, "batch_jobs"),
+})
+os.environ.pop("PRAISE_API_KEYS", None)
+os.environ.pop("GOOGLE_API_KEY", None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
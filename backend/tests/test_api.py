@@ -0,0 +1,176 @@
+import json
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import pipeline
+from mock_gemini import install_mock_models, restore_models
+
+DESCRIPTION = "A 12 inch cast iron skillet, pre-seasoned, weighing 8 pounds."
+REVIEWS = ["The skillet weighs 8 pounds.", "It is 10 inches wide.", "Made of cast iron, arrived pre-seasoned."]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """A test client for a worker that has no API key yet."""
+    monkeypatch.setattr(main, "process_api_key", None)
+    monkeypatch.setattr(main, "process_api_keys", [])
+    monkeypatch.setattr(main, "ENV_API_KEYS", [])
+    main.session_store.set_setting("configured_key_fingerprints", None)
+    with TestClient(main.app) as test_client:
+        yield test_client
+    main.key_pool.configure([])
+
+
+@pytest.fixture
+def session_id(client):
+    assert client.post("/configure", json={"api_key": "test-key"}).status_code == 200
+    response = client.post("/start_session", json={"seller_description": DESCRIPTION, "reviews": REVIEWS, "use_cache": False})
+    return response.json()["session_id"]
+
+
+def _events(text):
+    """(event, data) pairs of a Server-Sent Events body."""
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_endpoints_require_configuration(client):
+    response = client.post("/start_session", json={"seller_description": DESCRIPTION, "reviews": REVIEWS})
+    assert response.status_code == 400
+    assert "/configure" in response.json()["detail"]
+
+
+def test_configure_keeps_only_key_fingerprints(client, session_id):
+    assert main.session_store.get_setting("configured_key_fingerprints") == [main.key_fingerprint("test-key")]
+    assert client.post("/configure", json={}).status_code == 400
+
+
+def test_extract_stream_sends_each_review_then_the_result(client, session_id):
+    response = client.post("/extract_stream", json={"session_id": session_id, "markdown": False})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = _events(response.text)
+    assert [event for event, _ in events] == ["review"] * len(REVIEWS) + ["result"]
+    assert sorted(data["index"] for _, data in events[:-1]) == list(range(len(REVIEWS)))
+    result = events[-1][1]
+    assert len(result["extracted_attributes"]) == len(REVIEWS)
+    assert "markdown" not in result
+
+    # The result is cached in the session: a second stream only sends the result
+    events = _events(client.post("/extract_stream", json={"session_id": session_id}).text)
+    assert [event for event, _ in events] == ["result"]
+    assert events[0][1]["markdown"].startswith("### Review 1:")
+
+
+def test_stream_reports_unknown_sessions(client, session_id):
+    assert client.post("/extract_stream", json={"session_id": "missing"}).status_code == 404
+
+
+def test_fields_select_parts_of_the_result(client, session_id):
+    full = client.post("/extract", json={"session_id": session_id}).json()
+    assert set(full) >= {"extracted_attributes", "markdown"}
+    as_json = client.post("/extract", json={"session_id": session_id, "fields": "json"}).json()
+    assert as_json == {key: value for key, value in full.items() if key != "markdown"}
+    assert client.post("/extract", json={"session_id": session_id, "fields": "markdown"}).json() == {"markdown": full["markdown"]}
+    summary = client.post("/extract", json={"session_id": session_id, "fields": "summary"}).json()["summary"]
+    assert summary["reviews"] == len(REVIEWS)
+    assert summary["rows"] == sum(len(rows) for rows in full["extracted_attributes"])
+    assert client.post("/extract", json={"session_id": session_id, "fields": "everything"}).status_code == 422
+
+
+def test_offset_and_limit_page_per_review_results(client, session_id):
+    full = client.post("/extract", json={"session_id": session_id, "fields": "json"}).json()
+    page = client.post("/extract", json={"session_id": session_id, "offset": 1, "limit": 1}).json()
+    assert page["extracted_attributes"] == full["extracted_attributes"][1:2]
+    assert page["page"] == {"offset": 1, "limit": 1, "total_reviews": len(REVIEWS)}
+    assert page["markdown"].startswith("### Review 2:") # numbered as in the full result
+    assert client.post("/extract", json={"session_id": session_id, "limit": 0}).status_code == 422
+
+
+def test_large_responses_are_compressed(client, session_id):
+    response = client.post("/extract", json={"session_id": session_id}, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in response.headers["vary"]
+    assert response.json()["extracted_attributes"] # decoded by the client
+    plain = client.post("/extract", json={"session_id": session_id}, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    stream = client.post("/extract_stream", json={"session_id": session_id}, headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in stream.headers # events are sent as they happen
+
+
+def test_cache_clear_requires_configuration(client):
+    assert client.post("/cache_clear").status_code == 400
+    assert client.post("/configure", json={"api_key": "test-key"}).status_code == 200
+    assert client.post("/cache_clear").status_code == 200
+
+
+def test_failed_reviews_are_retried_on_the_next_run(client, monkeypatch):
+    client.post("/configure", json={"api_key": "test-key"})
+    reviews = [f"The skillet is {inches} inches wide." for inches in range(5, 15)]
+    session_id = client.post("/start_session", json={"seller_description": DESCRIPTION, "reviews": reviews, "use_cache": False}).json()["session_id"]
+    _, originals = install_mock_models(pipeline, latency="0", error_rate=0.5, seed=3)
+    try:
+        result = client.post("/extract", json={"session_id": session_id, "fields": "json"}).json()
+    finally:
+        restore_models(pipeline, originals)
+    failed_reviews = result["failed_reviews"]
+    assert 0 < len(failed_reviews) < len(reviews)
+    assert all(not result["extracted_attributes"][index] for index in failed_reviews)
+    response = client.post("/match", json={"session_id": session_id})
+    assert response.status_code == 400
+    assert "retry" in response.json()["detail"]
+
+    sent = []
+    iter_review_attributes = main.iter_review_attributes
+
+    def spy(step_reviews, *args, **kwargs):
+        sent.extend(step_reviews)
+        return iter_review_attributes(step_reviews, *args, **kwargs)
+
+    monkeypatch.setattr(main, "iter_review_attributes", spy)
+    result = client.post("/extract", json={"session_id": session_id, "fields": "json"}).json()
+    assert sent == [reviews[index] for index in failed_reviews]
+    assert "failed_reviews" not in result
+    assert all(result["extracted_attributes"])
+    assert client.post("/match", json={"session_id": session_id}).status_code == 200
+
+
+def test_category_memory_clear_requires_configuration(client):
+    assert client.post("/category_memory_clear").status_code == 400
+    assert client.post("/configure", json={"api_key": "test-key"}).status_code == 200
+    assert client.post("/category_memory_clear").status_code == 200
+
+
+def test_append_reviews_processes_only_the_new_reviews(client, session_id, monkeypatch):
+    first = {step: client.post(f"/{step}", json={"session_id": session_id, "fields": "json"}).json()
+             for step in ("extract", "match", "categorize")}
+    new_reviews = ["The lid is sold separately.", "It weighs 9 pounds, not 8."]
+    assert client.post("/append_reviews", json={"session_id": session_id, "reviews": new_reviews}).status_code == 200
+    assert client.post("/append_reviews", json={"session_id": "missing", "reviews": new_reviews}).status_code == 404
+
+    sent = {"extract": [], "match": []}
+    for name, step in (("iter_review_attributes", "extract"), ("iter_review_matchings", "match")):
+        def spy(*args, original=getattr(main, name), step=step, **kwargs):
+            sent[step].append(args[1] if step == "match" else args[0])
+            return original(*args, **kwargs)
+        monkeypatch.setattr(main, name, spy)
+
+    extract = client.post("/extract", json={"session_id": session_id, "fields": "json"}).json()
+    assert sent["extract"] == [new_reviews]
+    assert extract["extracted_attributes"][:len(REVIEWS)] == first["extract"]["extracted_attributes"]
+    assert len(extract["extracted_attributes"]) == len(REVIEWS) + len(new_reviews)
+
+    match = client.post("/match", json={"session_id": session_id, "fields": "json"}).json()
+    assert sent["match"] == [extract["extracted_attributes"][len(REVIEWS):]]
+    assert match["all_dataframes"][:len(REVIEWS)] == first["match"]["all_dataframes"]
+
+    categorize = client.post("/categorize", json={"session_id": session_id, "fields": "json"}).json()
+    for status, group in first["categorize"]["results"].items():
+        for category, items in group.items():
+            assert categorize["results"][status][category][:len(items)] == items
+    rows = sum(len(items) for group in categorize["results"].values() for items in group.values())
+    assert rows == sum(len(review_rows) for review_rows in match["all_dataframes"])
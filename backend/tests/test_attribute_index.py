@@ -0,0 +1,48 @@
+from attribute_index import AttributeIndex, canonical_key
+
+
+def test_canonical_key_normalizes_case_spacing_and_plurals():
+    assert canonical_key(" Batteries-Life ") == canonical_key("battery life")
+    assert canonical_key("Glass") == "glass" # not "glas"
+
+
+def test_same_key_and_similar_spellings_share_a_name():
+    index = AttributeIndex()
+    assert index.add("Weight") == "Weight"
+    assert index.add("weights ") == "Weight"
+    assert index.add("Noise cancellation") == "Noise cancellation"
+    assert index.add("noise cancelation") == "Noise cancellation"
+    assert index.add("Heaviness") == "Heaviness" # synonyms without shared spelling stay apart
+    assert index.surface_forms("Weight") == ["Weight", "weights"]
+    assert len(index) == 3
+
+
+def test_canonicalize_merges_rows_of_one_review():
+    index = AttributeIndex()
+    rows = index.canonicalize([
+        [{"attribute": "Color", "value": "red"}, {"attribute": "colors", "value": "dark red"}],
+        [{"attribute": "color", "value": "blue"}, {"attribute": None, "value": "x"}],
+    ])
+    assert rows == [
+        [{"attribute": "Color", "value": "red"}],
+        [{"attribute": "Color", "value": "blue"}, {"attribute": None, "value": "x"}],
+    ]
+
+
+def test_round_trip_keeps_canonical_names():
+    index = AttributeIndex()
+    index.add("Weight")
+    index.add("weights")
+    restored = AttributeIndex.from_dict(index.to_dict())
+    assert restored.to_dict() == index.to_dict()
+    assert restored.add("WEIGHT") == "Weight"
+
+
+def test_names_with_different_numbers_stay_apart():
+    index = AttributeIndex()
+    for name, other in (("wifi 5 support", "wifi 6 support"), ("bluetooth 5.0", "bluetooth 5.3"),
+                        ("2 year warranty", "3 year warranty")):
+        assert index.add(name) == name
+        assert index.add(other) == other
+    assert index.add("Wifi 5 supports") == "wifi 5 support"
+    assert len(index) == 6
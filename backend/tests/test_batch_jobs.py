@@ -0,0 +1,125 @@
+import asyncio
+import io
+import os
+import pytest
+
+import async_pipeline
+import concurrency
+import pipeline
+from batch_jobs import BatchJob, JOB_OPTIONS, process_product, read_products, resolve_input_path
+from mock_gemini import install_mock_models, restore_models
+
+DESCRIPTION = "A 12 inch cast iron skillet, pre-seasoned, weighing 8 pounds."
+REVIEWS = [f"The skillet is {inches} inches wide and weighs {inches - 4} pounds." for inches in range(5, 17)]
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(concurrency, "backoff_delay", lambda attempt: 0)
+
+
+@pytest.fixture
+def mock_models():
+    installed = []
+
+    def install(**options):
+        _, originals = install_mock_models(pipeline, latency="0", **options)
+        installed.append(originals)
+
+    yield install
+    for originals in reversed(installed):
+        restore_models(pipeline, originals)
+
+
+def test_read_products_jsonl():
+    source = io.StringIO(
+        '{"product_id": "p1", "seller_description": "Pan", "reviews": ["Heavy", "Wide"]}\n'
+        "\n"
+        '{"product_id": 2, "reviews": "[\\"Small\\"]"}\n'
+    )
+    assert read_products(source, "jsonl") == [
+        {"product_id": "p1", "seller_description": "Pan", "reviews": ["Heavy", "Wide"]},
+        {"product_id": "2", "seller_description": "", "reviews": ["Small"]},
+    ]
+    with pytest.raises(ValueError, match="Line 2: duplicate product_id p1"):
+        read_products(io.StringIO('{"product_id": "p1"}\n{"product_id": "p1"}\n'), "jsonl")
+
+
+def test_read_products_csv_combines_rows(tmp_path):
+    path = tmp_path / "products.csv"
+    path.write_text('product_id,seller_description,review\np1,Pan,Heavy\np1,Pan,"Wide, flat"\np2,Lid,\n')
+    assert read_products(str(path)) == [
+        {"product_id": "p1", "seller_description": "Pan", "reviews": ["Heavy", "Wide, flat"]},
+        {"product_id": "p2", "seller_description": "Lid", "reviews": []},
+    ]
+
+
+def test_resolve_input_path_stays_inside_the_input_dir(tmp_path):
+    (tmp_path / "products.jsonl").write_text("")
+    assert resolve_input_path("products.jsonl", str(tmp_path)) == os.path.realpath(tmp_path / "products.jsonl")
+    for path in ("../products.jsonl", "/etc/passwd", "nested/../../products.jsonl"):
+        with pytest.raises(PermissionError):
+            resolve_input_path(path, str(tmp_path))
+    with pytest.raises(PermissionError):
+        resolve_input_path("products.jsonl", "")
+
+
+def test_create_rejects_unknown_options(tmp_path):
+    with pytest.raises(ValueError, match="Unknown job options"):
+        BatchJob.create([], {"turbo": True}, base_dir=str(tmp_path))
+
+
+def test_resume_retries_only_the_failed_reviews(tmp_path, monkeypatch, mock_models):
+    job = BatchJob.create(
+        [{"product_id": "p1", "seller_description": DESCRIPTION, "reviews": REVIEWS}],
+        {"use_cache": False}, base_dir=str(tmp_path)
+    )
+    options = job.options
+    assert options == {**JOB_OPTIONS, "use_cache": False}
+
+    mock_models(error_rate=0.4, seed=1)
+    with pytest.raises(RuntimeError, match="resume the job"):
+        asyncio.run(process_product(job, "p1", options))
+    partial = job.checkpoints("p1")["extract_partial"]
+    failed_reviews = partial["failed_reviews"]
+    assert 0 < len(failed_reviews) < len(REVIEWS)
+    assert all(partial["results"][index] for index in range(len(REVIEWS)) if index not in failed_reviews)
+
+    sent = []
+    extract = async_pipeline.extract_review_attributes # imported by process_product when it runs
+
+    async def spy(reviews, *args, **kwargs):
+        sent.extend(reviews)
+        return await extract(reviews, *args, **kwargs)
+
+    monkeypatch.setattr(async_pipeline, "extract_review_attributes", spy)
+    mock_models(error_rate=0.0)
+    result = asyncio.run(process_product(job, "p1", options))
+    assert sent == [REVIEWS[index] for index in failed_reviews]
+    assert set(result) == {"missing", "matching", "contradictory", "partially_matching"}
+    checkpoints = job.checkpoints("p1")
+    assert "extract_partial" not in checkpoints
+    assert all(checkpoints["extract"]["extracted_attributes"])
+    assert job.pending_products() == []
+
+
+def test_failed_grouping_is_not_checkpointed(tmp_path, monkeypatch, mock_models):
+    job = BatchJob.create(
+        [{"product_id": "p1", "seller_description": DESCRIPTION, "reviews": REVIEWS[:3]}],
+        {"use_cache": False}, base_dir=str(tmp_path)
+    )
+    mock_models()
+    group_attributes = async_pipeline.group_attributes
+
+    async def failing(*args, **kwargs):
+        return {"error": "Failed during grouping: 500 Internal error (mock)"}
+
+    monkeypatch.setattr(async_pipeline, "group_attributes", failing)
+    with pytest.raises(RuntimeError, match="categorize failed"):
+        asyncio.run(process_product(job, "p1", job.options))
+    assert set(job.checkpoints("p1")) == {"extract", "match"}
+
+    monkeypatch.setattr(async_pipeline, "group_attributes", group_attributes)
+    asyncio.run(process_product(job, "p1", job.options))
+    categories = job.checkpoints("p1")["categorize"]["category_map"]
+    assert categories and "uncategorized" not in categories.values()
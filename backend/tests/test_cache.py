@@ -0,0 +1,64 @@
+import cache
+from cache import ResponseCache, cache_key
+
+
+class Model:
+    def __init__(self, name, config=None, instruction=None):
+        self.model_name = name
+        self._generation_config = config or {}
+        self._system_instruction = instruction
+
+
+def test_cache_key_depends_on_model_config_and_prompt():
+    base = cache_key(Model("m", {"temperature": 1}, "sys"), "prompt")
+    assert base == cache_key(Model("m", {"temperature": 1}, "sys"), "prompt")
+    assert base != cache_key(Model("other", {"temperature": 1}, "sys"), "prompt")
+    assert base != cache_key(Model("m", {"temperature": 0}, "sys"), "prompt")
+    assert base != cache_key(Model("m", {"temperature": 1}, "other"), "prompt")
+    assert base != cache_key(Model("m", {"temperature": 1}, "sys"), "prompt 2")
+
+
+def test_memory_tier_evicts_least_recently_used():
+    responses = ResponseCache(path=None, max_memory_entries=2)
+    responses.set("a", "1")
+    responses.set("b", "2")
+    assert responses.get("a") == "1" # a is now the most recently used
+    responses.set("c", "3")
+    assert responses.get("b") is None
+    assert responses.get("a") == "1"
+    assert responses.get("c") == "3"
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, "time", lambda: now[0])
+    responses = ResponseCache(path=None, ttl_seconds=10)
+    responses.set("key", "value")
+    now[0] += 9
+    assert responses.get("key") == "value"
+    now[0] += 2
+    assert responses.get("key") is None
+    assert responses.stats()["misses"] == 1
+
+
+def test_disk_tier_survives_a_new_process_and_is_trimmed(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache, "_DISK_EVICTION_INTERVAL", 1)
+    path = str(tmp_path / "cache.sqlite3")
+    responses = ResponseCache(path=path, max_memory_entries=1, max_disk_entries=2)
+    for position, key in enumerate("abc"):
+        monkeypatch.setattr(cache.time, "time", lambda position=position: 1000.0 + position)
+        responses.set(key, key.upper())
+
+    reopened = ResponseCache(path=path)
+    assert reopened.get("a") is None # oldest entry trimmed from disk
+    assert reopened.get("b") == "B"
+    assert reopened.stats()["disk_hits"] == 1
+
+
+def test_clear_drops_entries_and_counters():
+    responses = ResponseCache(path=None)
+    responses.set("key", "value")
+    responses.get("key")
+    responses.clear()
+    assert responses.get("key") is None
+    assert responses.stats()["hits"] == 0
@@ -0,0 +1,52 @@
+from category_memory import CategoryMemory, normalize_attribute
+
+
+def test_normalize_attribute():
+    assert normalize_attribute("Battery Life") == normalize_attribute(" battery_life.") == "battery life"
+    assert normalize_attribute("battery-life") == "battery life"
+
+
+def test_lookup_finds_remembered_categories():
+    memory = CategoryMemory(path="")
+    memory.remember({"Battery Life": "Power", "Color": "Appearance", "Size": ""})
+    assert memory.lookup(["battery-life", "color", "size", "weight"]) == {
+        "battery-life": "Power",
+        "color": "Appearance",
+    }
+    stats = memory.stats()
+    assert (stats["hits"], stats["misses"], stats["learned"], stats["entries"]) == (2, 2, 2, 2)
+
+
+def test_entries_persist_per_version(tmp_path):
+    path = str(tmp_path / "categories.sqlite3")
+    CategoryMemory(path, version="1").remember({"Color": "Appearance"})
+    assert CategoryMemory(path, version="1").lookup(["color"]) == {"color": "Appearance"}
+    assert CategoryMemory(path, version="2").lookup(["color"]) == {}
+
+
+def test_clear_forgets_the_current_version(tmp_path):
+    path = str(tmp_path / "categories.sqlite3")
+    CategoryMemory(path, version="2").remember({"Color": "Look"})
+    memory = CategoryMemory(path, version="1")
+    memory.remember({"Color": "Appearance"})
+    memory.clear()
+    assert memory.lookup(["color"]) == {}
+    assert CategoryMemory(path, version="2").lookup(["color"]) == {"color": "Look"}
+    memory.clear(all_versions=True)
+    assert CategoryMemory(path, version="2").lookup(["color"]) == {}
+
+
+def test_memory_entries_are_bounded(tmp_path):
+    memory = CategoryMemory(str(tmp_path / "categories.sqlite3"), max_memory_entries=2)
+    memory.remember({"Color": "Appearance", "Size": "Dimensions"})
+    assert memory.lookup(["color"]) == {"color": "Appearance"} # size is now the least recently used
+    memory.remember({"Weight": "Dimensions"})
+    assert list(memory._entries) == ["color", "weight"]
+    # Entries dropped from memory are read back from the file
+    assert memory.lookup(["size", "color", "weight"]) == {"size": "Dimensions", "color": "Appearance", "weight": "Dimensions"}
+    assert len(memory._entries) == 2
+
+    in_memory_only = CategoryMemory(path="", max_memory_entries=1)
+    in_memory_only.remember({"Color": "Appearance"})
+    in_memory_only.remember({"Size": "Dimensions"})
+    assert in_memory_only.lookup(["color", "size"]) == {"size": "Dimensions"}
@@ -0,0 +1,247 @@
+import asyncio
+
+import pytest
+
+import concurrency
+from concurrency import AdaptiveLimiter, call_with_limiter
+
+
+class RateLimited(Exception):
+    code = 429
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(concurrency, "backoff_delay", lambda attempt: 0)
+    monkeypatch.setattr(concurrency, "DECREASE_COOLDOWN", 0.0)
+
+
+def test_limiter_caps_calls_in_flight():
+    limiter = AdaptiveLimiter(initial=3, max_limit=3)
+    running = 0
+    peak = 0
+
+    async def call():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return "ok"
+
+    async def run():
+        return await asyncio.gather(*(call_with_limiter(limiter, call) for _ in range(12)))
+
+    assert asyncio.run(run()) == ["ok"] * 12
+    assert peak == 3
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_limiter_grows_on_success_and_halves_on_rate_limits():
+    limiter = AdaptiveLimiter(initial=4, max_limit=16)
+    for _ in range(8):
+        limiter.in_flight += 1
+        limiter.release(0.1, "ok")
+    assert limiter.window > 4
+    window = limiter.window
+    limiter.in_flight += 1
+    limiter.release(0.1, "rate_limited")
+    assert limiter.window == max(1, int(window * 0.5))
+    assert limiter.stats()["rate_limited"] == 1
+
+
+def test_call_with_limiter_retries_rate_limits_only():
+    limiter = AdaptiveLimiter(initial=2)
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RateLimited("429 RESOURCE_EXHAUSTED")
+        return "done"
+
+    assert asyncio.run(call_with_limiter(limiter, flaky)) == "done"
+    assert limiter.stats()["retries"] == 2
+
+    async def broken():
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(call_with_limiter(limiter, broken))
+    assert limiter.stats()["errors"] == 1
+    assert limiter.stats()["in_flight"] == 0
+
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    limiter = AdaptiveLimiter(initial=1, max_limit=1)
+
+    async def run():
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        limiter.release(0.01, "ok")
+        await asyncio.wait_for(limiter.acquire(), 1)
+        limiter.release(0.01, "ok")
+
+    asyncio.run(run())
+    assert limiter.stats()["in_flight"] == 0
+    assert limiter.stats()["queue_depth"] == 0
+
+
+def test_set_max_limit_serializes_calls():
+    limiter = AdaptiveLimiter(initial=8, max_limit=8)
+    limiter.set_max_limit(1)
+    assert limiter.window == 1
+
+
+def test_single_flight_runs_concurrent_calls_once():
+    from concurrency import SingleFlight
+    flights = SingleFlight()
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return len(calls)
+
+    async def run():
+        return await asyncio.gather(*(flights.run("key", call) for _ in range(5)), flights.run("other", call))
+
+    results = asyncio.run(run())
+    assert len(calls) == 2
+    assert results[:5] == [results[0]] * 5
+    assert flights.stats() == {"in_flight": 0, "started": 2, "coalesced": 4}
+
+
+def test_single_flight_stream_replays_events_to_late_joiners():
+    from concurrency import SingleFlight
+    flights = SingleFlight()
+    produced = []
+
+    async def events():
+        for event in range(3):
+            produced.append(event)
+            yield event
+            await asyncio.sleep(0.01)
+
+    async def collect(delay):
+        await asyncio.sleep(delay)
+        return [event async for event in flights.stream("step", events)]
+
+    async def run():
+        return await asyncio.gather(collect(0), collect(0.015))
+
+    first, late = asyncio.run(run())
+    assert first == late == [0, 1, 2]
+    assert produced == [0, 1, 2]
+
+
+def test_single_flight_cancels_work_once_every_caller_left():
+    from concurrency import SingleFlight
+    flights = SingleFlight()
+
+    async def run():
+        started = asyncio.Event()
+        stopped = asyncio.Event()
+
+        async def call():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            finally:
+                stopped.set()
+
+        caller = asyncio.ensure_future(flights.run("key", call))
+        await started.wait()
+        caller.cancel()
+        await asyncio.wait_for(stopped.wait(), 1)
+
+    asyncio.run(run())
+    assert flights.stats()["in_flight"] == 0
+
+
+def _warm_hedger(stage, latency=0.01, samples=20, **options):
+    from concurrency import RequestHedger
+    hedger = RequestHedger(min_samples=samples, max_rate=1.0, **options)
+    for _ in range(samples):
+        hedger._observe(stage, latency)
+    return hedger
+
+
+def test_hedger_waits_for_enough_samples():
+    from concurrency import RequestHedger
+    hedger = RequestHedger(min_samples=5)
+
+    async def send():
+        return "response"
+
+    assert asyncio.run(hedger.run("extract", send)) == ("response", None)
+    assert hedger.threshold("extract") is None
+    assert hedger.stats()["hedged"] == 0
+
+
+def test_hedge_wins_when_the_original_is_slow():
+    hedger = _warm_hedger("extract", percentile=0.5)
+    for _ in range(2):
+        hedger._observe("extract", 1.0) # the stage's tail, for the saving estimate
+    sent = []
+    cancelled = []
+
+    async def send():
+        sent.append(1)
+        if len(sent) == 1:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(1)
+                raise
+        return f"response {len(sent)}"
+
+    async def run():
+        result = await hedger.run("extract", send)
+        await asyncio.sleep(0) # let the cancellation reach the original
+        return result
+
+    assert asyncio.run(run()) == ("response 2", "hedge_won")
+    assert cancelled == [1] # the losing original does not keep running
+    stats = hedger.stats()
+    assert stats["hedged"] == 1 and stats["hedge_wins"] == 1
+    assert 0.5 < stats["latency_saved_seconds"] < 1.0
+
+
+def test_invalid_hedge_response_does_not_win():
+    hedger = _warm_hedger("match")
+    sent = []
+
+    async def send():
+        sent.append(1)
+        if len(sent) == 1:
+            await asyncio.sleep(0.05)
+            return "valid"
+        return "invalid"
+
+    result = asyncio.run(hedger.run("match", send, valid=lambda response: response == "valid"))
+    assert result == ("valid", "original_won")
+
+
+def test_hedge_rate_is_capped():
+    from concurrency import RequestHedger
+    hedger = RequestHedger(percentile=0.5, min_samples=20, max_rate=0.05)
+    for _ in range(100): # the median stays far below the requests' latency
+        hedger._observe("extract", 0.001)
+
+    async def send():
+        await asyncio.sleep(0.01)
+        return "response"
+
+    async def run():
+        for _ in range(10):
+            await hedger.run("extract", send)
+
+    asyncio.run(run())
+    stats = hedger.stats()
+    assert stats["hedged"] == 1
+    assert stats["capped"] == 9
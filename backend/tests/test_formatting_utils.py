@@ -0,0 +1,41 @@
+from formatting_utils import markdown_table, shorten_evidence, step1_markdown, step2_markdown
+
+
+def test_markdown_table_pads_and_aligns_columns():
+    assert markdown_table(["Name", "Count"], [["pan", 3], ["lid", 12]]).split("\n") == [
+        "| Name   |   Count |",
+        "|:-------|--------:|",
+        "| pan    |       3 |",
+        "| lid    |      12 |",
+    ]
+
+
+def test_markdown_table_cells_stay_in_place():
+    table = markdown_table(["Value", "Note"], [[None, "a | b"], ["line 1\nline 2", ""]])
+    assert table.split("\n")[2:] == [
+        "| " + " " * 16 + " | a \\| b |",
+        "| line 1<br>line 2 |        |",
+    ]
+
+
+def test_numeric_columns_ignore_empty_cells():
+    table = markdown_table(["Weight"], [[8.5], [None], ["2"]])
+    assert table.split("\n")[1] == "|---------:|"
+    assert markdown_table(["Weight"], [[8.5], ["heavy"]]).split("\n")[1] == "|:---------|"
+
+
+def test_markdown_table_without_rows_or_headers():
+    assert markdown_table(["A"], []) == "| A   |\n|:----|"
+    assert markdown_table([], [[1]]) == ""
+
+
+def test_step1_markdown_numbers_reviews():
+    markdown = step1_markdown([[{"attribute": "weight", "value": "8 lb"}]], start=3)
+    assert markdown.startswith("### Review 3:\n\n| Attribute   | Value   |")
+
+
+def test_step2_markdown_keeps_headers_for_empty_reviews():
+    markdown = step2_markdown([[], [{"attribute": "weight", "evidence": "x" * 100, "status": "matching", "value": "8"}]])
+    assert "### Review 1:\n\n| Attribute | Evidence | Status | Value |\n| --- | --- | --- | --- |\n" in markdown
+    assert shorten_evidence("x" * 100) in markdown
+    assert "x" * 76 not in markdown
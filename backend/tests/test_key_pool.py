@@ -0,0 +1,151 @@
+import asyncio
+import pytest
+
+import key_pool
+from key_pool import KeyBoundModel, KeyPool, call_with_key, key_fingerprint
+from mock_gemini import MockModel, MockRateLimitError
+
+
+def test_fingerprint_does_not_contain_the_key():
+    fingerprint = key_fingerprint("secret-key")
+    assert fingerprint == key_fingerprint("secret-key")
+    assert fingerprint != key_fingerprint("other-key")
+    assert "secret" not in fingerprint and len(fingerprint) == 16
+
+
+def test_acquire_picks_the_least_loaded_key():
+    pool = KeyPool()
+    pool.configure(["a", "b"])
+
+    async def run():
+        first = await pool.acquire()
+        second = await pool.acquire()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert {first.api_key, second.api_key} == {"a", "b"}
+    pool.release(first, "ok")
+    pool.release(second, "ok")
+    assert pool.stats()["in_flight"] == 0
+    assert pool.stats()["calls"] == 2
+
+
+def test_configure_keeps_learned_state():
+    pool = KeyPool()
+    pool.configure(["a", "b"])
+    state = asyncio.run(pool.acquire())
+    pool.release(state, "rate_limited")
+    pool.configure(["b", "a", "c"])
+    assert pool.stats()["keys"] == 3
+    assert pool.stats()["rate_limited"] == 1
+
+
+def test_rate_limit_cools_the_key_down_and_lowers_its_rate():
+    pool = KeyPool(initial_rpm=600)
+    pool.configure(["a", "b"])
+
+    async def run():
+        states = [await pool.acquire() for _ in range(4)]
+        return states
+
+    states = asyncio.run(run())
+    limited = states[0]
+    for state in states[1:]:
+        pool.release(state, "ok")
+    pool.release(limited, "rate_limited")
+    per_key = {key["key"]: key for key in pool.stats()["per_key"]}
+    assert per_key[limited.fingerprint]["cooling_down_seconds"] > 0
+    assert limited.rpm < 600 # learned from what the key was sent over the last minute
+    assert pool.stats()["available"] == 1
+
+    # The next call goes to the other key
+    state = asyncio.run(pool.acquire())
+    assert state is not limited
+    pool.release(state, "ok")
+
+
+def test_call_with_key_fails_over_to_another_key():
+    pool = KeyPool()
+    pool.configure(["limited", "healthy"])
+    model = MockModel("extract")
+    used = []
+
+    async def call(bound):
+        used.append(bound.api_key)
+        if bound.api_key == "limited":
+            raise MockRateLimitError("429 RESOURCE_EXHAUSTED")
+        return "response"
+
+    async def run():
+        return [await call_with_key(pool, model, call) for _ in range(2)]
+
+    assert asyncio.run(run()) == ["response", "response"]
+    assert used.count("healthy") == 2
+    assert used.count("limited") <= 1 # cooling down after its first error
+
+
+def test_call_with_key_raises_other_errors():
+    pool = KeyPool()
+    pool.configure(["a", "b"])
+
+    async def call(bound):
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        asyncio.run(call_with_key(pool, MockModel("extract"), call))
+    assert pool.stats()["calls"] == 1
+    assert pool.stats()["in_flight"] == 0
+
+
+def test_single_key_uses_the_model_as_it_is():
+    pool = KeyPool()
+    pool.configure(["a"])
+    model = MockModel("extract")
+
+    async def call(bound):
+        return bound
+
+    assert asyncio.run(call_with_key(pool, model, call)) is model
+
+
+def test_bind_reuses_bound_models():
+    pool = KeyPool()
+    pool.configure(["a", "b"])
+    model = MockModel("extract")
+    bound = pool.bind(model, "a")
+    assert bound.api_key == "a" and model.api_key is None
+    assert pool.bind(model, "a") is bound
+    assert pool.bind(model, "b") is not bound
+    with pytest.raises(TypeError):
+        pool.bind(object(), "a")
+
+
+def test_async_clients_are_per_loop_and_key():
+    async def clients():
+        return key_pool._async_client("a"), key_pool._async_client("a"), key_pool._async_client("b")
+
+    first, same, other = asyncio.run(clients())
+    assert first is same
+    assert first is not other
+    assert asyncio.run(clients())[0] is not first # a new loop gets its own client
+
+
+def test_key_bound_model_sends_with_its_own_client(monkeypatch):
+    from google.generativeai import protos
+    sent = []
+
+    class Client:
+        async def generate_content(self, request):
+            sent.append(request)
+            return protos.GenerateContentResponse(candidates=[
+                protos.Candidate(content=protos.Content(parts=[protos.Part(text="{}")]))
+            ])
+
+    monkeypatch.setattr(key_pool, "_async_client", lambda api_key: Client())
+    model = KeyBoundModel("gemini-2.0-flash", {"temperature": 0.0}, "instruction", api_key="a")
+    response = asyncio.run(model.generate_content_async("prompt"))
+    assert response.text == "{}"
+    request = sent[0]
+    assert request.model == "models/gemini-2.0-flash"
+    assert request.contents[0].parts[0].text == "prompt"
+    assert request.system_instruction.parts[0].text == "instruction"
@@ -0,0 +1,40 @@
+import contextvars
+import types
+
+import metrics
+
+
+def test_render_exposes_recorded_calls_and_gauges(monkeypatch):
+    # Keep the timing scope to this test
+    monkeypatch.setattr(metrics, "_current_timing", contextvars.ContextVar("praise_timing", default=None))
+    usage = types.SimpleNamespace(prompt_token_count=120, candidates_token_count=30)
+    timing = metrics.start_timing()
+    metrics.record_attempt("render_test", "mock-flash", 0.3, response=types.SimpleNamespace(usage_metadata=usage))
+    metrics.record_attempt("render_test", "mock-flash", 0.02, error=TimeoutError())
+    metrics.record_call("render_test", "mock-flash", 0.4, retries=1)
+    metrics.record_call("render_test", "mock-flash", 0.0, cached=True)
+
+    lines = metrics.render(gauges=[("praise_sessions", "Sessions in the store", 3)]).splitlines()
+    labels = '{stage="render_test",model="mock-flash"'
+    for line in (
+        f'praise_model_calls_total{labels},outcome="ok"}} 1',
+        f'praise_model_calls_total{labels},outcome="cached"}} 1',
+        f"praise_model_retries_total{labels}}} 1",
+        f'praise_model_errors_total{labels},error_class="TimeoutError"}} 1',
+        f'praise_model_tokens_total{labels},kind="prompt"}} 120',
+        f'praise_model_tokens_total{labels},kind="output"}} 30',
+        # Cumulative buckets: the cached call is not timed
+        f'praise_model_call_duration_seconds_bucket{labels},le="0.25"}} 0',
+        f'praise_model_call_duration_seconds_bucket{labels},le="0.5"}} 1',
+        f'praise_model_call_duration_seconds_bucket{labels},le="+Inf"}} 1',
+        f"praise_model_call_duration_seconds_count{labels}}} 1",
+        f'praise_model_attempt_duration_seconds_bucket{labels},le="0.05"}} 1',
+        f"praise_model_attempt_duration_seconds_count{labels}}} 2",
+        "# TYPE praise_sessions gauge",
+        "praise_sessions 3",
+    ):
+        assert line in lines
+
+    calls = timing.to_dict()["model_calls"]["render_test"]
+    assert (calls["calls"], calls["cached"], calls["retries"]) == (2, 1, 1)
+    assert (calls["prompt_tokens"], calls["output_tokens"]) == (120, 30)
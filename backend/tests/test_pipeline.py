@@ -0,0 +1,190 @@
+import asyncio
+import json
+
+import pytest
+
+import pipeline
+
+DESCRIPTION = "A 12 inch cast iron skillet, pre-seasoned, weighing 8 pounds."
+
+
+def test_sync_entry_points_share_one_loop():
+    first = pipeline.extract_factual_product_details("The pan weighs 8 pounds.", use_cache=False)
+    second = pipeline.extract_factual_product_details("The pan is 12 inches wide.", use_cache=False)
+    assert first["extracted_attributes"] and second["extracted_attributes"]
+    assert pipeline._background_loop() is pipeline._background_loop()
+
+
+def test_sync_entry_points_work_inside_a_running_loop():
+    async def caller():
+        return pipeline.check_heartbeat_status()
+
+    assert asyncio.run(caller()) == "heartbeat success"
+
+
+def test_complete_pipeline_organizes_every_status():
+    results = pipeline.complete_pipeline(
+        DESCRIPTION,
+        ["The skillet weighs 8 pounds.", "It is 10 inches wide and made of cast iron."],
+        use_cache=False,
+    )
+    assert set(results) == {"missing", "matching", "contradictory", "partially_matching"}
+
+
+def test_merge_organized_results_matches_organizing_at_once():
+    from records import records_from_rows
+    rows = [
+        [{"attribute": "weight", "value": "8 lb", "status": "matching", "evidence": "weighs 8 pounds"}],
+        [{"attribute": "size", "value": "10 in", "status": "contradictory", "evidence": "10 inches"},
+         {"attribute": "weight", "value": "9 lb", "status": "contradictory", "evidence": "9 pounds"}],
+    ]
+    categories = {"weight": "Dimensions", "size": "Dimensions"}
+    records = [records_from_rows(review) for review in rows]
+    merged = pipeline.merge_organized_results(
+        pipeline.organize_results(records[:1], categories), pipeline.organize_results(records[1:], categories)
+    )
+    assert merged == pipeline.organize_results(records, categories)
+
+
+def test_match_requested_attributes_keys_answers_by_the_request():
+    answer = {"Battery life": "Power", "weight ": "Dimensions", "color": "Appearance"}
+    assert pipeline.match_requested_attributes(answer, ["battery-life", "Weight", "size"]) == {
+        "battery-life": "Power", "Weight": "Dimensions"
+    }
+
+
+def test_reconcile_category_labels_merges_spellings():
+    categories = {"weight": "Dimensions", "size": "dimensions", "depth": "Dimension", "width": "Dimensions", "color": "Looks"}
+    assert pipeline.reconcile_category_labels(categories) == {
+        "weight": "Dimensions", "size": "Dimensions", "depth": "Dimensions", "width": "Dimensions", "color": "Looks"
+    }
+    # A label already in use wins over the most common spelling
+    assert set(pipeline.reconcile_category_labels(categories, {"dimension"}).values()) == {"dimension", "Looks"}
+
+
+def test_group_shard_retries_only_the_missing_attributes(monkeypatch):
+    import async_pipeline
+    requests = []
+    answers = [
+        {"weight": "Dimensions"},
+        {"error": "Failed during grouping: 500 Internal error (mock)"},
+        {"Size": "Dimensions", "extra": "Other"},
+    ]
+
+    async def group_attributes(attributes, use_cache=True, existing_categories=None):
+        requests.append((attributes, set(existing_categories)))
+        return answers.pop(0) if answers else {}
+
+    monkeypatch.setattr(async_pipeline, "group_attributes", group_attributes)
+    categories = asyncio.run(async_pipeline._group_shard(["weight", "size", "color"], False, {"Looks"}))
+    assert requests == [
+        ("weight, size, color", {"Looks"}),
+        ("size, color", {"Looks", "Dimensions"}),
+        ("size, color", {"Looks", "Dimensions"}),
+        ("color", {"Looks", "Dimensions"}),
+        ("color", {"Looks", "Dimensions"}),
+    ]
+    assert categories == {"weight": "Dimensions", "size": "Dimensions", "color": "uncategorized"}
+
+    failed = set()
+    answers.clear()
+    assert asyncio.run(async_pipeline._group_shard(["color"], False, set(), max_attempts=2, failed=failed)) == {"color": "uncategorized"}
+    assert failed == {"color"}
+
+
+def test_plan_match_batches_respects_the_budgets():
+    extracted = [[{"attribute": "weight", "value": "8 lb"}], [], [{"attribute": "size", "value": "12 in"}] * 3,
+                 [{"attribute": "color", "value": "black"}]]
+    assert pipeline.plan_match_batches(extracted) == [[(0, extracted[0]), (2, extracted[2]), (3, extracted[3])]]
+    assert pipeline.plan_match_batches(extracted, max_reviews=2) == [[(0, extracted[0]), (2, extracted[2])], [(3, extracted[3])]]
+    # Three attributes need 300 output tokens: review 2 gets a batch of its own
+    assert pipeline.plan_match_batches(extracted, output_token_budget=300) == [
+        [(0, extracted[0])], [(2, extracted[2])], [(3, extracted[3])]
+    ]
+
+
+def test_parse_batch_matching_response_keeps_only_the_batch():
+    batch = [(0, ["weight"]), (2, ["size", "color"])]
+    row = {"attribute": "size", "status": "matching", "evidence": "12 inch"}
+    response = {"reviews": [
+        {"review_index": 2, "result": [row]},
+        {"review_index": 7, "result": [row]}, # not part of the batch
+        "not an entry",
+        {"review_index": 2, "result": None},
+    ]}
+    # Review 0 was left out of the reply; the caller matches it on its own
+    assert pipeline.parse_batch_matching_response(json.dumps(response), batch) == {2: {"result": [row]}}
+    assert pipeline.batch_matching_problem(json.dumps(response), DESCRIPTION, batch) == "schema"
+    assert pipeline.batch_matching_problem('{"reviews": [', DESCRIPTION, batch) == "json"
+    with pytest.raises(ValueError):
+        pipeline.parse_batch_matching_response("not json", batch)
+
+
+def test_extraction_and_matching_problems():
+    assert pipeline.extraction_problem('{"extracted_attributes": [{"attribute": "weight", "value": "8 lb"}]}') is None
+    assert pipeline.extraction_problem('{"extracted_attributes": [{"attribute": "wei') == "json"
+    assert pipeline.extraction_problem('{"extracted_attributes": {"weight": "8 lb"}}') == "schema"
+    assert pipeline.extraction_problem('{"extracted_attributes": [{"attribute": " ", "value": "8 lb"}]}') == "schema"
+
+    def matching(status, evidence):
+        return json.dumps({"result": [{"attribute": "weight", "status": status, "evidence": evidence}]})
+
+    assert pipeline.matching_problem(matching("matching", "Weighing 8 pounds."), DESCRIPTION) is None
+    assert pipeline.matching_problem(matching("missing", None), DESCRIPTION) is None
+    assert pipeline.matching_problem(matching("unclear", "weighing 8 pounds"), DESCRIPTION) == "status"
+    assert pipeline.matching_problem(matching("contradictory", "weighing 9 pounds"), DESCRIPTION) == "evidence"
+    assert pipeline.matching_problem("[]", DESCRIPTION) == "schema"
+
+
+def test_cascade_escalates_answers_that_fail_the_checks(monkeypatch):
+    import async_pipeline
+    from mock_gemini import MockModel, MockStats
+    stats = MockStats()
+    cascade_stats = pipeline.CascadeStats()
+    monkeypatch.setattr(async_pipeline, "cascade_stats", cascade_stats)
+    model = MockModel("extract", model_name="models/strong", stats=stats)
+    prompt = pipeline.extraction_prompt("The skillet weighs 8 pounds.")
+
+    async def cascade(fast_model):
+        return await async_pipeline.cascade_text(
+            "extract", model, fast_model, prompt, use_cache=False, problem=pipeline.extraction_problem
+        )
+
+    kept = asyncio.run(cascade(MockModel("extract", model_name="models/fast", stats=stats)))
+    assert pipeline.extraction_problem(kept) is None
+    assert stats.calls == {"extract": 1}
+    escalated = asyncio.run(cascade(MockModel("extract", model_name="models/fast", invalid_rate=1.0, stats=stats)))
+    assert pipeline.extraction_problem(escalated) is None
+    failing = asyncio.run(cascade(MockModel("extract", model_name="models/fast", error_rate=1.0, stats=stats)))
+    assert pipeline.extraction_problem(failing) is None
+    assert cascade_stats.stats()["stages"] == {"extract": {"fast": 1, "escalated": 2, "problems": {"schema": 1, "error": 1}}}
+
+
+def test_probe_api_reuses_a_recent_success(monkeypatch):
+    import async_pipeline
+    from mock_gemini import MockModel
+    probes = []
+
+    class CountingModel(MockModel):
+        async def count_tokens_async(self, contents, **kwargs):
+            probes.append(contents)
+            if len(probes) == 3:
+                raise RuntimeError("503 Service unavailable (mock)")
+            return await super().count_tokens_async(contents, **kwargs)
+
+    now = [1000.0]
+    monkeypatch.setattr(async_pipeline.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(async_pipeline, "_probed_keys", {})
+    monkeypatch.setattr(pipeline, "test_model", CountingModel("heartbeat"))
+    asyncio.run(async_pipeline.probe_api(max_age=30))
+    now[0] += 29
+    asyncio.run(async_pipeline.probe_api(max_age=30))
+    assert len(probes) == 1
+    now[0] += 2
+    asyncio.run(async_pipeline.probe_api(max_age=30))
+    assert len(probes) == 2
+    # A failed probe is not remembered
+    now[0] += 31
+    assert asyncio.run(async_pipeline.check_heartbeat_status()) == "heartbeat failed"
+    assert asyncio.run(async_pipeline.check_heartbeat_status()) == "heartbeat success"
+    assert len(probes) == 4
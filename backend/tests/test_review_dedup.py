@@ -0,0 +1,35 @@
+from review_dedup import find_duplicates, lsh_bands, normalize_review
+
+
+def test_normalized_copies_are_grouped():
+    reviews = ["Great pan, heavy!", "great pan heavy", "Arrived scratched."]
+    assert find_duplicates(reviews) == [0, 0, 2]
+    assert normalize_review("  Great   PAN!! ") == "great pan"
+
+
+def test_near_duplicates_join_the_first_review():
+    base = ("The skillet is twelve inches wide and came pre-seasoned, heavier than I expected for the price. "
+            "It heats evenly on my gas stove and the handle stays cool enough.")
+    reviews = [base, base.replace("heavier", "heavyer"), "The handle gets hot and the pan rusted after a week."]
+    assert find_duplicates(reviews) == [0, 0, 2]
+
+
+def test_reviews_with_different_numbers_stay_apart():
+    reviews = [
+        "The skillet is 12 inches wide and came pre-seasoned, heavier than I expected for the price.",
+        "The skillet is 10 inches wide and came pre-seasoned, heavier than I expected for the price.",
+    ]
+    assert find_duplicates(reviews, threshold=0.5) == [0, 1]
+
+
+def test_threshold_one_only_merges_identical_reviews():
+    base = "The skillet is twelve inches wide and came pre-seasoned, heavier than I expected for the price."
+    reviews = [base, base.upper(), base.replace("heavier", "heavyer")]
+    assert find_duplicates(reviews, threshold=1.0) == [0, 0, 2]
+
+
+def test_lsh_bands_use_the_whole_signature():
+    for threshold in (0.5, 0.8, 0.9):
+        bands, rows = lsh_bands(64, threshold)
+        assert bands * rows <= 64
+        assert (1 / bands) ** (1 / rows) <= threshold
@@ -0,0 +1,36 @@
+import json
+from review_filter import ReviewFilter, content_words, review_filter
+
+
+def test_praise_and_ratings_are_not_factual():
+    for review in ("Great!", "Love it", "5 stars", "Highly recommend, 10/10", "Excellent product, thanks!"):
+        assert not review_filter.is_factual(review), review
+
+
+def test_reviews_with_claims_are_factual():
+    for review in (
+        "Feels cheap",
+        "Works with USB-C",
+        "Not as described",
+        "Great pan, but the handle rusted",
+        "Heavier than 8 pounds",
+    ):
+        assert review_filter.is_factual(review), review
+
+
+def test_content_words_drop_stop_words_and_ratings():
+    assert content_words("I love it, 5 stars. The handle is short!") == ["handle", "short"]
+
+
+def test_word_feature_model(tmp_path):
+    path = tmp_path / "model.json"
+    path.write_text(json.dumps({"bias": -1.0, "weights": {"handle": 3.0}, "threshold": 0.5}))
+    model = ReviewFilter.from_file(str(path))
+    assert model.is_factual("The handle is short")
+    assert not model.is_factual("Arrived on Tuesday")
+
+
+def test_unreadable_model_falls_back_to_the_heuristics(tmp_path):
+    model = ReviewFilter.from_file(str(tmp_path / "missing.json"))
+    assert model.weights == {}
+    assert model.is_factual("Arrived on Tuesday")
@@ -0,0 +1,95 @@
+import json
+import os
+import time
+import pytest
+
+import session_store
+from session_store import MemorySessionStore, SqliteSessionStore
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Settable time.time() for the store, starting at the real time."""
+    now = [time.time()]
+    monkeypatch.setattr(session_store.time, "time", lambda: now[0])
+    return now
+
+
+def _session(reviews):
+    return {"reviews": [f"review {index}" for index in range(reviews)]}
+
+
+def test_memory_store_spills_least_recently_used_sessions(tmp_path):
+    size = len(json.dumps(_session(10)))
+    store = MemorySessionStore(max_bytes=2 * size, spill_dir=str(tmp_path))
+    store.put("a", _session(10))
+    store.put("b", _session(10))
+    store.get("a") # b is now the least recently used
+    store.put("c", _session(10))
+    assert os.listdir(tmp_path) == ["b.json"]
+    assert store.stats()["sessions_in_memory"] == 2
+    assert store.stats()["spilled"] == 1
+
+    assert store.get("b") == _session(10) # loaded back, spilling a
+    assert os.listdir(tmp_path) == ["a.json"]
+    assert store.get("a") == _session(10)
+
+
+def test_memory_store_without_spill_dir_evicts(tmp_path):
+    size = len(json.dumps(_session(10)))
+    store = MemorySessionStore(max_bytes=size, spill_dir="")
+    store.put("a", _session(10))
+    store.put("b", _session(10))
+    assert store.get("a") is None
+    assert store.stats()["evicted"] == 1
+
+
+def test_memory_store_expires_idle_sessions(tmp_path, clock):
+    store = MemorySessionStore(ttl_seconds=60, spill_dir=str(tmp_path))
+    store.put("a", _session(1))
+    clock[0] += 30
+    assert store.get("a") == _session(1) # an access keeps the session alive
+    clock[0] += 59
+    assert store.get("a") == _session(1)
+    clock[0] += 61
+    assert store.get("a") is None
+    assert store.update("a", lambda session: None) is None
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_update_changes_the_stored_session(tmp_path, backend):
+    if backend == "memory":
+        store = MemorySessionStore(spill_dir=str(tmp_path))
+    else:
+        store = SqliteSessionStore(str(tmp_path / "sessions.sqlite3"))
+    store.put("a", _session(2))
+    # Another request appends while a step's model calls are running
+    store.update("a", lambda session: session["reviews"].append("appended"))
+    # The step then stores its results without overwriting the append
+    updated = store.update("a", lambda session: session.update(extracted=True))
+    assert updated == {"reviews": ["review 0", "review 1", "appended"], "extracted": True}
+    assert store.get("a") == updated
+    assert store.update("missing", lambda session: session.update(extracted=True)) is None
+
+
+def test_sqlite_store_is_shared_and_expires(tmp_path, clock):
+    path = str(tmp_path / "sessions.sqlite3")
+    store = SqliteSessionStore(path, ttl_seconds=60)
+    other_worker = SqliteSessionStore(path, ttl_seconds=60)
+    store.put("a", _session(1))
+    store.set_setting("workers", 4)
+    assert other_worker.get("a") == _session(1)
+    assert other_worker.get_setting("workers") == 4
+    assert other_worker.get_setting("missing", "default") == "default"
+    clock[0] += 61
+    assert other_worker.get("a") is None
+    assert other_worker.update("a", lambda session: None) is None
+
+
+def test_incomplete_backend_fails_when_created():
+    class GetOnly(session_store.SessionStore):
+        def get(self, session_id):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnly()
@@ -6,8 +6,7 @@ import ResultDisplay from './components/ResultDisplay';
 import {
   checkHeartbeat,
   startSession,
-  extractAttributes,
-  matchAttributes,
+  streamSessionStep,
   categorizeAttributes,
   configureApiKey,
   toggleParallelProcessing
@@ -124,11 +123,18 @@ const App: React.FC = () => {
     }
     try {
       setLoading(prev => ({ ...prev, extract: true }));
-      // Pass only the session_id
-      const result = await extractAttributes({ session_id: sessionId });
+      // Stream each review's attributes as it finishes, then store the full result
+      const partial: ExtractResponse = { extracted_attributes: reviews.map(() => []), markdown: '' };
+      const result = await streamSessionStep('/extract_stream', { session_id: sessionId }, (event) => {
+        if (event.event === 'review') {
+          partial.extracted_attributes[event.data.index] = event.data.rows as ExtractResponse['extracted_attributes'][number];
+          setExtractedAttributesResult({ ...partial, extracted_attributes: [...partial.extracted_attributes] });
+        }
+      });
       setExtractedAttributesResult(result); // Store the full result object
     } catch (error: any) {
       console.error('Extraction failed:', error);
+      setExtractedAttributesResult(null);
       alert(`Failed to extract attributes: ${error.response?.data?.detail || error.message}. Please check the console.`);
     } finally {
       setLoading(prev => ({ ...prev, extract: false }));
@@ -143,10 +149,18 @@ const App: React.FC = () => {
     // No need to check extractedAttributesResult locally, backend handles sequence
     try {
       setLoading(prev => ({ ...prev, match: true }));
-      const result = await matchAttributes({ session_id: sessionId });
+      // Stream each review's matched rows as it finishes, then store the full result
+      const partial: MatchResponse = { all_dataframes: reviews.map(() => []), markdown: '' };
+      const result = await streamSessionStep('/match_stream', { session_id: sessionId }, (event) => {
+        if (event.event === 'review') {
+          partial.all_dataframes[event.data.index] = event.data.rows as MatchResponse['all_dataframes'][number];
+          setMatchedDataResult({ ...partial, all_dataframes: [...partial.all_dataframes] });
+        }
+      });
       setMatchedDataResult(result); // Store the full result object
     } catch (error: any) {
       console.error('Matching failed:', error);
+      setMatchedDataResult(null);
       alert(`Failed to match attributes: ${error.response?.data?.detail || error.message}. Please check the console.`);
     } finally {
       setLoading(prev => ({ ...prev, match: false }));
@@ -358,7 +372,7 @@ const App: React.FC = () => {
                   <p className="mb-4 text-gray-700 dark:text-gray-300">Match extracted attributes with the seller's description for this session.</p>
                   <button
                     onClick={handleMatchClick}
-                    disabled={loading.match || !extractedAttributesResult || !!matchedDataResult} // Disable if loading, extraction not done, or already matched
+                    disabled={loading.extract || loading.match || !extractedAttributesResult || !!matchedDataResult} // Disable if loading, extraction not done, or already matched
                     className={buttonStyle}
                   >
                     {loading.match ? (
@@ -403,7 +417,7 @@ const App: React.FC = () => {
                   <p className="mb-4 text-gray-700 dark:text-gray-300">Group attributes into logical categories for this session.</p>
                   <button
                     onClick={handleCategorizeClick}
-                    disabled={loading.categorize || !matchedDataResult || !!categorizedDataResult} // Disable if loading, matching not done, or already categorized
+                    disabled={loading.match || loading.categorize || !matchedDataResult || !!categorizedDataResult} // Disable if loading, matching not done, or already categorized
                     className={buttonStyle}
                   >
                     {loading.categorize ? (
@@ -8,7 +8,8 @@ import {
   StartSessionResponse, // New response type for session ID
   ExtractResponse,
   MatchResponse,
-  CategorizeResponse
+  CategorizeResponse,
+  StreamEvent
 } from '../types/api'; // Assuming types are updated or created
 
 // Base URL for the backend API
@@ -74,6 +75,56 @@ export const categorizeAttributes = async (data: SessionIdRequest): Promise<Cate
   return response.data; // Contains results and markdown
 };
 
+/**
+ * Run a session step as a Server-Sent Events stream.
+ * `onEvent` receives each review's rows as soon as the backend finishes it;
+ * the returned promise resolves with the final `result` event's data.
+ */
+export const streamSessionStep = async (
+  endpoint: '/extract_stream' | '/match_stream' | '/analyze_stream',
+  data: SessionIdRequest,
+  onEvent: (event: StreamEvent) => void
+): Promise<any> => {
+  const response = await fetch(`${API_BASE_URL}${endpoint}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+    body: JSON.stringify(data),
+  });
+  if (!response.ok || !response.body) {
+    const error = await response.json().catch(() => ({ detail: response.statusText }));
+    throw new Error(error.detail || `Request failed with status ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let result: any = null;
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    // Events are separated by a blank line
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const frame = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf('\n\n');
+
+      let eventName = 'message';
+      let payload = '';
+      for (const line of frame.split('\n')) {
+        if (line.startsWith('event:')) eventName = line.slice(6).trim();
+        else if (line.startsWith('data:')) payload += line.slice(5).trim();
+      }
+      const event = { event: eventName, data: payload ? JSON.parse(payload) : null } as StreamEvent;
+      if (event.event === 'error') throw new Error(event.data.detail);
+      if (event.event === 'result') result = event.data;
+      onEvent(event);
+    }
+  }
+  return result;
+};
+
 /**
  * Toggles parallel processing on the backend.
  */
@@ -1,6 +1,7 @@
 // --- Request Payloads ---
 export interface ApiKeyRequest {
   api_key: string;
+  api_keys?: string[]; // pool of keys to spread model calls over
 }
 
 export interface StartSessionRequest {
@@ -10,6 +11,25 @@ export interface StartSessionRequest {
 
 export interface SessionIdRequest {
   session_id: string;
+  fields?: 'all' | 'json' | 'markdown' | 'summary'; // 'summary' returns only StepSummary counts
+  offset?: number; // first review of per-review results (extract, match)
+  limit?: number; // number of reviews to return
+}
+
+// Returned with paged extract / match results
+export interface StepPage {
+  offset: number;
+  limit: number | null;
+  total_reviews: number;
+}
+
+// Returned instead of the rows for `fields: 'summary'`
+export interface StepSummary {
+  reviews?: number;
+  rows?: number;
+  statuses?: { [status: string]: number };
+  categories?: { [status: string]: { [category: string]: number } };
+  [counter: string]: number | { [key: string]: unknown } | undefined;
 }
 
 // --- Response Payloads ---
@@ -25,6 +45,23 @@ export interface StartSessionResponse {
   session_id: string;
 }
 
+// Per-request timing breakdown, returned when a step is called with `timings: true`
+export interface ModelCallTotals {
+  calls: number;
+  cached: number;
+  retries: number;
+  errors: number;
+  seconds: number;
+  prompt_tokens: number;
+  output_tokens: number;
+}
+
+export interface StepTimings {
+  total_seconds: number;
+  stages: { [stage: string]: number };
+  model_calls: { [stage: string]: ModelCallTotals };
+}
+
 // Define structure for extracted attributes if not already defined elsewhere
 export interface ExtractedAttribute {
   attribute: string;
@@ -34,6 +71,10 @@ export interface ExtractedAttribute {
 export interface ExtractResponse {
   extracted_attributes: ExtractedAttribute[][]; // Array of arrays (one per review)
   markdown: string;
+  page?: StepPage;
+  skipped_reviews?: number; // reviews the pre-filter found no factual content in
+  duplicate_reviews?: number; // near-duplicate reviews that reused another review's extraction
+  timings?: StepTimings;
 }
 
 // (DFs converted to records)
@@ -47,6 +88,10 @@ export interface MatchedAttributeRecord {
 export interface MatchResponse {
   all_dataframes: MatchedAttributeRecord[][]; // Array of arrays (one per review's dataframe)
   markdown: string;
+  page?: StepPage;
+  skipped_matches?: number; // reviews without attributes, matched without a model call
+  duplicate_matches?: number; // reviews that reused the matching of identical attributes
+  timings?: StepTimings;
 }
 
 export interface CategorizedItem {
@@ -66,8 +111,25 @@ export interface CategorizedResult {
 export interface CategorizeResponse {
   results: CategorizedResult;
   markdown: string;
+  timings?: StepTimings;
+}
+
+// --- Streaming (Server-Sent Events) ---
+export type StreamStep = 'extract' | 'match';
+
+// One review's rows, sent as soon as that review finishes
+export interface ReviewStreamEvent {
+  step: StreamStep;
+  index: number;
+  rows: ExtractedAttribute[] | MatchedAttributeRecord[];
 }
 
+export type StreamEvent =
+  | { event: 'review'; data: ReviewStreamEvent }
+  | { event: 'step_result'; data: { step: StreamStep; result: ExtractResponse | MatchResponse } }
+  | { event: 'result'; data: any }
+  | { event: 'error'; data: ErrorResponse };
+
 // Structure for potential error responses from FastAPI/HTTPExceptions
 export interface ErrorResponse {
   detail: string;